@@ -0,0 +1,30 @@
+import sys
+import time
+import logging
+import numpy as np
+import pandas as pd
+
+from create_sample_data import synthetic_sales
+from utils.analyzer import DataAnalyzer, ENGINES
+
+# best wall time of full_analysis (every key computed, factorization and cube build included) per engine
+
+def benchmark_engines(df: pd.DataFrame, engines=ENGINES, repeat: int = 3) -> pd.Series:
+
+    times = {}
+    for engine in engines:
+        best = np.inf
+        for _ in range(repeat):
+            start = time.perf_counter()
+            DataAnalyzer(df, engine=engine).full_analysis().materialize()
+            best = min(best, time.perf_counter() - start)
+        times[engine] = best
+    return pd.Series(times, name='segundos')
+
+if __name__ == "__main__":
+    logging.disable(logging.INFO)
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    times = benchmark_engines(synthetic_sales(rows, models=50))
+    print(f"full_analysis sobre {rows:,} filas (mejor de 3):")
+    for engine, seconds in times.items():
+        print(f"  {engine:<10} {seconds:7.3f} s  ({times['pandas'] / seconds:4.1f}x frente a pandas)")
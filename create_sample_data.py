@@ -1,7 +1,9 @@
 import os
+import numpy as np
 import pandas as pd
 import random
 from datetime import datetime, timedelta
+from utils.data_loader import apply_schema
 
 def create_sample_data():
 
@@ -66,5 +68,33 @@ def create_sample_data():
     print(f"Models: {df['Model'].nunique()}")
     print(f'Unique Clients: {df["Client_ID"].nunique()}')
 
+# synthetic sales with the quirks of the real files: null dates, labels and prices,
+# a headquarter that starts late and a month without sales for another one
+
+# (dated=False leaves every Sell_Date null)
+
+def synthetic_sales(rows: int = 20000, models: int = 40, seed: int = 0, dated: bool = True) -> pd.DataFrame:
+
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'Sell_Date': pd.Timestamp('2021-01-01') + pd.to_timedelta(rng.integers(0, 1400, rows), unit='D'),
+        'Headquarter': rng.choice(['Lima', 'Cusco', 'Arequipa', 'Piura'], rows),
+        'Model': rng.choice([f'Modelo {i}' for i in range(models)], rows),
+        'Channel': rng.choice(['Web', 'Concesionario', 'Telemarketing'], rows),
+        'Segment': rng.choice(['Individual', 'Corporativo', 'Gobierno'], rows),
+        'Client_ID': np.char.add('CLI_', rng.integers(0, rows // 3, rows).astype(str)),
+        'Price_Without_IGV': rng.gamma(2, 10000, rows).round(2)
+    })
+    df.loc[::1000, 'Sell_Date'] = pd.NaT
+    df.loc[5::777, 'Headquarter'] = None
+    df.loc[3::501, 'Price_Without_IGV'] = np.nan
+    df = df[~((df['Headquarter'] == 'Piura') & (df['Sell_Date'] < '2022-03-01'))]
+    df = df[~((df['Headquarter'] == 'Cusco') & (df['Sell_Date'].dt.to_period('M') == pd.Period('2023-02', 'M')))]
+    if not dated:
+        df['Sell_Date'] = pd.NaT
+    df['IGV'] = (df['Price_Without_IGV'] * 0.18).round(2)
+    df['Price_With_IGV'] = df['Price_Without_IGV'] + df['IGV']
+    return apply_schema(df.reset_index(drop=True), report_memory=False)
+
 if __name__ == "__main__":
     create_sample_data()
\ No newline at end of file
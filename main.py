@@ -1,8 +1,10 @@
 from datetime import datetime
 import os
 import sys
-from utils.data_loader import load_and_validate_data    
-from utils.analyzer import DataAnalyzer, analyze_data
+from utils.data_loader import load_and_validate_data, resolve_data_files, save_watermark, dataset_fingerprint
+from utils.profiler import write_data_profile
+from utils.analyzer import DataAnalyzer, analyze_data, analyze_chunks, update_stored_aggregates, analysis_config, cached_results
+from utils.result_cache import ResultCache, results_cache_key
 from utils.visualizer import generate_visualizations
 from utils.whatsapp_sender import WhatsAppSender, send_whatsapp_report, send_whatsapp_report_simulated
 
@@ -15,6 +17,17 @@ def setup_directories():
         os.makedirs(directory, exist_ok=True)
         print(f"Carpeta '{directory}' creada/verificada")
 
+# get value of a command line option (--option value or --option=value)
+
+def get_cli_option(name: str, default=None):
+
+    for i, arg in enumerate(sys.argv):
+        if arg == name and i + 1 < len(sys.argv):
+            return sys.argv[i + 1]
+        if arg.startswith(name + '='):
+            return arg.split('=', 1)[1]
+    return default
+
 # load enviroment variables
 
 def load_env_variables():
@@ -42,10 +55,20 @@ def main():
     setup_directories()
     load_env_variables()
 
-    # verify if file exists
-    data_file = 'data/Ventas_Fundamentos.xlsx'
-
-    if not os.path.exists(data_file):
+    # verify if file exists (--data accepts a file, a directory or a glob pattern)
+    data_file = get_cli_option('--data', 'data/Ventas_Fundamentos.xlsx')
+    workers = int(get_cli_option('--workers', 0)) or None
+    # incremental mode only analyzes rows appended since the previous run
+    incremental = '--incremental' in sys.argv
+    # skip rows already processed in previous runs (re-exported or overlapping files)
+    dedupe_history = '--dedupe-history' in sys.argv
+    # chunked and incremental runs can count unique clients with a HyperLogLog sketch
+    distinct = get_cli_option('--distinct', 'exact')
+    hll_precision = int(get_cli_option('--hll-precision', 14))
+    # number of models listed in the ranking
+    top_n = int(get_cli_option('--top-n', 5))
+
+    if not resolve_data_files(data_file):
         print(f"Archivo de datos no encontrado: {data_file}")
         print("Por favor, ejecute 'create_sample_data.py' para generar el archivo de datos de muestra.")
         sys.exit(1)
@@ -55,27 +78,87 @@ def main():
     print("Cargando y validando datos...")
     print("="*50)
 
-    df, validation = load_and_validate_data(data_file)
-
-    if df is not None and validation['is_valid']:
-        print("Datos cargados y validados exitosamente.")
-        print(f"Total registros: {len(df)}")
-        print(f"Sedes: {df['Headquarter'].nunique()}")
-        print(f"Modelos: {df['Model'].nunique()}")
-        print(f'Clientes Únicos: {df["Client_ID"].nunique()}')
+    # streaming mode keeps only one chunk of rows in memory
+    chunk_size = get_cli_option('--chunk-size')
+    engine = get_cli_option('--engine', 'fused')
+
+    # reuse the results of a previous run while the data files and settings are unchanged
+    # (--profile-data still loads the rows, the profile is written from them)
+    profile_data = '--profile-data' in sys.argv
+    result_cache = None if chunk_size or incremental or '--no-cache' in sys.argv else ResultCache()
+    fingerprint = dataset_fingerprint(data_file) if result_cache else None
+    results = cached_results(result_cache, results_cache_key(fingerprint, analysis_config(engine, top_n))) if result_cache and not profile_data else None
+    cached = results is not None
+    analyzer = None
+
+    if cached:
+        print("Datos sin cambios desde la ejecución anterior: se usan los resultados en caché.")
+    elif chunk_size:
+        try:
+            chunks, validation = load_and_validate_data(data_file, chunk_size=int(chunk_size))
+            results = analyze_chunks(chunks, distinct, hll_precision, top_n) if 'error' not in validation else None
+        except Exception as e:
+            print(f"Error durante el análisis por bloques: {str(e)}")
+            sys.exit(1)
+
+        if results is None or not validation['is_valid']:
+            print("Error en la carga de datos")
+            if 'error' in validation:
+                print(f"Error: {validation['error']}")
+            sys.exit(1)
+        print(f"Datos procesados por bloques de {chunk_size} filas.")
+        if validation.get('quarantined_rows'):
+            print(f"Filas en cuarentena: {validation['quarantined_rows']} ({validation['quarantine_file']})")
     else:
-        print("Error en la carga de datos")
-        if 'error' in validation:
-            print(f"Error: {validation['error']}")
-        sys.exit(1)
+        df, validation = load_and_validate_data(data_file, max_workers=workers, incremental=incremental, dedupe_history=dedupe_history)
+
+        if df is not None and validation['is_valid']:
+            print("Datos cargados y validados exitosamente.")
+            if incremental:
+                print(f"Registros nuevos: {len(df)} de {validation['incremental']['total_rows']}")
+            else:
+                print(f"Total registros: {len(df)}")
+            print(f"Sedes: {df['Headquarter'].nunique()}")
+            print(f"Modelos: {df['Model'].nunique()}")
+            print(f'Clientes Únicos: {df["Client_ID"].nunique()}')
+            if validation.get('quarantined_rows'):
+                print(f"Filas en cuarentena: {validation['quarantined_rows']} ({validation['quarantine_file']})")
+            # per-column statistics only when requested
+            if profile_data:
+                print(f"Perfil de datos guardado en: {write_data_profile(df)}")
+        else:
+            print("Error en la carga de datos")
+            if 'error' in validation:
+                print(f"Error: {validation['error']}")
+            sys.exit(1)
 
     # analyze data
     print("="*50)
     print("Iniciando análisis de datos...")
     print("="*50)
     try:
-        analyzer = DataAnalyzer(df)
-        results = analyzer.full_analysis()
+        if incremental:
+            info = validation['incremental']
+            results = update_stored_aggregates(df, info['state_key'], expected_rows=info['previous_rows'], reset=info['mode'] == 'full',
+                                               distinct=distinct, precision=hll_precision, top_n=top_n)
+            if results is None:
+                print("Agregados guardados inconsistentes: se reprocesa el historial completo.")
+                df, validation = load_and_validate_data(data_file, max_workers=workers, incremental=True, reset_watermark=True,
+                                                        dedupe_history=dedupe_history)
+                if df is None or not validation['is_valid']:
+                    raise ValueError(validation.get('error', 'Datos inválidos.'))
+                info = validation['incremental']
+                results = update_stored_aggregates(df, info['state_key'], reset=True, distinct=distinct, precision=hll_precision,
+                                                   top_n=top_n)
+            save_watermark(data_file, info['watermark'])
+            if 'history_index' in validation:
+                validation['history_index'].save()
+        elif not chunk_size and not cached:
+            # --engine pandas keeps the per-method groupby implementation
+            # --engine parallel splits the rows (--partition rows|headquarter) over --workers processes
+            analyzer = DataAnalyzer(df, engine=engine, top_n=top_n, result_cache=result_cache, fingerprint=fingerprint,
+                                    workers=workers, partition=get_cli_option('--partition', 'rows'))
+            results = analyzer.full_analysis()
         
         # show summary
 
@@ -90,17 +173,23 @@ def main():
         print(f"Ventas Promedio: ${metrics['average_sales_without_igv']:,.2f}")
 
         print(f"Modelo Más Vendido: {results['top_models'].index[0]}")
+        if not results['top_clients'].empty:
+            print(f"Cliente con Más Compras: {results['top_clients'].index[0]}")
         print(f"Sede con Más Ventas: {results['sales_by_headquarter'].index[0]}")
         print(f"Canal con Más Ventas: {results['sales_by_channel'].index[0]}")
     except Exception as e:
         print(f"Error durante el análisis de datos: {str(e)}")
         sys.exit(1)
 
-    # generate graphs
-    print("Generando visualizaciones...")
+    # generate graphs (unchanged results keep the graphs of the previous run)
+    graphs_dir = os.path.join('outputs', 'graphs')
     try:
-        generate_visualizations(results)
-        print("Visualizaciones generadas exitosamente en 'outputs/graphs'.")
+        if cached and os.listdir(graphs_dir):
+            print("Visualizaciones sin cambios en 'outputs/graphs'.")
+        else:
+            print("Generando visualizaciones...")
+            generate_visualizations(results)
+            print("Visualizaciones generadas exitosamente en 'outputs/graphs'.")
     except Exception as e:
         print(f"Error durante la generación de visualizaciones: {str(e)}")
         sys.exit(1)
@@ -139,6 +228,10 @@ def main():
         print(f"Error durante el envío del reporte por WhatsApp: {e}")
         # exit program
 
+    # cache the metrics the report read (the others were never computed)
+    if analyzer is not None:
+        analyzer.save_results()
+
     print("PROCESO COMPLETADO")
 
 if __name__ == "__main__":
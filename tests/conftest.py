@@ -0,0 +1,65 @@
+import logging
+import pandas as pd
+import pytest
+
+from create_sample_data import synthetic_sales
+
+# keys every engine computes exactly (the price quantiles are t-digest estimates outside 'pandas')
+
+EXACT_KEYS = ['sales_by_headquarter', 'top_models', 'sales_by_channel', 'sales_by_segment', 'monthly_sales_trend',
+              'temporal_by_headquarter', 'temporal_by_model', 'last_12_months', 'sales_forecast', 'anomalies']
+EXACT_METRICS = ['unique_clients', 'total_sales', 'total_sales_without_igv', 'total_sales_with_igv', 'total_igv_collected',
+                 'average_sales_without_igv', 'max_sale_without_igv', 'min_sale_without_igv']
+
+# series and frames sorted by index with text labels (categorical and object labels compare equal)
+
+def _plain(value):
+
+    if isinstance(value, (pd.Series, pd.DataFrame)):
+        value = value.sort_index()
+        if isinstance(value.index, pd.MultiIndex):
+            value.index = value.index.set_levels([level.astype(str) if level.dtype == object or isinstance(level, pd.CategoricalIndex)
+                                                  else level for level in value.index.levels])
+        elif isinstance(value.index, pd.CategoricalIndex):
+            value.index = value.index.astype(str)
+    return value
+
+# results of two engines or states agree on every exact key and summary metric
+
+def assert_same_results(expected, got):
+
+    for key in EXACT_KEYS:
+        left, right = _plain(expected[key]), _plain(got[key])
+        if isinstance(left, (pd.Series, pd.DataFrame)) and left.empty:
+            # empty results only agree on being empty (index dtypes of nothing differ between engines)
+            assert len(right) == 0, key
+        elif isinstance(left, pd.DataFrame):
+            pd.testing.assert_frame_equal(left, right, check_dtype=False, check_index_type=False, check_names=False, rtol=1e-9)
+        elif isinstance(left, pd.Series):
+            pd.testing.assert_series_equal(left, right, check_dtype=False, check_index_type=False, check_names=False, rtol=1e-9)
+        else:
+            assert right == pytest.approx(left, rel=1e-9), key
+    for metric in EXACT_METRICS:
+        assert float(got['summary_metrics'][metric]) == pytest.approx(float(expected['summary_metrics'][metric]), rel=1e-9), metric
+
+@pytest.fixture(scope='session')
+def sales() -> pd.DataFrame:
+
+    return synthetic_sales()
+
+# keep the INFO logs of every analysis out of the test output
+
+@pytest.fixture(autouse=True)
+def quiet_logs():
+
+    logging.disable(logging.INFO)
+    yield
+    logging.disable(logging.NOTSET)
+
+# run each test from its own directory, so outputs/ and data caches land in tmp_path
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
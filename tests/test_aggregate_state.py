@@ -0,0 +1,72 @@
+import pickle
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.aggregates import AggregateState, merge_states
+from utils.analyzer import DataAnalyzer, update_stored_aggregates
+from conftest import assert_same_results
+
+def _state(df: pd.DataFrame) -> AggregateState:
+
+    return DataAnalyzer(df).aggregate_state()
+
+@pytest.fixture(scope='module')
+def parts(sales):
+
+    # uneven row ranges, the middle one without Piura rows
+    a, b, c = sales.iloc[:4000], sales.iloc[4000:11000], sales.iloc[11000:]
+    return [_state(a), _state(b[b['Headquarter'] != 'Piura']), _state(c)], pd.concat([a, b[b['Headquarter'] != 'Piura'], c])
+
+def test_merged_partitions_match_whole_table(parts):
+
+    states, rows = parts
+    assert_same_results(_state(rows).results(), merge_states(states).results())
+
+def test_merge_is_associative(parts):
+
+    (a, b, c), _ = parts
+    assert_same_results(a.merge(b).merge(c).results(), a.merge(b.merge(c)).results())
+
+def test_merge_order_does_not_matter(parts):
+
+    states, _ = parts
+    assert_same_results(merge_states(states).results(), merge_states(reversed(states)).results())
+
+def test_empty_state_is_identity(parts):
+
+    (a, _, _), _ = parts
+    assert_same_results(a.results(), AggregateState().merge(a).results())
+    assert_same_results(a.results(), a.merge(AggregateState()).results())
+
+def test_merge_leaves_inputs_unchanged(parts):
+
+    (a, b, _), _ = parts
+    rows, total = a.rows, a.sum_without_igv
+    a.merge(b)
+    assert (a.rows, a.sum_without_igv) == (rows, total)
+
+def test_state_survives_pickling(parts):
+
+    states, _ = parts
+    state = merge_states(states)
+    assert_same_results(state.results(), pickle.loads(pickle.dumps(state)).results())
+
+def test_top_k_after_merge_matches_exact_counts(parts):
+
+    states, rows = parts
+    top = merge_states(states).top_k('Model', 5)
+    expected = rows['Model'].value_counts().head(5)
+    assert list(top.index.astype(str)) == list(expected.index.astype(str))
+    assert np.array_equal(top['count'].to_numpy(), expected.to_numpy())
+
+@pytest.mark.parametrize('first, second', [(('hll', 12), ('hll', 14)), (('exact', 14), ('hll', 14)), (('hll', 14), ('exact', 14))])
+def test_stored_aggregates_rebuilt_when_distinct_settings_change(workdir, sales, first, second):
+
+    # sketches of another mode or precision cannot be merged: the stored state asks for a full rebuild
+    head, tail = sales.iloc[:2000], sales.iloc[2000:4000]
+    update_stored_aggregates(head, 'ventas', reset=True, distinct=first[0], precision=first[1])
+    assert update_stored_aggregates(tail, 'ventas', expected_rows=2000, distinct=second[0], precision=second[1]) is None
+    results = update_stored_aggregates(sales.iloc[:4000], 'ventas', reset=True, distinct=second[0], precision=second[1])
+    assert results['summary_metrics']['total_sales'] == 4000
+    assert update_stored_aggregates(tail.iloc[:0], 'ventas', expected_rows=4000, distinct=second[0], precision=second[1]) is not None
@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.anomalies import (detect_anomalies, rolling_median_mad, empty_daily, ANOMALY_WINDOW, ANOMALY_STEP,
+                             ANOMALY_COLUMNS, IGV_RATE)
+
+DATES = pd.date_range('2023-01-01', periods=300, freq='D')
+
+# (Headquarter, Date) table of noisy daily sales with IGV at 18%, from day `start` of DATES on
+
+def _daily(headquarters=('Lima', 'Cusco'), start: int = 0, seed: int = 0) -> pd.DataFrame:
+
+    rng = np.random.default_rng(seed)
+    frames = []
+    for hq in headquarters:
+        dates = DATES[start:]
+        sales = rng.normal(10000, 500, len(dates)).round(2)
+        frames.append(pd.DataFrame({'Headquarter': hq, 'Date': dates, 'Price_Without_IGV': sales, 'IGV': (sales * IGV_RATE).round(2)}))
+    return pd.concat(frames).set_index(['Headquarter', 'Date'])
+
+def _metric(table: pd.DataFrame, metric: str) -> pd.DataFrame:
+
+    return table[table['metric'] == metric]
+
+def test_drop_and_spike_are_found():
+
+    daily = _daily()
+    daily.loc[('Lima', DATES[200]), ['Price_Without_IGV', 'IGV']] = [1000.0, 180.0]
+    daily.loc[('Cusco', DATES[250]), ['Price_Without_IGV', 'IGV']] = [40000.0, 7200.0]
+    table = detect_anomalies(daily)
+
+    assert list(table.columns) == ANOMALY_COLUMNS
+    assert list(_metric(table, 'sales_drop').index) == [(DATES[200], 'Lima')]
+    assert list(_metric(table, 'sales_spike').index) == [(DATES[250], 'Cusco')]
+    assert _metric(table, 'sales_spike')['expected'].iloc[0] == pytest.approx(10000, rel=0.05)
+    assert _metric(table, 'igv_ratio').empty
+
+def test_igv_ratio_drift_is_found():
+
+    daily = _daily()
+    daily.loc[('Cusco', DATES[20]), 'IGV'] = daily.loc[('Cusco', DATES[20]), 'Price_Without_IGV'] * 0.16
+    table = _metric(detect_anomalies(daily), 'igv_ratio')
+    assert list(table.index) == [(DATES[20], 'Cusco')]
+    assert table['value'].iloc[0] == pytest.approx(0.16)
+
+def test_days_before_a_full_window_are_not_scored():
+
+    # Piura opens on day 100: a collapse in its first window is not flagged, a later one is
+    daily = pd.concat([_daily(('Lima',)), _daily(('Piura',), start=100, seed=1)])
+    daily.loc[('Piura', DATES[150]), ['Price_Without_IGV', 'IGV']] = [500.0, 90.0]
+    daily.loc[('Piura', DATES[260]), ['Price_Without_IGV', 'IGV']] = [500.0, 90.0]
+    drops = _metric(detect_anomalies(daily), 'sales_drop')
+    assert list(drops.index) == [(DATES[260], 'Piura')]
+
+def test_only_top_n_per_metric():
+
+    daily = _daily()
+    for day in range(150, 290, 10):
+        daily.loc[('Lima', DATES[day]), ['Price_Without_IGV', 'IGV']] = [1000.0 + day, (1000.0 + day) * IGV_RATE]
+    drops = _metric(detect_anomalies(daily, top_n=3), 'sales_drop')
+    assert len(drops) == 3
+    assert (drops['score'].abs().diff().dropna() <= 0).all()
+
+def test_rolling_baseline_matches_pandas():
+
+    rng = np.random.default_rng(2)
+    matrix = rng.gamma(3, 1000, (200, 3))
+    median, mad = rolling_median_mad(matrix, ANOMALY_WINDOW, 1)
+    frame = pd.DataFrame(matrix)
+    expected = frame.rolling(ANOMALY_WINDOW).median().shift(1).to_numpy()
+    assert np.allclose(median[ANOMALY_WINDOW:], expected[ANOMALY_WINDOW:])
+    assert np.isnan(median[:ANOMALY_WINDOW]).all()
+
+    # with a step the days of a week share the baseline of the window before the week
+    weekly, _ = rolling_median_mad(matrix, ANOMALY_WINDOW, ANOMALY_STEP)
+    for day in range(ANOMALY_WINDOW, 200):
+        first = ANOMALY_WINDOW + (day - ANOMALY_WINDOW) // ANOMALY_STEP * ANOMALY_STEP
+        assert np.allclose(weekly[day], median[first])
+
+def test_empty_daily_table():
+
+    table = detect_anomalies(empty_daily())
+    assert table.empty
+    assert list(table.columns) == ANOMALY_COLUMNS
+
+def test_whatsapp_summary_lists_spikes_under_the_header(sales):
+
+    pytest.importorskip('twilio')
+    from utils.analyzer import DataAnalyzer
+    from utils.whatsapp_sender import WhatsAppSender
+
+    results = DataAnalyzer(sales).full_analysis().materialize()
+    index = pd.MultiIndex.from_arrays([[DATES[200]], ['Lima']], names=['Date', 'Headquarter'])
+    results['anomalies'] = pd.DataFrame({'metric': 'sales_spike', 'value': 40000.0, 'expected': 10000.0, 'score': 6.0},
+                                        index=index, columns=ANOMALY_COLUMNS)
+    text = WhatsAppSender.__new__(WhatsAppSender)._format_summary(results)
+    assert 'Días atípicos' in text
+    assert 'pico de ventas $40,000.00' in text
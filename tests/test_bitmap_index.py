@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.bitmap_index import SalesIndex, BITMAP_MAX_LABELS
+from create_sample_data import synthetic_sales
+
+FILTERS = [
+    {'Headquarter': 'Lima'},
+    {'Model': ['Modelo 1', 'Modelo 7', 'desconocido']},
+    {'Model': 'Modelo 3', 'Channel': 'Web', 'start': '2022-03-01', 'end': '2022-09-30'},
+    {'Segment': ['Individual', 'Gobierno'], 'Headquarter': ['Cusco', 'Piura'], 'Model': [f'Modelo {i}' for i in range(0, 60, 2)]},
+    {'Model': []},
+    {'start': '2023-05-01'},
+    {}
+]
+
+# row numbers of the filters with plain boolean masks
+
+def _expected(df: pd.DataFrame, start=None, end=None, **values) -> np.ndarray:
+
+    mask = np.ones(len(df), dtype=bool)
+    for dimension, selected in values.items():
+        selected = [selected] if isinstance(selected, str) else selected
+        mask &= df[dimension].isin(selected).to_numpy()
+    dates = df['Sell_Date']
+    if start is not None:
+        mask &= (dates >= start).to_numpy()
+    if end is not None:
+        mask &= (dates <= end).to_numpy()
+    if start is not None or end is not None:
+        mask &= dates.notna().to_numpy()
+    return np.flatnonzero(mask)
+
+@pytest.fixture(scope='module')
+def wide_sales():
+
+    return synthetic_sales(rows=20000, models=60, seed=5)
+
+def test_models_keep_row_lists(wide_sales):
+
+    index = SalesIndex.from_dataframe(wide_sales)
+    assert wide_sales['Model'].nunique() > BITMAP_MAX_LABELS
+    assert set(index.row_lists) == {'Model'}
+    assert set(index.bitmaps) == {'Headquarter', 'Channel', 'Segment'}
+
+@pytest.mark.parametrize('filters', FILTERS)
+def test_select_and_count_match_masks(wide_sales, filters):
+
+    index = SalesIndex.from_dataframe(wide_sales)
+    expected = _expected(wide_sales, **filters)
+    assert np.array_equal(index.select(**filters), expected)
+    assert index.count(**filters) == len(expected)
+
+def test_unknown_column_raises(wide_sales):
+
+    with pytest.raises(KeyError):
+        SalesIndex.from_dataframe(wide_sales).bitmap('Client_ID', 'CLI_1')
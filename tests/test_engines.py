@@ -0,0 +1,99 @@
+import pandas as pd
+import pytest
+
+from utils.analyzer import DataAnalyzer, RESULT_KEYS, analyze_chunks
+from utils.lazy_results import LazyResults
+from create_sample_data import synthetic_sales
+from conftest import assert_same_results
+
+@pytest.fixture(scope='module')
+def reference(sales):
+
+    return DataAnalyzer(sales, engine='pandas').full_analysis().materialize()
+
+@pytest.mark.parametrize('engine', ['fused', 'cube'])
+def test_engine_matches_pandas(sales, reference, engine):
+
+    assert_same_results(reference, DataAnalyzer(sales, engine=engine).full_analysis())
+
+@pytest.mark.parametrize('partition', ['rows', 'headquarter'])
+def test_parallel_engine_matches_pandas(sales, reference, partition):
+
+    results = DataAnalyzer(sales, engine='parallel', workers=2, partition=partition).full_analysis()
+    assert_same_results(reference, results)
+
+def test_streaming_matches_pandas(sales, reference):
+
+    results = analyze_chunks(sales.iloc[start:start + 3000] for start in range(0, len(sales), 3000))
+    assert_same_results(reference, results)
+
+@pytest.mark.parametrize('engine', ['fused', 'cube', 'parallel', 'streaming'])
+def test_engines_agree_without_valid_dates(engine):
+
+    # no months or days: the temporal keys are empty and the rest still matches
+    sales = synthetic_sales(rows=3000, dated=False)
+    expected = DataAnalyzer(sales, engine='pandas').full_analysis()
+    if engine == 'streaming':
+        results = analyze_chunks([sales.iloc[:1500], sales.iloc[1500:]])
+    else:
+        results = DataAnalyzer(sales, engine=engine, workers=2).full_analysis()
+    assert_same_results(expected, results)
+    for key in ['monthly_sales_trend', 'temporal_by_headquarter', 'sales_forecast', 'anomalies']:
+        assert len(results[key]) == 0, key
+    assert results['last_12_months'] == {}
+
+@pytest.mark.parametrize('engine', ['fused', 'cube'])
+def test_exact_engines_agree_on_top_clients(sales, reference, engine):
+
+    top_clients = DataAnalyzer(sales, engine=engine).full_analysis()['top_clients']
+    pd.testing.assert_frame_equal(reference['top_clients'], top_clients, check_dtype=False, check_index_type=False)
+    assert (reference['top_clients']['error'] == 0).all()
+    assert list(reference['top_clients']['count']) == list(sales['Client_ID'].value_counts().head(5))
+
+@pytest.mark.parametrize('engine', ['parallel', 'streaming'])
+def test_merged_top_clients_within_error_bounds(sales, engine):
+
+    # more clients than the summary capacity: the merged counts are estimates with per-client bounds
+    if engine == 'streaming':
+        results = analyze_chunks(sales.iloc[start:start + 3000] for start in range(0, len(sales), 3000))
+    else:
+        results = DataAnalyzer(sales, engine='parallel', workers=2).full_analysis()
+    exact = sales['Client_ID'].value_counts()
+    top_clients = results['top_clients']
+    assert len(top_clients) == 5
+    for client, row in top_clients.iterrows():
+        assert row['guaranteed'] <= exact[client] <= row['count']
+        assert row['error'] <= results['summary_metrics']['top_k_max_error']
+
+def test_fused_engine_without_fused_cells(sales, reference, monkeypatch):
+
+    # dimensions left out of the fused cells fall back to their own bincount
+    monkeypatch.setattr('utils.aggregates.FUSED_CELL_LIMIT', 64)
+    assert_same_results(reference, DataAnalyzer(sales, engine='fused').full_analysis())
+
+@pytest.mark.parametrize('engine', ['fused', 'cube', 'parallel'])
+def test_price_quantiles_close_to_exact(sales, reference, engine):
+
+    results = DataAnalyzer(sales, engine=engine, workers=2).full_analysis()
+    for metric in ['median_sale_without_igv', 'p90_sale_without_igv', 'p99_sale_without_igv']:
+        assert results['summary_metrics'][metric] == pytest.approx(reference['summary_metrics'][metric], rel=0.02)
+
+def test_results_are_lazy(sales):
+
+    results = DataAnalyzer(sales, engine='fused').full_analysis()
+    assert isinstance(results, LazyResults)
+    assert list(results) == list(RESULT_KEYS)
+    assert results.computed() == []
+    results['top_models']
+    assert results.computed() == ['top_models']
+
+def test_filtered_analysis_matches_filtered_rows(sales):
+
+    analyzer = DataAnalyzer(sales, engine='fused')
+    results = analyzer.filtered_analysis(Headquarter='Lima', Channel=['Web', 'Telemarketing'], start='2022-01-01', end='2022-12-31')
+    dates = sales['Sell_Date']
+    rows = sales[(sales['Headquarter'] == 'Lima') & sales['Channel'].isin(['Web', 'Telemarketing'])
+                 & (dates >= '2022-01-01') & (dates <= '2022-12-31')]
+    assert results['summary_metrics']['total_sales'] == len(rows)
+    assert results['summary_metrics']['total_sales_without_igv'] == pytest.approx(rows['Price_Without_IGV'].sum())
+    assert results['sales_by_channel'].sum() == rows['Channel'].notna().sum()
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.forecast import sales_forecast, forecast_summary, holt_winters, FORECAST_HORIZON, MIN_HISTORY
+
+MONTHS = pd.period_range('2021-01', periods=48, freq='M', name='Month')
+
+# (Headquarter, Model, Month) series from named monthly sales arrays aligned to the end of MONTHS
+
+def _series(**sales) -> pd.Series:
+
+    frames = []
+    for name, values in sales.items():
+        headquarter, model = name.split('_')
+        months = MONTHS[len(MONTHS) - len(values):]
+        frames.append(pd.Series(values, index=pd.MultiIndex.from_arrays(
+            [[headquarter] * len(values), [model] * len(values), months], names=['Headquarter', 'Model', 'Month'])))
+    return pd.concat(frames).rename('Price_Without_IGV')
+
+def test_constant_series_forecasts_the_constant():
+
+    fit = holt_winters(np.full((1, 36), 1000.0))
+    assert fit['forecast'] == pytest.approx(np.full((1, FORECAST_HORIZON), 1000.0))
+    assert fit['std'] == pytest.approx(np.zeros((1, FORECAST_HORIZON)), abs=1e-6)
+
+def test_linear_trend_is_extended():
+
+    fit = holt_winters((1000.0 + 50.0 * np.arange(30))[np.newaxis, :])
+    expected = 1000.0 + 50.0 * np.arange(30, 30 + FORECAST_HORIZON)
+    assert fit['forecast'][0] == pytest.approx(expected, rel=0.01)
+
+def test_seasonal_pattern_is_followed():
+
+    rng = np.random.default_rng(0)
+    months = np.arange(48)
+    season = 300.0 * np.sin(2 * np.pi * months / 12)
+    sales = 5000.0 + 10.0 * months + season + rng.normal(0, 20, 48)
+    fit = holt_winters(sales[np.newaxis, :])
+    future = np.arange(48, 48 + FORECAST_HORIZON)
+    expected = 5000.0 + 10.0 * future + 300.0 * np.sin(2 * np.pi * future / 12)
+    assert fit['seasonal'][0]
+    assert fit['forecast'][0] == pytest.approx(expected, rel=0.03)
+
+def test_series_are_fitted_independently():
+
+    rng = np.random.default_rng(1)
+    matrix = rng.gamma(5, 1000, (6, 40))
+    batched = holt_winters(matrix)
+    for row in range(len(matrix)):
+        single = holt_winters(matrix[row:row + 1])
+        assert single['forecast'][0] == pytest.approx(batched['forecast'][row])
+        assert single['std'][0] == pytest.approx(batched['std'][row])
+
+def test_forecast_table_layout():
+
+    rng = np.random.default_rng(2)
+    series = _series(Lima_A=rng.gamma(5, 1000, 48), Lima_B=rng.gamma(5, 1000, 20), Cusco_A=rng.gamma(5, 1000, MIN_HISTORY - 1))
+    table = sales_forecast(series)
+
+    # Cusco_A has too little history to be forecast
+    assert table.index.names == ['Headquarter', 'Model', 'Month']
+    assert sorted(set(zip(table.index.get_level_values(0), table.index.get_level_values(1)))) == [('Lima', 'A'), ('Lima', 'B')]
+    assert list(table.index.get_level_values('Month').unique()) == list(pd.period_range('2025-01', periods=FORECAST_HORIZON, freq='M'))
+    assert (table['lower'] <= table['forecast']).all() and (table['forecast'] <= table['upper']).all()
+    assert (table['lower'] >= 0).all()
+    # Lima_B has less than two seasons: trend only
+    assert not table.loc[('Lima', 'B'), 'seasonal'].any()
+
+def test_forecast_summary_totals():
+
+    rng = np.random.default_rng(3)
+    table = sales_forecast(_series(Lima_A=rng.gamma(5, 1000, 36), Piura_A=rng.gamma(5, 3000, 36)))
+    summary = forecast_summary(table)
+    assert summary['series'] == 2
+    assert summary['total'] == pytest.approx(table['forecast'].sum())
+    assert summary['lower'] <= summary['total'] <= summary['upper']
+    assert list(summary['by_headquarter'].index) == ['Piura', 'Lima']
+
+def test_empty_series():
+
+    table = sales_forecast(pd.Series(dtype=float))
+    assert table.empty
+    assert forecast_summary(table) == {}
@@ -0,0 +1,83 @@
+import pandas as pd
+import pytest
+
+from utils.data_loader import load_and_validate_data, save_watermark, select_new_rows, _build_watermark
+from create_sample_data import synthetic_sales
+
+@pytest.fixture
+def clean_sales():
+
+    # valid rows only, ordered by date like an export appended day after day
+    df = synthetic_sales(rows=3000, seed=3).dropna().sort_values('Sell_Date', kind='stable').reset_index(drop=True)
+    return df.astype({col: str for col in ['Headquarter', 'Model', 'Channel', 'Segment', 'Client_ID']})
+
+def _write(df: pd.DataFrame, path) -> str:
+
+    df.to_csv(path, index=False, date_format='%Y-%m-%d')
+    return str(path)
+
+# one incremental run: load, then persist the watermark as main.py does once the rows are processed
+
+def _run(source: str, **options):
+
+    df, report = load_and_validate_data(source, incremental=True, **options)
+    assert report['is_valid'], report
+    save_watermark(source, report['incremental']['watermark'])
+    return df, report['incremental']
+
+def test_first_run_is_full(workdir, clean_sales):
+
+    source = _write(clean_sales, workdir / 'ventas.csv')
+    df, info = _run(source)
+    assert info['mode'] == 'full'
+    assert len(df) == len(clean_sales)
+    assert info['watermark']['processed_rows'] == len(clean_sales)
+
+def test_appended_rows_only(workdir, clean_sales):
+
+    source = _write(clean_sales.iloc[:2000], workdir / 'ventas.csv')
+    _run(source)
+    _write(clean_sales, source)
+    df, info = _run(source)
+    assert info['mode'] == 'append'
+    assert info['previous_rows'] == 2000
+    assert list(df['Client_ID']) == list(clean_sales['Client_ID'].iloc[2000:])
+
+def test_nothing_new_is_valid_and_empty(workdir, clean_sales):
+
+    source = _write(clean_sales, workdir / 'ventas.csv')
+    _run(source)
+    df, info = _run(source)
+    assert info['mode'] == 'append'
+    assert df.empty
+
+def test_rewritten_rows_fall_back_to_dates(workdir, clean_sales):
+
+    old, new = clean_sales.iloc[:2000], clean_sales.iloc[2000:]
+    last_day = old['Sell_Date'].max()
+    # rows sold on the last processed day after the previous run are new as well
+    new = new[new['Sell_Date'] > last_day]
+    late = old[old['Sell_Date'] == last_day].iloc[:1].assign(Client_ID='CLI_tardio')
+
+    source = _write(old, workdir / 'ventas.csv')
+    _run(source)
+    _write(pd.concat([new, old.iloc[::-1], late]), source)
+    df, info = _run(source)
+    assert info['mode'] == 'date'
+    assert sorted(df['Client_ID']) == sorted(list(new['Client_ID']) + ['CLI_tardio'])
+
+def test_reset_reprocesses_everything(workdir, clean_sales):
+
+    source = _write(clean_sales, workdir / 'ventas.csv')
+    _run(source)
+    df, info = _run(source, reset_watermark=True)
+    assert info['mode'] == 'full'
+    assert len(df) == len(clean_sales)
+
+def test_select_new_rows_without_watermark(clean_sales):
+
+    df, mode = select_new_rows(clean_sales, None)
+    assert mode == 'full' and len(df) == len(clean_sales)
+    watermark = _build_watermark(clean_sales.iloc[:100], 100)
+    df, mode = select_new_rows(clean_sales, watermark)
+    assert mode == 'append' and len(df) == len(clean_sales) - 100
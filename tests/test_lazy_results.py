@@ -0,0 +1,65 @@
+import pickle
+
+from utils.analyzer import DataAnalyzer, RESULT_KEYS, REPORT_KEYS, cached_results
+from utils.lazy_results import LazyResults
+from utils.result_cache import ResultCache
+
+def test_entries_are_computed_once_on_first_access():
+
+    calls = []
+    results = LazyResults({'a': lambda: calls.append('a') or 1, 'b': lambda: calls.append('b') or 2})
+    assert len(results) == 2 and 'a' in results and calls == []
+    assert results['a'] == 1 and results['a'] == 1
+    assert calls == ['a']
+    assert results.computed() == ['a']
+    assert results.computed_values() == {'a': 1}
+    assert results.materialize() == {'a': 1, 'b': 2}
+    assert calls == ['a', 'b']
+
+def test_seeded_entries_skip_their_factory():
+
+    results = LazyResults({'a': lambda: 1 / 0, 'b': lambda: 2}).seed({'a': 1, 'c': 3})
+    assert results['a'] == 1
+    assert results.computed() == ['a']
+    assert 'c' not in results
+
+def test_pickles_as_plain_dict():
+
+    results = LazyResults.from_values({'a': 1})
+    assert pickle.loads(pickle.dumps(results)) == {'a': 1}
+
+def test_cache_hit_stays_a_lazy_mapping(workdir, sales):
+
+    cache = ResultCache(str(workdir / 'cache'))
+    first = DataAnalyzer(sales, result_cache=cache)
+    first.full_analysis().materialize()
+    first.save_results()
+
+    results = DataAnalyzer(sales, result_cache=cache).full_analysis()
+    assert isinstance(results, LazyResults)
+    assert results.computed() == list(RESULT_KEYS)
+    assert results.materialize().keys() == set(RESULT_KEYS)
+
+def test_cache_miss_computes_nothing_up_front(workdir, sales):
+
+    analyzer = DataAnalyzer(sales, result_cache=ResultCache(str(workdir / 'cache')))
+    assert analyzer.full_analysis().computed() == []
+    assert analyzer.save_results() is None
+
+def test_partial_entry_computes_the_rest_on_access(workdir, sales):
+
+    cache = ResultCache(str(workdir / 'cache'))
+    first = DataAnalyzer(sales, result_cache=cache)
+    top_models = first.full_analysis()['top_models']
+    first.save_results()
+    assert cache.get(first.cache_key()).keys() == {'top_models'}
+    assert cached_results(cache, first.cache_key()) is None
+
+    second = DataAnalyzer(sales, result_cache=cache)
+    results = second.full_analysis()
+    assert results['top_models'].equals(top_models)
+    for key in REPORT_KEYS:
+        results[key]
+    second.save_results()
+    assert set(cache.get(first.cache_key())) == set(REPORT_KEYS)
+    assert cached_results(cache, first.cache_key()) is not None
@@ -0,0 +1,98 @@
+import os
+import time
+import pytest
+
+from utils.analyzer import DataAnalyzer, analysis_config
+from utils.data_loader import dataset_fingerprint
+from utils.result_cache import ResultCache, results_cache_key
+
+@pytest.fixture
+def source(workdir, sales):
+
+    path = workdir / 'ventas.csv'
+    sales.iloc[:500].to_csv(path, index=False)
+    return str(path)
+
+def test_fingerprint_changes_with_the_data(source, sales):
+
+    before = dataset_fingerprint(source)
+    assert dataset_fingerprint(source) == before
+    sales.iloc[:501].to_csv(source, index=False)
+    assert dataset_fingerprint(source) != before
+
+def test_fingerprint_changes_with_the_modification_time(source):
+
+    before = dataset_fingerprint(source)
+    stat = os.stat(source)
+    os.utime(source, (stat.st_atime, stat.st_mtime + 60))
+    assert dataset_fingerprint(source) != before
+
+def test_fingerprint_changes_with_the_validation_rules(source, monkeypatch):
+
+    before = dataset_fingerprint(source)
+    monkeypatch.setattr('utils.data_loader.IGV_TOLERANCE', 0.5)
+    assert dataset_fingerprint(source) != before
+
+def test_key_changes_with_the_config():
+
+    keys = {results_cache_key('huella', analysis_config(engine, top_n)) for engine in ['fused', 'pandas'] for top_n in [5, 10]}
+    assert len(keys) == 4
+    assert results_cache_key('otra', analysis_config()) not in keys
+
+def test_put_get_and_miss(workdir):
+
+    cache = ResultCache(str(workdir / 'cache'))
+    cache.put('a', {'total': 1})
+    assert cache.get('a') == {'total': 1}
+    assert cache.get('b') is None
+
+def test_corrupt_entry_is_a_miss(workdir):
+
+    cache = ResultCache(str(workdir / 'cache'))
+    path = cache.put('a', {'total': 1})
+    with open(path, 'wb') as f:
+        f.write(b'no es zlib')
+    assert cache.get('a') is None
+    assert not os.path.exists(path)
+
+def test_eviction_keeps_recent_entries(workdir):
+
+    cache = ResultCache(str(workdir / 'cache'), max_entries=2)
+    now = time.time()
+    for age, key in [(300, 'vieja'), (200, 'media'), (100, 'nueva')]:
+        path = cache.put(key, {'key': key})
+        os.utime(path, (now - age, now - age))
+    cache.evict()
+    assert cache.get('vieja') is None
+    assert cache.get('media') == {'key': 'media'}
+
+def test_expired_entry_is_a_miss(workdir):
+
+    cache = ResultCache(str(workdir / 'cache'), max_age_days=1)
+    path = cache.put('a', {'total': 1})
+    old = time.time() - 2 * 86400
+    os.utime(path, (old, old))
+    assert cache.get('a') is None
+
+def test_analyzer_misses_when_the_rows_change(workdir, sales):
+
+    cache = ResultCache(str(workdir / 'cache'))
+    first = DataAnalyzer(sales.iloc[:1000], result_cache=cache)
+    first.full_analysis()['summary_metrics']
+    first.save_results()
+
+    same = DataAnalyzer(sales.iloc[:1000], result_cache=cache)
+    assert same.full_analysis().computed() == ['summary_metrics']
+    changed = DataAnalyzer(sales.iloc[:999], result_cache=cache)
+    assert changed.full_analysis().computed() == []
+    assert changed.full_analysis()['summary_metrics']['total_sales'] == 999
+
+def test_analyzer_misses_when_the_config_changes(workdir, sales):
+
+    cache = ResultCache(str(workdir / 'cache'))
+    first = DataAnalyzer(sales.iloc[:1000], result_cache=cache)
+    first.full_analysis()['top_models']
+    first.save_results()
+
+    assert DataAnalyzer(sales.iloc[:1000], result_cache=cache, engine='pandas').full_analysis().computed() == []
+    assert DataAnalyzer(sales.iloc[:1000], result_cache=cache, top_n=3).full_analysis().computed() == []
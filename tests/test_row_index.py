@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+
+from utils.data_loader import load_and_validate_data, save_watermark
+from utils.row_index import RowHashIndex, MAX_SEGMENTS
+from create_sample_data import synthetic_sales
+
+def test_add_and_contains_across_segments(tmp_path):
+
+    rng = np.random.default_rng(0)
+    index = RowHashIndex(str(tmp_path / 'history.npy'))
+    index.add(rng.integers(0, 2**63, 5000, dtype=np.uint64))
+    added = [index.hashes]
+    for _ in range(40):
+        batch = rng.integers(0, 2**63, 50, dtype=np.uint64)
+        # half of each batch repeats hashes already added
+        batch = np.concatenate([batch, rng.choice(np.concatenate(added), 50)])
+        index.add(batch)
+        added.append(batch)
+        assert len(index.segments) <= MAX_SEGMENTS
+
+    expected = np.unique(np.concatenate(added))
+    assert len(index) == len(expected)
+    assert index.contains(expected).all()
+    assert not index.contains(rng.integers(0, 2**63, 1000, dtype=np.uint64)).any()
+
+def test_save_compacts_and_reloads(tmp_path):
+
+    path = str(tmp_path / 'history.npy')
+    index = RowHashIndex(path)
+    for start in range(0, 100, 10):
+        index.add(np.arange(start, start + 10, dtype=np.uint64)[::-1])
+    index.save()
+    assert index.segments == []
+
+    reloaded = RowHashIndex(path)
+    assert len(reloaded) == 100
+    assert np.array_equal(reloaded.hashes, np.arange(100, dtype=np.uint64))
+
+def _run(source: str, **options):
+
+    df, report = load_and_validate_data(source, incremental=True, dedupe_history=True, **options)
+    save_watermark(source, report['incremental']['watermark'])
+    report['history_index'].save()
+    return df, report
+
+def test_dedupe_history_quarantines_rows_from_earlier_runs(workdir):
+
+    sales = synthetic_sales(rows=2000, seed=4).dropna().reset_index(drop=True)
+    source = str(workdir / 'ventas.csv')
+    sales.iloc[:1500].to_csv(source, index=False)
+    _run(source)
+
+    # the next export repeats 100 rows that were already processed
+    pd.concat([sales.iloc[:1500], sales.iloc[1500:], sales.iloc[:100]]).to_csv(source, index=False)
+    df, report = _run(source)
+    assert report['incremental']['mode'] == 'append'
+    assert report['seen_before_rows'] == 100
+    assert len(df) == len(sales) - 1500
+
+    # a full reprocess starts a new history: nothing counts as seen before
+    df, report = _run(source, reset_watermark=True)
+    assert report['seen_before_rows'] == 0
+    assert report['duplicate_rows'] == 100
+    assert len(df) == len(sales)
@@ -0,0 +1,121 @@
+from functools import reduce
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.analyzer import analyze_chunks
+from utils.sketches import HyperLogLog, ExactDistinct, SpaceSaving, hash_labels, merge_distinct
+
+def _hashes(n: int, offset: int = 0) -> np.ndarray:
+
+    return hash_labels([f'CLI_{i}' for i in range(offset, offset + n)])
+
+@pytest.mark.parametrize('precision', [10, 14])
+@pytest.mark.parametrize('n', [500, 20000, 300000])
+def test_hll_error_within_bound(precision, n):
+
+    hll = HyperLogLog(precision)
+    hll.add(_hashes(n))
+    # four standard errors: a failure is a bug, not bad luck
+    assert abs(hll.count() - n) <= 4 * hll.standard_error() * n
+
+def test_hll_ignores_repeated_hashes():
+
+    hll = HyperLogLog(12)
+    hashes = _hashes(5000)
+    hll.add(hashes)
+    registers = hll.registers.copy()
+    hll.add(hashes[::-1])
+    assert np.array_equal(hll.registers, registers)
+
+def test_hll_merge_equals_union():
+
+    left, right, union = HyperLogLog(12), HyperLogLog(12), HyperLogLog(12)
+    left.add(_hashes(6000))
+    right.add(_hashes(6000, offset=4000))
+    union.add(_hashes(10000))
+    merged = left.merge(right)
+    assert np.array_equal(merged.registers, union.registers)
+    assert merged.count() == union.count()
+
+def test_hll_rejects_bad_precision():
+
+    with pytest.raises(ValueError):
+        HyperLogLog(3)
+    with pytest.raises(ValueError):
+        HyperLogLog(12).merge(HyperLogLog(14))
+
+def test_exact_counter_keeps_sorted_union_across_chunks():
+
+    rng = np.random.default_rng(5)
+    chunks = [rng.integers(0, 5000, size, dtype=np.uint64) for size in [0, 1, 800, 3000, 2500, 10]]
+    exact = ExactDistinct()
+    for chunk in chunks:
+        exact.add(chunk)
+    expected = np.unique(np.concatenate(chunks))
+    np.testing.assert_array_equal(exact.hashes, expected)
+    np.testing.assert_array_equal(ExactDistinct(chunks[3]).merge(ExactDistinct(chunks[4])).hashes, np.union1d(chunks[3], chunks[4]))
+
+def test_exact_counter_folds_into_hll():
+
+    exact, hll = ExactDistinct(), HyperLogLog(12)
+    exact.add(_hashes(3000))
+    hll.add(_hashes(3000, offset=1000))
+    merged = merge_distinct(exact, hll)
+    assert isinstance(merged, HyperLogLog)
+    assert abs(merged.count() - 4000) <= 4 * merged.standard_error() * 4000
+
+def test_streaming_unique_clients_with_hll(sales):
+
+    chunks = (sales.iloc[start:start + 2500] for start in range(0, len(sales), 2500))
+    estimate = analyze_chunks(chunks, distinct='hll', precision=12)['summary_metrics']['unique_clients']
+    exact = sales['Client_ID'].nunique()
+    assert abs(estimate - exact) <= 4 * 1.04 / np.sqrt(1 << 12) * exact
+
+# Zipf-distributed labels split in partitions with different label mixes
+
+@pytest.fixture(scope='module')
+def zipf_partitions():
+
+    rng = np.random.default_rng(7)
+    partitions = []
+    for shift in range(12):
+        values = rng.zipf(1.3, 4000) % 2000 + shift * 37
+        partitions.append(pd.Series([f'Modelo {value}' for value in values]))
+    return partitions
+
+@pytest.mark.parametrize('capacity', [20, 100])
+def test_space_saving_bounds_hold_after_merges(zipf_partitions, capacity):
+
+    summary = reduce(lambda left, right: left.merge(right), (SpaceSaving.from_values(values, capacity) for values in zipf_partitions))
+    exact = pd.concat(zipf_partitions).value_counts()
+
+    assert summary.total == exact.sum()
+    assert len(summary.counts) <= capacity
+    true = exact.reindex(summary.counts.index, fill_value=0)
+    # monitored labels: the true count lies in [count - error, count], the error within total / capacity
+    assert (true <= summary.counts).all()
+    assert (true >= summary.counts - summary.errors).all()
+    assert (summary.errors <= summary.max_error()).all()
+    # unmonitored labels can not have more rows than the smallest monitored count plus the error bound
+    missing = exact.drop(summary.counts.index)
+    assert (missing <= summary.counts.min() + summary.max_error()).all()
+
+def test_space_saving_finds_the_heavy_hitters():
+
+    rng = np.random.default_rng(8)
+    partitions = [pd.Series([f'Modelo {value}' for value in rng.zipf(1.5, 4000) % 2000]) for _ in range(12)]
+    summary = reduce(lambda left, right: left.merge(right), (SpaceSaving.from_values(values, 50) for values in partitions))
+    exact = pd.concat(partitions).value_counts()
+    top = summary.top(3)
+    assert list(top.index) == list(exact.index[:3])
+    assert (top['guaranteed'] <= exact.iloc[:3].to_numpy()).all()
+
+def test_space_saving_is_exact_below_capacity():
+
+    left = SpaceSaving.from_values(['a', 'b', 'b', None], 10)
+    right = SpaceSaving.from_values(['b', 'c'], 10)
+    merged = left.merge(right)
+    assert merged.counts.to_dict() == {'b': 3, 'a': 1, 'c': 1}
+    assert (merged.errors == 0).all()
+    assert merged.total == 5
@@ -0,0 +1,85 @@
+import os
+import pandas as pd
+
+from utils.data_loader import (check_rows, validate_and_quarantine, load_and_validate_data, _concat_frames, ROW_NULL, ROW_DUPLICATE,
+                               ROW_IGV_MISMATCH, ROW_OUT_OF_RANGE, ROW_SEEN_BEFORE, SOURCE_COLUMN)
+from utils.row_index import RowHashIndex
+
+def _row(client: str, price: float = 1000.0, igv: float = None, with_igv: float = None, model: str = 'Modelo 1') -> dict:
+
+    igv = round(price * 0.18, 2) if igv is None else igv
+    return {'Sell_Date': pd.Timestamp('2024-03-01'), 'Headquarter': 'Lima', 'Model': model, 'Channel': 'Web',
+            'Segment': 'Individual', 'Client_ID': client, 'Price_Without_IGV': price, 'IGV': igv,
+            'Price_With_IGV': price + igv if with_igv is None else with_igv}
+
+def _sample() -> pd.DataFrame:
+
+    return pd.DataFrame([
+        _row('CLI_1'),                                  # clean
+        _row('CLI_2', model=None),                      # null
+        _row('CLI_1'),                                  # duplicate of the first row
+        _row('CLI_3', with_igv=2000.0),                 # IGV mismatch
+        _row('CLI_4', price=-50.0, igv=0.0),            # out of range
+        _row('CLI_5', price=-50.0, igv=0.0, with_igv=10.0)  # out of range and IGV mismatch
+    ])
+
+def test_each_check_sets_its_flag():
+
+    flags, null_counts, hashes = check_rows(_sample())
+    assert list(flags) == [0, ROW_NULL, ROW_DUPLICATE, ROW_IGV_MISMATCH, ROW_OUT_OF_RANGE, ROW_OUT_OF_RANGE | ROW_IGV_MISMATCH]
+    assert null_counts == {'Model': 1}
+    assert hashes[0] == hashes[2]
+
+def test_history_flags_rows_seen_before(workdir):
+
+    history = RowHashIndex(str(workdir / 'history.npy'))
+    df = _sample()
+    _, _, hashes = check_rows(df.iloc[:1])
+    history.add(hashes)
+    flags, _, _ = check_rows(df, history=history)
+    assert flags[0] == ROW_SEEN_BEFORE
+    assert flags[2] == ROW_DUPLICATE | ROW_SEEN_BEFORE
+
+def test_bad_rows_go_to_quarantine_with_their_reasons(workdir):
+
+    path = str(workdir / 'quarantine.csv')
+    clean, report = validate_and_quarantine(_sample(), quarantine_path=path)
+
+    assert report['is_valid']
+    assert list(clean['Client_ID']) == ['CLI_1']
+    assert (report['duplicate_rows'], report['igv_mismatch_rows'], report['out_of_range_rows']) == (1, 2, 2)
+    assert report['quarantined_rows'] == 5
+    assert report['quarantine_file'] == path
+
+    quarantine = pd.read_csv(path)
+    assert list(quarantine['Source_Row']) == [1, 2, 3, 4, 5]
+    assert list(quarantine['Quarantine_Reason']) == ['valores nulos', 'fila duplicada', 'IGV inconsistente',
+                                                     'valor fuera de rango', 'IGV inconsistente; valor fuera de rango']
+
+def test_all_rows_rejected_is_invalid(workdir):
+
+    df = _sample().iloc[1:2]
+    clean, report = validate_and_quarantine(df, quarantine_path=str(workdir / 'quarantine.csv'))
+    assert clean.empty
+    assert not report['is_valid']
+
+def test_missing_columns_are_reported():
+
+    df = _sample().drop(columns=['IGV'])
+    _, report = validate_and_quarantine(df)
+    assert not report['is_valid']
+    assert report['missing_columns'] == ['IGV']
+    assert report['quarantined_rows'] == 0
+
+def test_source_column_is_categorical_when_loading_by_chunks(workdir):
+
+    # several files tag each row with its file, read whole or by chunks
+    os.makedirs('ventas')
+    for name, clients in [('norte.csv', ['CLI_1', 'CLI_2']), ('sur.csv', ['CLI_3'])]:
+        pd.DataFrame([_row(client) for client in clients]).to_csv(os.path.join('ventas', name), index=False)
+    df, report = load_and_validate_data('ventas', max_workers=1)
+    chunks, _ = load_and_validate_data('ventas', chunk_size=1)
+    streamed = _concat_frames(list(chunks))
+    for frame in [df, streamed]:
+        assert isinstance(frame[SOURCE_COLUMN].dtype, pd.CategoricalDtype)
+        assert list(frame[SOURCE_COLUMN].astype(str)) == ['norte.csv', 'norte.csv', 'sur.csv']
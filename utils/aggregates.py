@@ -0,0 +1,626 @@
+import pandas as pd
+import numpy as np
+import logging
+from functools import reduce
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+from utils.data_loader import MONTH_COLUMN, month_key, month_key_to_period, day_key, day_key_to_date, parse_dates
+from utils.sketches import (DEFAULT_HLL_PRECISION, DEFAULT_TOP_K_CAPACITY, DEFAULT_TDIGEST_COMPRESSION, GroupedTDigest,
+                            HyperLogLog, SpaceSaving, hash_labels, new_distinct_sketch, merge_distinct)
+from utils.lazy_results import LazyResults
+from utils.temporal import TEMPORAL_DIMENSIONS, matrix_from_codes, temporal_table, temporal_table_from_series, period_summary
+from utils.forecast import FORECAST_DIMENSIONS, sales_forecast
+from utils.anomalies import ANOMALY_DIMENSION, DAILY_MEASURES, detect_anomalies, empty_daily
+
+logger = logging.getLogger(__name__)
+
+# label columns factorized once and shared by every aggregate
+
+DIMENSIONS = ['Headquarter', 'Model', 'Channel', 'Segment', 'Client_ID']
+
+# dimensions tracked with bounded-memory heavy hitters in aggregate states
+
+TOP_K_DIMENSIONS = ['Model', 'Client_ID']
+
+# price quantiles are sketched overall ('Total') and per headquarter and model
+
+QUANTILE_DIMENSIONS = ['Headquarter', 'Model']
+
+# low-cardinality dimensions combined into one cell code by the fused kernel (cells with their null buckets
+# are bincounted once; dimensions that would take the cells past FUSED_CELL_LIMIT get their own bincount)
+
+FUSED_DIMENSIONS = ['Headquarter', 'Model', 'Channel', 'Segment', 'Month']
+FUSED_CELL_LIMIT = 1 << 22
+
+# layout of AggregateState; persisted states of another version are rebuilt instead of merged
+
+STATE_VERSION = 4
+
+# integer codes and sorted labels of a column
+# nulls get the extra code len(labels), so kernels never need a mask
+
+def factorize_column(series: pd.Series):
+
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes, labels = series.cat.codes.to_numpy(), series.cat.categories
+    else:
+        codes, labels = pd.factorize(series, sort=True)
+        labels = pd.Index(labels)
+
+    if len(codes) and codes.min() < 0:
+        codes = np.where(codes < 0, len(labels), codes)
+    return codes, labels
+
+# float values of a measure column with nulls as 0 (pandas sums skip them)
+
+def _measure(series: pd.Series) -> np.ndarray:
+
+    values = series.to_numpy(dtype=float, na_value=np.nan)
+    nulls = np.isnan(values)
+    return np.where(nulls, 0.0, values) if nulls.any() else values
+
+class FactorizedSales:
+
+    # sales table as integer codes plus float measures
+
+    def __init__(self, df: pd.DataFrame, month_keys: np.ndarray = None, day_keys: np.ndarray = None):
+
+        self.rows = len(df)
+        self.codes: Dict[str, np.ndarray] = {}
+        self.labels: Dict[str, pd.Index] = {}
+
+        for col in DIMENSIONS:
+            self.codes[col], self.labels[col] = factorize_column(df[col])
+
+        # months as offsets from the first month so bincount stays small
+        if month_keys is not None:
+            keys = month_keys
+        elif MONTH_COLUMN in df.columns:
+            keys = df[MONTH_COLUMN].to_numpy()
+        else:
+            keys = month_key(parse_dates(df['Sell_Date']))
+        valid = keys >= 0
+        first_month = int(keys[valid].min()) if valid.any() else 0
+        last_month = int(keys[valid].max()) if valid.any() else -1
+        self.labels['Month'] = month_key_to_period(np.arange(first_month, last_month + 1)).rename('Month')
+        self.codes['Month'] = np.where(valid, keys - first_month, len(self.labels['Month']))
+
+        # days the same way (for the daily anomaly matrices)
+        days = day_keys if day_keys is not None else day_key(parse_dates(df['Sell_Date']))
+        valid = days >= 0
+        first_day = int(days[valid].min()) if valid.any() else 0
+        last_day = int(days[valid].max()) if valid.any() else -1
+        self.labels['Day'] = day_key_to_date(np.arange(first_day, last_day + 1)).rename('Date')
+        self.codes['Day'] = np.where(valid, days - first_day, len(self.labels['Day']))
+
+        raw_prices = df['Price_Without_IGV'].to_numpy(dtype=float, na_value=np.nan)
+        self.price_nulls = np.isnan(raw_prices)
+        self.price = np.where(self.price_nulls, 0.0, raw_prices) if self.price_nulls.any() else raw_prices
+        self.igv = _measure(df['IGV'])
+        self.price_with_igv = _measure(df['Price_With_IGV'])
+        self.label_hashes: Dict[str, np.ndarray] = {}
+
+    def size(self, dimension: str) -> int:
+
+        return len(self.labels[dimension])
+
+    # 64-bit hash of the labels of a dimension: all of them (computed once, row subsets share it)
+    # or only the selected ones, which are hashed on the spot unless all are already known
+
+    def hashes(self, dimension: str, selected: np.ndarray = None) -> np.ndarray:
+
+        if dimension in self.label_hashes:
+            hashes = self.label_hashes[dimension]
+            return hashes if selected is None else hashes[selected]
+        if selected is not None:
+            return hash_labels(self.labels[dimension][selected])
+        self.label_hashes[dimension] = hash_labels(self.labels[dimension])
+        return self.label_hashes[dimension]
+
+    # code and measure columns and label hashes as plain arrays (labels are kept apart),
+    # e.g. to place them in shared memory
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+
+        arrays = {f'codes_{dim}': codes for dim, codes in self.codes.items()}
+        arrays.update({f'hashes_{dim}': hashes for dim, hashes in self.label_hashes.items()})
+        arrays.update(price_nulls=self.price_nulls, price=self.price, igv=self.igv, price_with_igv=self.price_with_igv)
+        return arrays
+
+    # rebuild from arrays() and the labels, optionally keeping only some rows (a slice or row numbers)
+    # the labels stay the full ones, so partitions share codes
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray], labels: Dict[str, pd.Index], rows=None) -> 'FactorizedSales':
+
+        pick = (lambda values: values) if rows is None else (lambda values: values[rows])
+        data = cls.__new__(cls)
+        data.codes = {key[len('codes_'):]: pick(values) for key, values in arrays.items() if key.startswith('codes_')}
+        data.labels = labels
+        data.price_nulls = pick(arrays['price_nulls'])
+        data.price = pick(arrays['price'])
+        data.igv = pick(arrays['igv'])
+        data.price_with_igv = pick(arrays['price_with_igv'])
+        data.label_hashes = {key[len('hashes_'):]: values for key, values in arrays.items() if key.startswith('hashes_')}
+        data.rows = len(data.price)
+        return data
+
+# count rows or sum a measure per code (the null bucket is dropped)
+
+def _bincount(codes: np.ndarray, size: int, weights: np.ndarray = None) -> np.ndarray:
+
+    return np.bincount(codes, weights=weights, minlength=size + 1)[:size]
+
+class FusedCells:
+
+    # row counts and price sums of every (headquarter, model, channel, segment, month) cell from one
+    # bincount per measure over the combined codes: the counts and sums per dimension and the
+    # label x month matrices are marginals of these cells instead of one pass over the rows each
+
+    def __init__(self, data: FactorizedSales):
+
+        self.dimensions, self.shape = [], []
+        for dim in FUSED_DIMENSIONS:
+            size = data.size(dim) + 1
+            if int(np.prod(self.shape + [size])) <= FUSED_CELL_LIMIT:
+                self.dimensions.append(dim)
+                self.shape.append(size)
+
+        flat = np.zeros(data.rows, dtype=np.int64)
+        for dim, size in zip(self.dimensions, self.shape):
+            flat *= size
+            flat += data.codes[dim]
+
+        n_cells = int(np.prod(self.shape))
+        self.counts = np.bincount(flat, minlength=n_cells).reshape(self.shape)
+        self.sums = np.bincount(flat, weights=data.price, minlength=n_cells).reshape(self.shape)
+
+    def covers(self, *dimensions: str) -> bool:
+
+        return all(dim in self.dimensions for dim in dimensions)
+
+    # row counts ('count') or price sums of the cells rolled up to some dimensions (in that order, null buckets dropped)
+
+    def marginal(self, measure: str, dimensions: List[str]) -> np.ndarray:
+
+        values = self.counts if measure == 'count' else self.sums
+        axes = [self.dimensions.index(dim) for dim in dimensions]
+        other = tuple(axis for axis in range(len(self.dimensions)) if axis not in axes)
+        rolled = values.sum(axis=other) if other else values
+        # the kept axes are in cell order after the sum: reorder them as requested
+        rolled = np.moveaxis(rolled, np.argsort(np.argsort(axes)), range(len(axes)))
+        return rolled[tuple(slice(0, self.shape[axis] - 1) for axis in axes)]
+
+    # row count or price sum per label of a dimension (a bincount when the dimension is not in the cells)
+
+    def group(self, data: FactorizedSales, dimension: str, measure: str = 'count') -> np.ndarray:
+
+        if self.covers(dimension):
+            return self.marginal(measure, [dimension])
+        weights = None if measure == 'count' else data.price
+        return _bincount(data.codes[dimension], data.size(dimension), weights)
+
+# compute every aggregate full_analysis needs from the shared codes
+
+def fused_kernel(data: FactorizedSales, cells: FusedCells = None) -> Dict[str, Any]:
+
+    cells = cells or FusedCells(data)
+    counts = {dim: cells.group(data, dim) for dim in ['Headquarter', 'Model', 'Channel', 'Segment', 'Month']}
+    sums = {dim: cells.group(data, dim, 'Price_Without_IGV') for dim in ['Headquarter', 'Segment', 'Month']}
+    clients = _bincount(data.codes['Client_ID'], data.size('Client_ID'))
+
+    valid_prices = data.price[~data.price_nulls]
+    return {
+        'counts': counts,
+        'sums': sums,
+        'unique_clients': int(np.count_nonzero(clients)),
+        'rows': data.rows,
+        'price_count': len(valid_prices),
+        'sum_without_igv': float(data.price.sum()),
+        'sum_with_igv': float(data.price_with_igv.sum()),
+        'sum_igv': float(data.igv.sum()),
+        'max_without_igv': valid_prices.max() if len(valid_prices) else np.nan,
+        'min_without_igv': valid_prices.min() if len(valid_prices) else np.nan
+    }
+
+# t-digests of Price_Without_IGV overall ('Total') and per quantile dimension
+# (dimensions limits which ones are built)
+
+def price_digests(data: FactorizedSales, compression: float = DEFAULT_TDIGEST_COMPRESSION,
+                  dimensions: Iterable[str] = ('Total', *QUANTILE_DIMENSIONS)) -> Dict[str, GroupedTDigest]:
+
+    digests = {}
+    if 'Total' in dimensions:
+        values = data.price[~data.price_nulls] if data.price_nulls.any() else data.price
+        sorted_prices = np.sort(values)
+        digests['Total'] = GroupedTDigest.from_sorted(np.zeros(len(sorted_prices), dtype=np.int8), sorted_prices, pd.Index(['Total']), compression)
+
+    prices = np.where(data.price_nulls, np.nan, data.price) if data.price_nulls.any() else data.price
+    for dim in QUANTILE_DIMENSIONS:
+        if dim in dimensions:
+            digests[dim] = GroupedTDigest.from_values(data.codes[dim], data.labels[dim], prices, compression)
+    return digests
+
+# median/p90/p99 summary metrics from the overall digest
+
+def quantile_metrics(digest: GroupedTDigest) -> Dict[str, float]:
+
+    overall = digest.quantiles()
+    metrics = {}
+    for column in overall.columns:
+        name = 'median' if column == 'p50' else column
+        metrics[f'{name}_sale_without_igv'] = overall[column].iloc[0] if len(overall) else np.nan
+    return metrics
+
+# summary metrics and per-group tables of the price quantiles
+
+def quantile_results(digests: Dict[str, GroupedTDigest]) -> Dict[str, Any]:
+
+    return {
+        'summary_metrics': quantile_metrics(digests['Total']),
+        'price_quantiles_by_headquarter': digests['Headquarter'].quantiles(name='Headquarter'),
+        'price_quantiles_by_model': digests['Model'].quantiles(name='Model')
+    }
+
+# series of the groups that have rows
+
+def _group_series(values: np.ndarray, counts: np.ndarray, labels: pd.Index, name: str, dimension: str) -> pd.Series:
+
+    present = counts > 0
+    index = pd.Index(labels[present], name=dimension)
+    return pd.Series(values[present], index=index, name=name)
+
+# sort descending keeping label order for ties (like value_counts)
+
+def _sort_desc(series: pd.Series) -> pd.Series:
+
+    order = np.argsort(-series.to_numpy(), kind='stable')
+    return series.iloc[order]
+
+# top n labels of exact counts in the layout of SpaceSaving.top (count, error, guaranteed), with no error
+
+def exact_top(counts: pd.Series, n: int) -> pd.DataFrame:
+
+    top = SpaceSaving.from_counts(counts.index, counts.to_numpy(), max(n, 1)).top(n)
+    top.index.name = counts.index.name
+    return top
+
+# sparse (dimensions..., Month) series of price sums, rolled up from the fused cells when they cover
+# the dimensions or from one bincount over the combined codes (null labels or months and empty cells are dropped)
+
+def monthly_series(data: FactorizedSales, dimensions: Iterable[str], cells: FusedCells = None) -> pd.Series:
+
+    dimensions = list(dimensions)
+    shape = tuple(data.size(dim) for dim in dimensions)
+    # explicit sizes: without valid dates there are no months and the series is empty
+    n_groups, n_months = int(np.prod(shape)), data.size('Month')
+    if cells is not None and cells.covers(*dimensions, 'Month'):
+        matrix = cells.marginal('Price_Without_IGV', dimensions + ['Month']).reshape(n_groups, n_months)
+    else:
+        # null buckets of the label dimensions are dropped after the bincount
+        buckets = tuple(size + 1 for size in shape)
+        codes = np.ravel_multi_index(tuple(data.codes[dim] for dim in dimensions), buckets)
+        matrix = matrix_from_codes(codes, int(np.prod(buckets)), data.codes['Month'], n_months, data.price)
+        matrix = matrix.reshape(buckets + (n_months,))[tuple(slice(0, size) for size in shape)].reshape(n_groups, n_months)
+
+    groups, columns = np.nonzero(matrix)
+    parts = np.unravel_index(groups, shape)
+    index = pd.MultiIndex.from_arrays([data.labels[dim][part] for dim, part in zip(dimensions, parts)]
+                                      + [data.labels['Month'][columns]], names=dimensions + ['Month'])
+    return pd.Series(matrix[groups, columns], index=index, name='Price_Without_IGV')
+
+# (Headquarter, Date) table of daily price and IGV sums from one bincount per measure over the combined codes
+# (rows with a null headquarter or date are dropped, days without rows are left out)
+
+def daily_sales(data: FactorizedSales) -> pd.DataFrame:
+
+    n_labels, n_days = data.size(ANOMALY_DIMENSION), data.size('Day')
+    flat = data.codes[ANOMALY_DIMENSION].astype(np.int64) * (n_days + 1) + data.codes['Day']
+    size = (n_labels + 1) * (n_days + 1)
+    counts = np.bincount(flat, minlength=size).reshape(n_labels + 1, n_days + 1)[:n_labels, :n_days]
+
+    rows, columns = np.nonzero(counts)
+    cells = rows * (n_days + 1) + columns
+    index = pd.MultiIndex.from_arrays([data.labels[ANOMALY_DIMENSION][rows], data.labels['Day'][columns]],
+                                      names=[ANOMALY_DIMENSION, 'Date'])
+    measures = {'Price_Without_IGV': data.price, 'IGV': data.igv}
+    return pd.DataFrame({measure: np.bincount(flat, weights=measures[measure], minlength=size)[cells] for measure in DAILY_MEASURES},
+                        index=index)
+
+class FusedAggregator:
+
+    # aggregation engine for DataAnalyzer.full_analysis: categorical columns are factorized
+    # once (on first use) and every results entry is a bincount over the shared codes,
+    # computed only when that entry is read
+
+    def __init__(self, df: pd.DataFrame, month_keys: np.ndarray = None, day_keys: np.ndarray = None):
+
+        self.df = df
+        self.month_keys = month_keys
+        self.day_keys = day_keys
+        self._data = None
+        self._cells = None
+        self._counts: Dict[str, np.ndarray] = {}
+        self._digests: Dict[str, GroupedTDigest] = {}
+
+    @property
+    def data(self) -> FactorizedSales:
+
+        if self._data is None:
+            self._data = FactorizedSales(self.df, month_keys=self.month_keys, day_keys=self.day_keys)
+        return self._data
+
+    # counts and price sums of the fused cells (two bincounts shared by every grouped entry)
+
+    @property
+    def cells(self) -> FusedCells:
+
+        if self._cells is None:
+            self._cells = FusedCells(self.data)
+        return self._cells
+
+    # rows per label of a dimension (shared by the entries of that dimension)
+
+    def counts(self, dimension: str) -> np.ndarray:
+
+        if dimension not in self._counts:
+            self._counts[dimension] = self.cells.group(self.data, dimension)
+        return self._counts[dimension]
+
+    # row count or price sum per label, only for labels with rows
+
+    def group(self, dimension: str, measure: str = 'Price_Without_IGV') -> pd.Series:
+
+        counts = self.counts(dimension)
+        values = counts if measure == 'count' else self.cells.group(self.data, dimension, measure)
+        return _group_series(values, counts, self.data.labels[dimension], measure, dimension)
+
+    # rolling 12-month and growth table of a dimension from its label x month sales matrix
+
+    def temporal(self, dimension: str) -> pd.DataFrame:
+
+        data = self.data
+        if self.cells.covers(dimension, 'Month'):
+            matrix = self.cells.marginal('Price_Without_IGV', [dimension, 'Month'])
+        else:
+            matrix = matrix_from_codes(data.codes[dimension], data.size(dimension), data.codes['Month'], data.size('Month'), data.price)
+        present = self.counts(dimension) > 0
+        return temporal_table(matrix[present], data.labels[dimension][present], data.labels['Month'], dimension)
+
+    def digest(self, dimension: str) -> GroupedTDigest:
+
+        if dimension not in self._digests:
+            self._digests.update(price_digests(self.data, dimensions=(dimension,)))
+        return self._digests[dimension]
+
+    def summary_metrics(self) -> Dict[str, Any]:
+
+        data = self.data
+        clients = _bincount(data.codes['Client_ID'], data.size('Client_ID'))
+        valid_prices = data.price[~data.price_nulls] if data.price_nulls.any() else data.price
+        sum_without_igv = float(data.price.sum())
+
+        return {
+            'unique_clients': int(np.count_nonzero(clients)),
+            'total_sales': data.rows,
+            'total_sales_without_igv': sum_without_igv,
+            'total_sales_with_igv': float(data.price_with_igv.sum()),
+            'total_igv_collected': float(data.igv.sum()),
+            'average_sales_without_igv': sum_without_igv / len(valid_prices) if len(valid_prices) else np.nan,
+            'max_sale_without_igv': valid_prices.max() if len(valid_prices) else np.nan,
+            'min_sale_without_igv': valid_prices.min() if len(valid_prices) else np.nan,
+            **quantile_metrics(self.digest('Total'))
+        }
+
+    # lazy results mapping with the keys of DataAnalyzer.full_analysis
+
+    def results(self, top_n: int = 5) -> LazyResults:
+
+        return LazyResults({
+            'sales_by_headquarter': lambda: self.group('Headquarter').sort_values(ascending=False),
+            'top_models': lambda: _sort_desc(self.group('Model', 'count')).head(top_n),
+            'top_clients': lambda: exact_top(self.group('Client_ID', 'count'), top_n),
+            'sales_by_channel': lambda: _sort_desc(self.group('Channel', 'count')),
+            'sales_by_segment': lambda: self.group('Segment'),
+            'summary_metrics': self.summary_metrics,
+            'monthly_sales_trend': lambda: self.group('Month'),
+            'price_quantiles_by_headquarter': lambda: self.digest('Headquarter').quantiles(name='Headquarter'),
+            'price_quantiles_by_model': lambda: self.digest('Model').quantiles(name='Model'),
+            'temporal_by_headquarter': lambda: self.temporal('Headquarter'),
+            'temporal_by_model': lambda: self.temporal('Model'),
+            'last_12_months': lambda: period_summary(self.group('Month')),
+            'sales_forecast': lambda: sales_forecast(monthly_series(self.data, FORECAST_DIMENSIONS, self.cells)),
+            'anomalies': lambda: detect_anomalies(daily_sales(self.data))
+        })
+
+# null-aware max/min of two partial values
+
+def _merge_extreme(left: float, right: float, pick) -> float:
+
+    if pd.isna(left):
+        return right
+    if pd.isna(right):
+        return left
+    return pick(left, right)
+
+class AggregateState:
+
+    # mergeable partial aggregates (count, sums, min, max and a distinct-client sketch)
+    # an empty state is the identity and merge is associative, so states built per
+    # chunk, file or day can be combined in any grouping and give the same results
+    # distinct='hll' counts clients with a constant-memory HyperLogLog instead of exact hashes
+    # heavy_hitters keeps a Space-Saving top-K summary per dimension (models and clients by default)
+    # price_digests keeps mergeable t-digests of the price overall and per headquarter and model
+    # monthly keeps the price sums per (headquarter or model, month) for the rolling/growth tables
+    # and per (headquarter, model, month) for the sales forecast
+    # daily keeps the price and IGV sums per (headquarter, day) for the anomaly detection
+
+    def __init__(self, distinct: str = 'exact', precision: int = DEFAULT_HLL_PRECISION):
+
+        self.version = STATE_VERSION
+        self.rows = 0
+        self.price_count = 0
+        self.sum_without_igv = 0.0
+        self.sum_with_igv = 0.0
+        self.sum_igv = 0.0
+        self.max_without_igv = np.nan
+        self.min_without_igv = np.nan
+        self.counts: Dict[str, pd.Series] = {}
+        self.sums: Dict[str, pd.Series] = {}
+        self.monthly: Dict[Any, pd.Series] = {}
+        self.daily = empty_daily()
+        self.clients = new_distinct_sketch(distinct, precision)
+        self.heavy_hitters: Dict[str, SpaceSaving] = {}
+        self.price_digests: Dict[str, GroupedTDigest] = {}
+
+    # build the state of one partition from its rows
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame, month_keys: np.ndarray = None, day_keys: np.ndarray = None,
+                       **options) -> 'AggregateState':
+
+        return cls.from_factorized(FactorizedSales(df, month_keys=month_keys, day_keys=day_keys), **options)
+
+    @classmethod
+    def from_factorized(cls, data: FactorizedSales, distinct: str = 'exact', precision: int = DEFAULT_HLL_PRECISION,
+                        top_k_capacity: int = DEFAULT_TOP_K_CAPACITY, top_k_dimensions: Iterable[str] = None,
+                        tdigest_compression: float = DEFAULT_TDIGEST_COMPRESSION) -> 'AggregateState':
+
+        cells = FusedCells(data)
+        agg = fused_kernel(data, cells)
+        state = cls(distinct, precision)
+        state.rows = agg['rows']
+        state.price_count = agg['price_count']
+        state.sum_without_igv = agg['sum_without_igv']
+        state.sum_with_igv = agg['sum_with_igv']
+        state.sum_igv = agg['sum_igv']
+        state.max_without_igv = agg['max_without_igv']
+        state.min_without_igv = agg['min_without_igv']
+
+        for dim, counts in agg['counts'].items():
+            labels = data.labels[dim]
+            state.counts[dim] = _group_series(counts, counts, labels, 'count', dim)
+            if dim in agg['sums']:
+                state.sums[dim] = _group_series(agg['sums'][dim], counts, labels, 'Price_Without_IGV', dim)
+
+        for dim in TEMPORAL_DIMENSIONS:
+            state.monthly[dim] = monthly_series(data, [dim], cells)
+        state.monthly[FORECAST_DIMENSIONS] = monthly_series(data, FORECAST_DIMENSIONS, cells)
+        state.daily = daily_sales(data)
+
+        clients = _bincount(data.codes['Client_ID'], data.size('Client_ID'))
+        state.clients.add(data.hashes('Client_ID', clients > 0))
+
+        for dim in (TOP_K_DIMENSIONS if top_k_dimensions is None else top_k_dimensions):
+            counts = clients if dim == 'Client_ID' else agg['counts'].get(dim)
+            if counts is None:
+                counts = _bincount(data.codes[dim], data.size(dim))
+            present = counts > 0
+            state.heavy_hitters[dim] = SpaceSaving.from_counts(data.labels[dim][present], counts[present], top_k_capacity)
+
+        state.price_digests = price_digests(data, tdigest_compression)
+        return state
+
+    # combine two states into a new one (neither input is modified)
+
+    def merge(self, other: 'AggregateState') -> 'AggregateState':
+
+        merged = AggregateState()
+        merged.rows = self.rows + other.rows
+        merged.price_count = self.price_count + other.price_count
+        merged.sum_without_igv = self.sum_without_igv + other.sum_without_igv
+        merged.sum_with_igv = self.sum_with_igv + other.sum_with_igv
+        merged.sum_igv = self.sum_igv + other.sum_igv
+        merged.max_without_igv = _merge_extreme(self.max_without_igv, other.max_without_igv, max)
+        merged.min_without_igv = _merge_extreme(self.min_without_igv, other.min_without_igv, min)
+
+        for target, left, right in [(merged.counts, self.counts, other.counts), (merged.sums, self.sums, other.sums),
+                                    (merged.monthly, self.monthly, other.monthly)]:
+            for dim in left.keys() | right.keys():
+                if dim not in left or dim not in right:
+                    target[dim] = left.get(dim, right.get(dim))
+                else:
+                    target[dim] = left[dim].add(right[dim], fill_value=0).astype(left[dim].dtype)
+
+        if self.daily.empty or other.daily.empty:
+            merged.daily = other.daily if self.daily.empty else self.daily
+        else:
+            merged.daily = self.daily.add(other.daily, fill_value=0)
+
+        merged.clients = merge_distinct(self.clients, other.clients)
+        for dim in self.heavy_hitters.keys() | other.heavy_hitters.keys():
+            if dim not in self.heavy_hitters or dim not in other.heavy_hitters:
+                merged.heavy_hitters[dim] = self.heavy_hitters.get(dim, other.heavy_hitters.get(dim))
+            else:
+                merged.heavy_hitters[dim] = self.heavy_hitters[dim].merge(other.heavy_hitters[dim])
+        for dim in self.price_digests.keys() | other.price_digests.keys():
+            if dim not in self.price_digests or dim not in other.price_digests:
+                merged.price_digests[dim] = self.price_digests.get(dim, other.price_digests.get(dim))
+            else:
+                merged.price_digests[dim] = self.price_digests[dim].merge(other.price_digests[dim])
+        return merged
+
+    # distinct-client mode of the state and its HyperLogLog precision (None when counting exactly),
+    # kept in the pickled state with the sketch itself
+
+    def distinct_settings(self) -> Tuple[str, Optional[int]]:
+
+        return ('hll', self.clients.precision) if isinstance(self.clients, HyperLogLog) else ('exact', None)
+
+    # estimated top n labels of a tracked dimension with their error bounds
+
+    def top_k(self, dimension: str, n: int = 5) -> pd.DataFrame:
+
+        if dimension not in self.heavy_hitters:
+            raise KeyError(f"Dimensión sin resumen top-K: {dimension}")
+        top = self.heavy_hitters[dimension].top(n)
+        top.index.name = dimension
+        return top
+
+    # same results dict as DataAnalyzer.full_analysis
+    # top models and clients come from the merged Space-Saving summaries (exact while a dimension has
+    # at most top_k_capacity labels); top_k_max_error bounds the overestimation of any reported count
+
+    def results(self, top_n: int = 5) -> Dict[str, Any]:
+
+        empty = pd.Series(dtype=float)
+        quantiles = quantile_results(self.price_digests) if self.price_digests else {'summary_metrics': {}}
+        monthly_trend = self.sums.get('Month', empty).sort_index()
+        model_counts = self.counts.get('Model', empty).sort_index()
+        channel_counts = self.counts.get('Channel', empty).sort_index()
+        top_models = self.top_k('Model', top_n)['count'] if 'Model' in self.heavy_hitters else _sort_desc(model_counts).head(top_n)
+        top_clients = (self.top_k('Client_ID', top_n) if 'Client_ID' in self.heavy_hitters
+                       else pd.DataFrame(columns=['count', 'error', 'guaranteed']))
+
+        return {
+            'sales_by_headquarter': self.sums.get('Headquarter', empty).sort_values(ascending=False),
+            'top_models': top_models,
+            'top_clients': top_clients,
+            'sales_by_channel': _sort_desc(channel_counts),
+            'sales_by_segment': self.sums.get('Segment', empty).sort_index(),
+            'summary_metrics': {
+                'unique_clients': self.clients.count(),
+                'total_sales': self.rows,
+                'total_sales_without_igv': self.sum_without_igv,
+                'total_sales_with_igv': self.sum_with_igv,
+                'total_igv_collected': self.sum_igv,
+                'average_sales_without_igv': self.sum_without_igv / self.price_count if self.price_count else np.nan,
+                'max_sale_without_igv': self.max_without_igv,
+                'min_sale_without_igv': self.min_without_igv,
+                'top_k_max_error': max((summary.max_error() for summary in self.heavy_hitters.values()), default=0),
+                **quantiles['summary_metrics']
+            },
+            'monthly_sales_trend': monthly_trend,
+            'price_quantiles_by_headquarter': quantiles.get('price_quantiles_by_headquarter', pd.DataFrame()),
+            'price_quantiles_by_model': quantiles.get('price_quantiles_by_model', pd.DataFrame()),
+            'temporal_by_headquarter': temporal_table_from_series(self.monthly.get('Headquarter', empty), 'Headquarter'),
+            'temporal_by_model': temporal_table_from_series(self.monthly.get('Model', empty), 'Model'),
+            'last_12_months': period_summary(monthly_trend),
+            'sales_forecast': sales_forecast(self.monthly.get(FORECAST_DIMENSIONS, empty)),
+            'anomalies': detect_anomalies(self.daily)
+        }
+
+# merge any number of states (an empty iterable gives the empty state)
+
+def merge_states(states: Iterable[AggregateState]) -> AggregateState:
+
+    return reduce(lambda left, right: left.merge(right), states, AggregateState())
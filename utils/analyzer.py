@@ -1,20 +1,311 @@
 import pandas as pd
 import numpy as np
+import os
+import pickle
+import hashlib
 import logging
-from typing import Dict, Tuple, Any
+from typing import Dict, Tuple, Any, Iterable, Mapping, Optional
+from utils.data_loader import MONTH_COLUMN, STATE_DIR, hash_rows, month_key, month_key_to_period, day_key, day_key_to_date, parse_dates
+from utils.aggregates import FusedAggregator, AggregateState, STATE_VERSION, exact_top
+from utils.cube import SalesCube
+from utils.bitmap_index import SalesIndex
+from utils.parallel import parallel_analysis
+from utils.temporal import ROLLING_WINDOW, temporal_table_from_series, period_summary
+from utils.forecast import FORECAST_DIMENSIONS, FORECAST_HORIZON, sales_forecast, forecast_summary
+from utils.anomalies import ANOMALY_DIMENSION, DAILY_MEASURES, detect_anomalies
+from utils.sketches import DEFAULT_HLL_PRECISION, DEFAULT_TOP_K_CAPACITY, REPORTED_QUANTILES
+from utils.result_cache import ResultCache, results_cache_key
+from utils.lazy_results import LazyResults
 
 logger = logging.getLogger(__name__)
 
+# 'fused' computes every aggregate from shared integer codes, 'cube' answers them from a
+# materialized headquarter x model x channel x segment x month cube, 'pandas' runs one pandas call per metric,
+# 'parallel' aggregates partitions of the rows in a process pool and merges their states
+
+ENGINES = ('fused', 'cube', 'pandas', 'parallel')
+
+# bump when the content of the results dict changes so cached results are not reused
+
+ANALYZER_VERSION = 5
+
+# keys of the full_analysis results
+# (REPORT_KEYS are the ones read by the printed summary, the graphs and the WhatsApp message)
+
+RESULT_KEYS = ('sales_by_headquarter', 'top_models', 'top_clients', 'sales_by_channel', 'sales_by_segment', 'summary_metrics',
+               'monthly_sales_trend', 'price_quantiles_by_headquarter', 'price_quantiles_by_model', 'temporal_by_headquarter',
+               'temporal_by_model', 'last_12_months', 'sales_forecast', 'anomalies')
+REPORT_KEYS = ('sales_by_headquarter', 'top_models', 'top_clients', 'sales_by_channel', 'sales_by_segment', 'summary_metrics',
+               'monthly_sales_trend', 'sales_forecast', 'anomalies')
+
+# key of the per-row day keys in DataAnalyzer.derived
+
+DAY_KEY = 'Sell_Day'
+
+# settings that change the results of full_analysis (part of the results cache key)
+
+def analysis_config(engine: str = 'fused', top_n: int = 5) -> Dict[str, Any]:
+
+    return {'version': ANALYZER_VERSION, 'engine': engine, 'top_n': top_n}
+
+# cached results of a key as a lazy mapping, or None when the entry is missing or lacks some of `keys`
+# (entries only hold the metrics that were read when they were stored)
+
+def cached_results(result_cache: ResultCache, key: str, keys: Iterable[str] = REPORT_KEYS) -> Optional[LazyResults]:
+
+    values = result_cache.get(key)
+    if values is None or any(k not in values for k in keys):
+        return None
+    return LazyResults.from_values(values)
+
+# categorical columns come from the loader schema: drop unobserved categories and
+# return plain labels so results look the same as with object columns
+
+def _plain_index(series: pd.Series) -> pd.Series:
+
+    if isinstance(series.index, pd.CategoricalIndex):
+        series.index = series.index.astype(series.index.categories.dtype)
+    return series
+
+# sum a column by group
+
+def _group_sum(df: pd.DataFrame, by: str, column: str = 'Price_Without_IGV') -> pd.Series:
+
+    return _plain_index(df.groupby(by, observed=True)[column].sum())
+
+# count occurrences of each value (descending)
+
+def _count_values(series: pd.Series) -> pd.Series:
+
+    counts = series.value_counts()
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        counts = counts[counts > 0]
+    return _plain_index(counts)
+
+# signed percentage or n/d when there is no base to compare with
+
+def _format_growth(value: float) -> str:
+
+    return f"{value:+.1%}" if pd.notna(value) else "n/d"
+
+# lines of the last 12 months section: totals and growth, sales per headquarter and fastest growing model
+
+def _last_12_months_text(results: Mapping[str, Any]) -> str:
+
+    period = results.get('last_12_months') or {}
+    if not period:
+        return "- Sin fechas válidas para analizar."
+
+    lines = [
+        f"- Periodo: {period['first_month']} a {period['last_month']} ({period['months']} meses)",
+        f"- Ventas sin IGV: ${period['sales_last_12m']:,.2f} (vs 12 meses anteriores: {_format_growth(period['rolling_12m_growth'])})",
+        f"- Último mes ({period['last_month']}): ${period['last_month_sales']:,.2f} "
+        f"(MoM {_format_growth(period['mom_growth'])}, YoY {_format_growth(period['yoy_growth'])})"
+    ]
+
+    by_headquarter = results.get('temporal_by_headquarter')
+    if by_headquarter is not None and len(by_headquarter):
+        months = by_headquarter.index.get_level_values('Month')
+        recent = by_headquarter[months >= period['first_month']]['sales'].groupby(level=0).sum().sort_values(ascending=False)
+        latest = by_headquarter[months == period['last_month']].droplevel('Month')['rolling_12m_growth']
+        lines.append("- Ventas por sede: " + ", ".join(f"{hq} ${sales:,.2f} ({_format_growth(latest.get(hq, np.nan))})"
+                                                       for hq, sales in recent.items()))
+
+    by_model = results.get('temporal_by_model')
+    if by_model is not None and len(by_model):
+        latest = by_model[by_model.index.get_level_values('Month') == period['last_month']].droplevel('Month')['rolling_12m_growth'].dropna()
+        if len(latest):
+            lines.append(f"- Modelo con mayor crecimiento interanual: {latest.idxmax()} ({_format_growth(latest.max())})")
+
+    return "\n".join(lines)
+
+# lines of the next quarter forecast section: total with its 95% interval and forecast per headquarter
+
+def _forecast_text(results: Mapping[str, Any]) -> str:
+
+    forecast = forecast_summary(results.get('sales_forecast'))
+    if not forecast:
+        return "- Historial insuficiente para pronosticar."
+
+    return "\n".join([
+        f"- Periodo: {forecast['first_month']} a {forecast['last_month']} ({forecast['series']} series sede × modelo)",
+        f"- Ventas sin IGV: ${forecast['total']:,.2f} (IC 95%: ${forecast['lower']:,.2f} - ${forecast['upper']:,.2f})",
+        "- Por sede: " + ", ".join(f"{hq} ${sales:,.2f}" for hq, sales in forecast['by_headquarter'].items())
+    ])
+
+# lines of the anomalies section: strongest sales collapses and spikes and IGV ratio drifts
+
+def _anomalies_text(results: Mapping[str, Any], limit: int = 3) -> str:
+
+    anomalies = results.get('anomalies')
+    if anomalies is None or not len(anomalies):
+        return "- Sin días atípicos."
+
+    lines = []
+    for metric, label in [('sales_drop', 'caída de ventas'), ('sales_spike', 'pico de ventas')]:
+        for (date, hq), row in anomalies[anomalies['metric'] == metric].head(limit).iterrows():
+            lines.append(f"- {date:%Y-%m-%d} {hq}: {label} ${row['value']:,.2f} (esperado ${row['expected']:,.2f}, z {row['score']:+.1f})")
+    for (date, hq), row in anomalies[anomalies['metric'] == 'igv_ratio'].head(limit).iterrows():
+        lines.append(f"- {date:%Y-%m-%d} {hq}: IGV {row['value']:.2%} de la venta (esperado {row['expected']:.0%})")
+    return "\n".join(lines)
+
+# client with the most sales, with the error bound of its count when it comes from a Space-Saving summary
+
+def _top_client_text(results: Mapping[str, Any]) -> str:
+
+    top_clients = results.get('top_clients')
+    if top_clients is None or top_clients.empty:
+        return "n/d"
+    client, row = next(top_clients.iterrows())
+    error = f", error ±{int(row['error']):,}" if row['error'] > 0 else ""
+    return f"{client} ({int(row['count']):,} compras{error})"
+
+# text summary of a results mapping (shared by DataAnalyzer and StreamingAnalyzer)
+
+def text_summary(results: Mapping[str, Any]) -> str:
+
+    try:
+        metrics = results['summary_metrics']
+        top_models = results['top_models'].index[0]
+        top_headquarter = results['sales_by_headquarter'].index[0]
+        top_channel = results['sales_by_channel'].index[0]
+
+        summary = f"""
+
+Resumen del Análisis de Ventas:
+
+Metricas Clave:
+- Clientes Únicos: {metrics['unique_clients']:,}
+- Total de Ventas: {metrics['total_sales']:,}
+- Ventas Totales sin IGV: ${metrics['total_sales_without_igv']:,.2f}
+- Ventas Totales con IGV: ${metrics['total_sales_with_igv']:,.2f}
+- IGV Total Recaudado: ${metrics['total_igv_collected']:,.2f}
+- Venta Promedio: ${metrics['average_sales_without_igv']:,.2f}
+
+Mejores Desempeños:
+- Modelo Más Vendido: {top_models}
+- Cliente con Más Compras: {_top_client_text(results)}
+- Sede con Más Ventas: {top_headquarter}
+- Canal con Más Ventas: {top_channel}
+
+Análisis de los ultimos 12 Meses:
+{_last_12_months_text(results)}
+
+Pronóstico Próximo Trimestre:
+{_forecast_text(results)}
+
+Días Atípicos:
+{_anomalies_text(results)}
+        """
+
+        return summary
+
+    except Exception as e:
+        logger.error(f"Error generando resumen de texto: {str(e)}")
+        return "Error generando resumen de texto."
+
 class DataAnalyzer:
     
     # class to make financial and statistical analysis on sales data
 
-    def __init__(self, df: pd.DataFrame):
+    def __init__(self, df: pd.DataFrame, engine: str = 'fused', copy: bool = False, top_n: int = 5,
+                 result_cache: Optional[ResultCache] = None, fingerprint: Optional[str] = None,
+                 workers: Optional[int] = None, partition: str = 'rows'):
 
         # initialize with sales data
-
-        self.df = df.copy()
+        # the frame is never modified, so by default it is shared instead of copied;
+        # derived columns live in self.derived
+        # with a result_cache, full_analysis reuses results stored for the same data fingerprint
+        # (dataset_fingerprint of the source, or a hash of the rows when not given) and config
+        # the parallel engine uses `workers` processes (all cores by default) over partitions by 'rows' or 'headquarter'
+
+        if engine not in ENGINES:
+            raise ValueError(f"Motor de análisis desconocido: {engine}")
+
+        self.df = df.copy() if copy else df
+        self.engine = engine
+        self.top_n = top_n
+        self.derived: Dict[str, np.ndarray] = {}
+        self.cube: Optional[SalesCube] = None
+        self.index: Optional[SalesIndex] = None
+        self.result_cache = result_cache
+        self.fingerprint = fingerprint
+        self.workers = workers
+        self.partition = partition
         self.results = {}
+        self._cached_keys = set()
+
+    # results cache key of this analyzer
+
+    def cache_key(self) -> str:
+
+        if self.fingerprint is None:
+            self.fingerprint = hashlib.sha256(hash_rows(self.df).tobytes()).hexdigest()
+        return results_cache_key(self.fingerprint, analysis_config(self.engine, self.top_n))
+
+    # read-only numpy view of a column (no copy for numeric columns)
+
+    def values(self, column: str) -> np.ndarray:
+
+        view = self.df[column].to_numpy().view()
+        view.flags.writeable = False
+        return view
+
+    # integer month key per row, from the loader column or derived once and kept aside
+
+    def month_keys(self) -> np.ndarray:
+
+        if MONTH_COLUMN in self.df.columns:
+            return self.values(MONTH_COLUMN)
+        if MONTH_COLUMN not in self.derived:
+            keys = month_key(parse_dates(self.df['Sell_Date']))
+            keys.flags.writeable = False
+            self.derived[MONTH_COLUMN] = keys
+        return self.derived[MONTH_COLUMN]
+
+    # integer day key per row, derived once and kept aside
+
+    def day_keys(self) -> np.ndarray:
+
+        if DAY_KEY not in self.derived:
+            keys = day_key(parse_dates(self.df['Sell_Date']))
+            keys.flags.writeable = False
+            self.derived[DAY_KEY] = keys
+        return self.derived[DAY_KEY]
+
+    # build (once) the cube every roll-up is answered from
+
+    def build_cube(self) -> SalesCube:
+
+        if self.cube is None:
+            self.cube = SalesCube.from_dataframe(self.df, month_keys=self.month_keys(), day_keys=self.day_keys())
+        return self.cube
+
+    # build (once) the bitmap and date indexes filtered analyses select rows with
+
+    def build_index(self) -> SalesIndex:
+
+        if self.index is None:
+            self.index = SalesIndex.from_dataframe(self.df)
+        return self.index
+
+    # analyzer over the rows with start <= Sell_Date <= end and the given labels per column
+    # (e.g. filter(Headquarter='Lima', Channel=['Web', 'Tienda'], start='2024-01-01'))
+
+    def filter(self, start=None, end=None, **values) -> 'DataAnalyzer':
+
+        rows = self.build_index().select(start, end, **values)
+        subset = DataAnalyzer(self.df.take(rows), engine=self.engine, top_n=self.top_n, workers=self.workers, partition=self.partition)
+        for key, keys in self.derived.items():
+            subset.derived[key] = keys[rows]
+        logger.info(f"Filtro aplicado: {len(rows)} de {len(self.df)} filas.")
+        return subset
+
+    # full analysis of the filtered rows
+
+    def filtered_analysis(self, start=None, end=None, **values) -> Mapping[str, Any]:
+
+        return self.filter(start, end, **values).full_analysis()
 
     def validate_data(self) -> bool:
 
@@ -43,7 +334,7 @@ class DataAnalyzer:
     def calculate_sales_without_igv(self) -> pd.Series:
 
         try: 
-            sales_by_headquarter = self.df.groupby('Headquarter')['Price_Without_IGV'].sum().sort_values(ascending=False)
+            sales_by_headquarter = _group_sum(self.df, 'Headquarter').sort_values(ascending=False)
             logger.info("Ventas sin IGV calculadas por sede.")
             return sales_by_headquarter
         except KeyError as e:
@@ -52,22 +343,36 @@ class DataAnalyzer:
 
     # get top N models (cars)
 
-    def get_top_n_models(self) -> pd.Series:
+    def get_top_n_models(self, n: Optional[int] = None) -> pd.Series:
 
         try:
-            top_models = self.df['Model'].value_counts().head(5)
-            logger.info("Top 5 modelos obtenidos.")
+            n = self.top_n if n is None else n
+            top_models = _count_values(self.df['Model']).head(n)
+            logger.info(f"Top {n} modelos obtenidos.")
             return top_models
         except Exception as e:
             logger.error(f"Error obteniendo top modelos: {str(e)}")
             raise
+
+    # get top N clients by number of sales (exact counts, error 0)
+
+    def get_top_n_clients(self, n: Optional[int] = None) -> pd.DataFrame:
+
+        try:
+            n = self.top_n if n is None else n
+            top_clients = exact_top(_count_values(self.df['Client_ID']), n)
+            logger.info(f"Top {n} clientes obtenidos.")
+            return top_clients
+        except Exception as e:
+            logger.error(f"Error obteniendo top clientes: {str(e)}")
+            raise
     
     # analize sales by channel
 
     def analyze_sales_by_channel(self) -> pd.Series:
 
         try:
-            sales_by_channel = self.df['Channel'].value_counts()
+            sales_by_channel = _count_values(self.df['Channel'])
             logger.info("Análisis de ventas por canal completado.")
             return sales_by_channel
         except Exception as e:
@@ -79,7 +384,7 @@ class DataAnalyzer:
     def segment_sales_by_client(self) -> pd.Series:
 
         try:
-            segmented_sales = self.df.groupby('Segment')['Price_Without_IGV'].sum()
+            segmented_sales = _group_sum(self.df, 'Segment')
             logger.info("Segmentación de ventas por cliente completada.")
             return segmented_sales
         except Exception as e:
@@ -108,6 +413,36 @@ class DataAnalyzer:
             logger.error(f"Error resumiendo análisis: {str(e)}")
             raise
     
+    # exact quantiles of Price_Without_IGV overall and per headquarter and model
+    # (the fused and cube engines and aggregate states estimate them with t-digests)
+
+    def analyze_price_quantiles(self) -> Dict[str, Any]:
+
+        try:
+            tables = {f'price_quantiles_by_{dim.lower()}': self.price_quantile_table(dim) for dim in ['Headquarter', 'Model']}
+            logger.info("Cuantiles de precios calculados.")
+            return {'summary_metrics': self.price_quantile_metrics(), **tables}
+        except Exception as e:
+            logger.error(f"Error calculando cuantiles de precios: {str(e)}")
+            raise
+
+    # median/p90/p99 of Price_Without_IGV as summary metrics
+
+    def price_quantile_metrics(self) -> Dict[str, float]:
+
+        overall = self.df['Price_Without_IGV'].quantile(REPORTED_QUANTILES)
+        return {f"{'median' if q == 0.5 else f'p{q * 100:g}'}_sale_without_igv": value for q, value in zip(REPORTED_QUANTILES, overall)}
+
+    # p50/p90/p99 columns of Price_Without_IGV per label of a dimension
+
+    def price_quantile_table(self, dimension: str) -> pd.DataFrame:
+
+        table = self.df.groupby(dimension, observed=True)['Price_Without_IGV'].quantile(REPORTED_QUANTILES).unstack()
+        table.columns = [f"p{q * 100:g}" for q in REPORTED_QUANTILES]
+        if isinstance(table.index, pd.CategoricalIndex):
+            table.index = table.index.astype(table.index.categories.dtype)
+        return table
+
     # analyze temporal sales trends
 
     def analyze_temporal_trends(self) -> pd.Series:
@@ -115,16 +450,27 @@ class DataAnalyzer:
         try: 
             # compute monthly sales trend if Sell_Date exists
             if 'Sell_Date' in self.df.columns:
-                # ensure Sell_Date is datetime
-                self.df['Sell_Date'] = pd.to_datetime(self.df['Sell_Date'], errors='coerce')
+                # the loader stores an integer month key; derive it only for frames built elsewhere
+                keys = self.month_keys()
+
                 # drop rows with invalid dates
-                valid_df = self.df.dropna(subset=['Sell_Date']).copy()
-                if valid_df.empty:
+                valid = keys >= 0
+                if not valid.any():
                     logger.warning("No hay fechas válidas en 'Sell_Date' para analizar tendencias temporales.")
                     return pd.Series(dtype=float)
 
-                valid_df['Month'] = valid_df['Sell_Date'].dt.to_period('M')
-                monthly_sales = valid_df.groupby('Month')['Price_Without_IGV'].sum()
+                # integer bincount over the month keys (rows are only filtered when some dates are invalid)
+                prices = self.values('Price_Without_IGV')
+                if not valid.all():
+                    keys, prices = keys[valid], prices[valid]
+                first_month = int(keys.min())
+                offsets = keys - first_month
+                counts = np.bincount(offsets)
+                sums = np.bincount(offsets, weights=np.nan_to_num(prices))
+                months = np.flatnonzero(counts)
+
+                index = month_key_to_period(months + first_month).rename('Month')
+                monthly_sales = pd.Series(sums[months], index=index, name='Price_Without_IGV')
                 logger.info("Análisis de tendencias temporales completado.")
                 return monthly_sales
             else:
@@ -134,24 +480,82 @@ class DataAnalyzer:
             logger.error(f"Error analizando tendencias temporales: {str(e)}")
             return pd.Series()
         
+    # price sums per label combination of the dimensions and month (rows without a valid date are dropped)
+
+    def monthly_sums(self, dimensions: Iterable[str]) -> pd.Series:
+
+        dimensions = list(dimensions)
+        keys = self.month_keys()
+        prices = pd.Series(np.nan_to_num(self.values('Price_Without_IGV')), index=self.df.index)
+        sums = prices.groupby([self.df[dim] for dim in dimensions] + [keys], observed=True).sum()
+        sums = sums[sums.index.get_level_values(-1) >= 0]
+
+        levels = []
+        for labels in sums.index.levels[:-1]:
+            levels.append(labels.astype(labels.categories.dtype) if isinstance(labels, pd.CategoricalIndex) else labels)
+        sums.index = sums.index.set_levels(levels + [month_key_to_period(sums.index.levels[-1])]).set_names(dimensions + ['Month'])
+        return sums
+
+    # monthly sales per label of a dimension with rolling 12-month totals and MoM, YoY and rolling growth
+
+    def analyze_rolling_trends(self, dimension: str) -> pd.DataFrame:
+
+        try:
+            table = temporal_table_from_series(self.monthly_sums([dimension]), dimension)
+            logger.info(f"Tendencias de {ROLLING_WINDOW} meses por {dimension} calculadas.")
+            return table
+        except Exception as e:
+            logger.error(f"Error analizando tendencias de {ROLLING_WINDOW} meses: {str(e)}")
+            raise
+
+    # next-quarter forecast with 95% intervals of every headquarter x model monthly sales series
+
+    def analyze_sales_forecast(self, horizon: int = FORECAST_HORIZON) -> pd.DataFrame:
+
+        try:
+            return sales_forecast(self.monthly_sums(FORECAST_DIMENSIONS), horizon)
+        except Exception as e:
+            logger.error(f"Error calculando el pronóstico de ventas: {str(e)}")
+            raise
+
+    # most unusual days per headquarter: sales far from the median of the previous weeks and IGV ratios away from 18%
+
+    def analyze_daily_anomalies(self) -> pd.DataFrame:
+
+        try:
+            keys = self.day_keys()
+            frame = pd.DataFrame({measure: np.nan_to_num(self.values(measure)) for measure in DAILY_MEASURES}, index=self.df.index)
+            daily = frame.groupby([self.df[ANOMALY_DIMENSION], keys], observed=True).sum()
+            daily = daily[daily.index.get_level_values(1) >= 0]
+
+            labels = daily.index.levels[0]
+            if isinstance(labels, pd.CategoricalIndex):
+                labels = labels.astype(labels.categories.dtype)
+            daily.index = daily.index.set_levels([labels, day_key_to_date(daily.index.levels[1])]).set_names([ANOMALY_DIMENSION, 'Date'])
+            return detect_anomalies(daily)
+        except Exception as e:
+            logger.error(f"Error detectando anomalías diarias: {str(e)}")
+            raise
+
     # do full analysis
+    # returns a read-only mapping whose metrics are computed on first access
+    # (call .materialize() on it for a plain dict with every metric)
 
-    def full_analysis(self) -> Dict[str, Any]:
+    def full_analysis(self) -> Mapping[str, Any]:
 
         try: 
             if not self.validate_data():
                 raise ValueError("Data validation failed.")
             logger.info("Iniciando análisis completo de datos.")
 
-            # Use keys expected by the visualizer
-            self.results = {
-                'sales_by_headquarter': self.calculate_sales_without_igv(),
-                'top_models': self.get_top_n_models(),
-                'sales_by_channel': self.analyze_sales_by_channel(),
-                'sales_by_segment': self.segment_sales_by_client(),
-                'summary_metrics': self.summarize_analysis(),
-                'monthly_sales_trend': self.analyze_temporal_trends()
-            }
+            # a cached entry answers the metrics it holds, the others are still computed on first access
+            cached = (self.result_cache.get(self.cache_key()) or {}) if self.result_cache is not None else {}
+            self._cached_keys = set(cached)
+            if all(key in cached for key in RESULT_KEYS):
+                self.results = LazyResults.from_values(cached)
+                return self.results
+
+            self.results = self._compute_results().seed(cached)
 
             logger.info("Análisis completo de datos finalizado.")
             return self.results
@@ -159,50 +563,182 @@ class DataAnalyzer:
         except Exception as e:
             logger.error(f"Error en el análisis completo de datos: {str(e)}")
             raise
-    
+
+    # store the metrics computed so far in the results cache; call it once the results have been read,
+    # so metrics nobody asked for stay uncomputed (returns the entry path, None when there is nothing new)
+
+    def save_results(self) -> Optional[str]:
+
+        if self.result_cache is None or not isinstance(self.results, LazyResults):
+            return None
+        values = self.results.computed_values()
+        if not values or set(values) <= self._cached_keys:
+            return None
+        self._cached_keys = set(values)
+        return self.result_cache.put(self.cache_key(), values)
+
+    # lazy results of the selected engine (keys expected by the visualizer):
+    # each entry is computed the first time it is read
+
+    def _compute_results(self) -> LazyResults:
+
+        if self.engine == 'fused':
+            return FusedAggregator(self.df, month_keys=self.month_keys(), day_keys=self.day_keys()).results(self.top_n)
+        if self.engine == 'cube':
+            return self.build_cube().results(self.top_n)
+        if self.engine == 'parallel':
+            return LazyResults.from_values(parallel_analysis(self.df, month_keys=self.month_keys(), day_keys=self.day_keys(), workers=self.workers,
+                                                             partition=self.partition, top_n=self.top_n))
+
+        return LazyResults({
+            'sales_by_headquarter': self.calculate_sales_without_igv,
+            'top_models': self.get_top_n_models,
+            'top_clients': self.get_top_n_clients,
+            'sales_by_channel': self.analyze_sales_by_channel,
+            'sales_by_segment': self.segment_sales_by_client,
+            'summary_metrics': lambda: {**self.summarize_analysis(), **self.price_quantile_metrics()},
+            'monthly_sales_trend': self.analyze_temporal_trends,
+            'price_quantiles_by_headquarter': lambda: self.price_quantile_table('Headquarter'),
+            'price_quantiles_by_model': lambda: self.price_quantile_table('Model'),
+            'temporal_by_headquarter': lambda: self.analyze_rolling_trends('Headquarter'),
+            'temporal_by_model': lambda: self.analyze_rolling_trends('Model'),
+            'last_12_months': lambda: period_summary(self.analyze_temporal_trends()),
+            'sales_forecast': self.analyze_sales_forecast,
+            'anomalies': self.analyze_daily_anomalies
+        })
+
+    # mergeable aggregate state of these rows (combine partitions with AggregateState.merge)
+    # distinct='hll' estimates unique clients with a HyperLogLog of 2**precision registers;
+    # models and clients keep Space-Saving top-K summaries of top_k_capacity labels
+
+    def aggregate_state(self, distinct: str = 'exact', precision: int = DEFAULT_HLL_PRECISION,
+                        top_k_capacity: int = DEFAULT_TOP_K_CAPACITY) -> AggregateState:
+
+        try:
+            return AggregateState.from_dataframe(self.df, month_keys=self.month_keys(), day_keys=self.day_keys(), distinct=distinct,
+                                                 precision=precision, top_k_capacity=top_k_capacity)
+        except Exception as e:
+            logger.error(f"Error calculando estado de agregados: {str(e)}")
+            raise
+
     # get text summary
 
     def get_text_summary(self) -> str:
 
-        try:
-            if not self.results:
+        if not self.results:
+            try:
                 self.full_analysis()
-            
-            metrics = self.results['summary_metrics']
-            top_models = self.results['top_models'].index[0]
-            top_headquarter = self.results['sales_by_headquarter'].index[0]
-            top_channel = self.results['sales_by_channel'].index[0]
+            except Exception as e:
+                logger.error(f"Error generando resumen de texto: {str(e)}")
+                return "Error generando resumen de texto."
+        return text_summary(self.results)
 
-            summary = f"""
+# aux function for direct use
 
-Resumen del Análisis de Ventas:
+def analyze_data(df: pd.DataFrame) -> Mapping[str, Any]:
 
-Metricas Clave:
-- Clientes Únicos: {metrics['unique_clients']:,}
-- Total de Ventas: {metrics['total_sales']:,}
-- Ventas Totales sin IGV: ${metrics['total_sales_without_igv']:,.2f}
-- Ventas Totales con IGV: ${metrics['total_sales_with_igv']:,.2f}
-- IGV Total Recaudado: ${metrics['total_igv_collected']:,.2f}
-- Venta Promedio: ${metrics['average_sales_without_igv']:,.2f}
+    analyzer = DataAnalyzer(df)
+    return analyzer.full_analysis()
 
-Mejores Desempeños:
-- Modelo Más Vendido: {top_models}
-- Sede con Más Ventas: {top_headquarter}
-- Canal con Más Ventas: {top_channel}
+class StreamingAnalyzer:
 
-Análisis de los ultimos 12 Meses:
+    # DataAnalyzer-compatible accumulator for sales histories larger than memory:
+    # each chunk is folded into one running AggregateState and then dropped, so memory depends
+    # on the number of labels (plus the client hashes with distinct='exact'; 'hll' keeps them
+    # at 2**precision bytes), never on the number of rows
 
-            """
-            
-            return summary
-        
-        except Exception as e:
-            logger.error(f"Error generando resumen de texto: {str(e)}")
-            return "Error generando resumen de texto."
+    def __init__(self, top_n: int = 5, distinct: str = 'exact', precision: int = DEFAULT_HLL_PRECISION):
 
-# aux function for direct use
+        self.top_n = top_n
+        self.distinct = distinct
+        self.precision = precision
+        self.state = AggregateState(distinct, precision)
+        self.chunks = 0
+        self.results = {}
 
-def analyze_data(df: pd.DataFrame) -> Dict[str, Any]:
+    # fold one chunk into the running aggregates
 
-    analyzer = DataAnalyzer(df)
-    return analyzer.full_analysis()
\ No newline at end of file
+    def update(self, chunk: pd.DataFrame) -> 'StreamingAnalyzer':
+
+        if not chunk.empty:
+            self.state = self.state.merge(DataAnalyzer(chunk).aggregate_state(self.distinct, self.precision))
+            self.chunks += 1
+            self.results = {}
+        return self
+
+    # fold every chunk of an iterable (a generator is consumed one chunk at a time)
+
+    def consume(self, chunks: Iterable[pd.DataFrame]) -> 'StreamingAnalyzer':
+
+        for chunk in chunks:
+            self.update(chunk)
+        return self
+
+    # same keys as DataAnalyzer.full_analysis, from the rows folded so far
+
+    def full_analysis(self) -> Mapping[str, Any]:
+
+        if self.state.rows == 0:
+            raise ValueError("No se recibieron datos para analizar.")
+
+        self.results = LazyResults.from_values(self.state.results(self.top_n))
+        logger.info(f"Análisis por bloques finalizado: {self.state.rows} filas en {self.chunks} bloques.")
+        return self.results
+
+    def get_text_summary(self) -> str:
+
+        if not self.results:
+            try:
+                self.full_analysis()
+            except Exception as e:
+                logger.error(f"Error generando resumen de texto: {str(e)}")
+                return "Error generando resumen de texto."
+        return text_summary(self.results)
+
+# analyze an iterable of dataframe chunks keeping only one chunk in memory
+
+def analyze_chunks(chunks: Iterable[pd.DataFrame], distinct: str = 'exact', precision: int = DEFAULT_HLL_PRECISION,
+                   top_n: int = 5) -> Mapping[str, Any]:
+
+    return StreamingAnalyzer(top_n, distinct, precision).consume(chunks).full_analysis()
+
+# merge new rows into the persisted aggregates of an incremental run
+# returns None when the stored aggregates do not match the expected row count or
+# were counted with another --distinct/--hll-precision (their sketches cannot be merged)
+
+def update_stored_aggregates(df_new: pd.DataFrame, key: str, expected_rows: int = 0, reset: bool = False,
+                             distinct: str = 'exact', precision: int = DEFAULT_HLL_PRECISION, top_n: int = 5) -> Optional[Dict[str, Any]]:
+
+    path = os.path.join(STATE_DIR, f"aggregates_{key}.pkl")
+
+    state = AggregateState()
+    if not reset:
+        stored_rows = 0
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                state = pickle.load(f)
+            # aggregates written by older versions are rebuilt from scratch
+            current = isinstance(state, AggregateState) and getattr(state, 'version', 1) == STATE_VERSION
+            settings = (distinct, precision if distinct == 'hll' else None)
+            if current and state.distinct_settings() != settings:
+                logger.warning(f"Agregados guardados con otro conteo de clientes {state.distinct_settings()}, se esperaba {settings}.")
+                current = False
+            stored_rows = state.rows if current else -1
+        if stored_rows != expected_rows:
+            logger.warning(f"Agregados guardados inconsistentes ({stored_rows} filas, se esperaban {expected_rows}).")
+            return None
+
+    if not df_new.empty:
+        state = state.merge(DataAnalyzer(df_new).aggregate_state(distinct, precision))
+
+    if state.rows == 0:
+        raise ValueError("No se recibieron datos para analizar.")
+
+    os.makedirs(STATE_DIR, exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+    logger.info(f"Agregados incrementales actualizados: {len(df_new)} filas nuevas, {state.rows} en total.")
+    return state.results(top_n)
@@ -0,0 +1,149 @@
+import pandas as pd
+import numpy as np
+import logging
+from typing import Dict, Tuple
+from numpy.lib.stride_tricks import sliding_window_view
+
+logger = logging.getLogger(__name__)
+
+# daily sales and IGV are checked per headquarter
+
+ANOMALY_DIMENSION = 'Headquarter'
+DAILY_MEASURES = ['Price_Without_IGV', 'IGV']
+
+# trailing days the expected sales of a day are taken from (twelve full weeks: long enough for a
+# stable MAD of noisy daily sums, whole weeks so every weekday weighs the same)
+
+ANOMALY_WINDOW = 84
+
+# days between baseline updates (the median/MAD of a day comes from the window before its week)
+
+ANOMALY_STEP = 7
+
+# robust z-score from which a day is flagged (Iglewicz-Hoaglin modified z-score);
+# MAD_SCALE turns the median absolute deviation into a standard deviation of normal data,
+# MIN_SCALE_SHARE keeps that spread at least 5% of the median (windows of identical sales)
+
+ANOMALY_THRESHOLD = 3.5
+MAD_SCALE = 1.4826
+MIN_SCALE_SHARE = 0.05
+
+# IGV should be 18% of the price without IGV; daily ratios further than half a point away are flagged
+# (their score is the deviation in units of the tolerance)
+
+IGV_RATE = 0.18
+IGV_RATIO_TOLERANCE = 0.005
+
+# anomalies reported per metric
+
+ANOMALY_TOP_N = 10
+
+ANOMALY_COLUMNS = ['metric', 'value', 'expected', 'score']
+
+# (Headquarter, Date) table of daily sums without rows
+
+def empty_daily() -> pd.DataFrame:
+
+    index = pd.MultiIndex.from_arrays([pd.Index([], dtype=object), pd.DatetimeIndex([])], names=[ANOMALY_DIMENSION, 'Date'])
+    return pd.DataFrame({measure: pd.Series(dtype=float) for measure in DAILY_MEASURES}, index=index)
+
+# day x headquarter matrices of sales and IGV from a (Headquarter, Date) table of daily sums,
+# built with one bincount per measure; days span the whole range without gaps
+
+def daily_matrices(daily: pd.DataFrame) -> Tuple[Dict[str, np.ndarray], pd.Index, pd.DatetimeIndex]:
+
+    if daily is None or daily.empty:
+        return {measure: np.zeros((0, 0)) for measure in DAILY_MEASURES}, pd.Index([]), pd.DatetimeIndex([], name='Date')
+
+    columns, labels = daily.index.get_level_values(0).factorize(sort=True)
+    days = daily.index.get_level_values(-1).to_numpy(dtype='datetime64[D]').astype(np.int64)
+    first, last = days.min(), days.max()
+    dates = pd.DatetimeIndex(np.arange(first, last + 1).astype('datetime64[D]').astype('datetime64[ns]'), name='Date')
+
+    flat = (days - first) * len(labels) + columns
+    size = len(dates) * len(labels)
+    matrices = {measure: np.bincount(flat, weights=daily[measure].to_numpy(dtype=float), minlength=size).reshape(len(dates), len(labels))
+                for measure in DAILY_MEASURES}
+    return matrices, labels.rename(ANOMALY_DIMENSION), dates
+
+# median of the last axis through a partial sort (mean of the two middle values for an even length)
+
+def _median(values: np.ndarray) -> np.ndarray:
+
+    middle = values.shape[-1] // 2
+    if values.shape[-1] % 2:
+        return np.partition(values, middle, axis=-1)[..., middle]
+    ordered = np.partition(values, [middle - 1, middle], axis=-1)
+    return (ordered[..., middle - 1] + ordered[..., middle]) / 2
+
+# median and median absolute deviation of the `window` days before every day, for all series at once;
+# the baseline is recomputed every `step` days (days of the same step share the window before it)
+# rows before the first full window are NaN
+
+def rolling_median_mad(matrix: np.ndarray, window: int = ANOMALY_WINDOW, step: int = ANOMALY_STEP) -> Tuple[np.ndarray, np.ndarray]:
+
+    n_days = matrix.shape[0]
+    median = np.full(matrix.shape, np.nan)
+    mad = np.full(matrix.shape, np.nan)
+    if n_days > window:
+        # series x windows x days, contiguous along the window so the partial sorts stay in cache
+        series = np.ascontiguousarray(matrix.T)
+        windows = sliding_window_view(series, window, axis=-1)[:, :n_days - window:step]
+        center = _median(windows)
+        spread = _median(np.abs(windows - center[..., np.newaxis]))
+        median[window:] = np.repeat(center, step, axis=1)[:, :n_days - window].T
+        mad[window:] = np.repeat(spread, step, axis=1)[:, :n_days - window].T
+    return median, mad
+
+# flagged cells of a score matrix as a table (date, headquarter, value, expected value and score)
+
+def _flagged(metric: str, flags: np.ndarray, values: np.ndarray, expected: np.ndarray, scores: np.ndarray,
+             labels: pd.Index, dates: pd.DatetimeIndex, top_n: int) -> pd.DataFrame:
+
+    days, columns = np.nonzero(flags)
+    order = np.argsort(-np.abs(scores[days, columns]), kind='stable')[:top_n]
+    days, columns = days[order], columns[order]
+    index = pd.MultiIndex.from_arrays([dates[days], labels[columns]], names=['Date', ANOMALY_DIMENSION])
+    return pd.DataFrame({
+        'metric': metric,
+        'value': values[days, columns],
+        'expected': expected[days, columns],
+        'score': scores[days, columns]
+    }, index=index, columns=ANOMALY_COLUMNS)
+
+# most unusual days per headquarter from a (Headquarter, Date) table of daily sales and IGV:
+# - 'sales_drop' / 'sales_spike': robust z-score of the day's sales against the median/MAD of the
+#   ANOMALY_WINDOW days before its week (days without sales count as zero once the headquarter has started selling);
+#   collapses and spikes are ranked apart since daily sales are right-skewed and spikes would crowd out collapses
+# - 'igv_ratio': IGV / sales of the day drifting from the 18% rate
+# the top_n anomalies of each metric are returned, strongest first
+
+def detect_anomalies(daily: pd.DataFrame, top_n: int = ANOMALY_TOP_N) -> pd.DataFrame:
+
+    matrices, labels, dates = daily_matrices(daily)
+    sales, igv = matrices['Price_Without_IGV'], matrices['IGV']
+    if not sales.size:
+        return pd.DataFrame(columns=ANOMALY_COLUMNS, index=pd.MultiIndex.from_arrays([[], []], names=['Date', ANOMALY_DIMENSION]))
+
+    # a headquarter is scored from the first day whose whole window lies after its first sale
+    sold = sales != 0
+    starts = np.where(sold.any(axis=0), sold.argmax(axis=0), len(dates))
+    days = np.arange(len(dates))
+    window_starts = np.where(days >= ANOMALY_WINDOW, (days - ANOMALY_WINDOW) // ANOMALY_STEP * ANOMALY_STEP, -1)
+    scored = window_starts[:, np.newaxis] >= starts[np.newaxis, :]
+
+    median, mad = rolling_median_mad(sales, ANOMALY_WINDOW, ANOMALY_STEP)
+    scale = np.maximum(MAD_SCALE * mad, MIN_SCALE_SHARE * np.abs(median))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = np.where(scored & (scale > 0), (sales - median) / scale, np.nan)
+        ratio = np.where(sold, igv / sales, np.nan)
+    drift = (ratio - IGV_RATE) / IGV_RATIO_TOLERANCE
+
+    z = np.nan_to_num(z)
+    table = pd.concat([
+        _flagged('sales_drop', z <= -ANOMALY_THRESHOLD, sales, median, z, labels, dates, top_n),
+        _flagged('sales_spike', z >= ANOMALY_THRESHOLD, sales, median, z, labels, dates, top_n),
+        _flagged('igv_ratio', np.abs(np.nan_to_num(drift)) >= 1, ratio, np.full(ratio.shape, IGV_RATE), drift, labels, dates, top_n)
+    ])
+    logger.info(f"Detección de anomalías: {len(table)} días atípicos en {len(labels)} sedes y {len(dates)} días.")
+    return table
@@ -0,0 +1,156 @@
+import pandas as pd
+import numpy as np
+import logging
+from typing import Dict, Optional, Tuple
+from utils.aggregates import factorize_column
+from utils.data_loader import parse_dates
+
+logger = logging.getLogger(__name__)
+
+# categorical columns with an index per label
+
+INDEXED_DIMENSIONS = ['Headquarter', 'Model', 'Channel', 'Segment']
+
+# a packed bitmap costs rows / 8 bytes per label and the row lists of a column 4 bytes per row,
+# so columns with more labels than this (models) keep sorted row lists instead of bitmaps
+
+BITMAP_MAX_LABELS = 32
+
+# set bits of every byte value (popcount of packed bitmaps)
+
+_POPCOUNT = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+
+# packed bitmaps (one row of rows / 8 bytes per group) with the bits of `rows` set, where rows are
+# grouped by `groups` and ascending within a group: one pass adding the bit values of each byte
+# (bits of a byte are distinct, so their sum is their OR)
+
+def _pack_rows(groups: np.ndarray, rows: np.ndarray, n_groups: int, n_rows: int) -> np.ndarray:
+
+    n_bytes = (n_rows + 7) // 8
+    bitmaps = np.zeros(n_groups * n_bytes, dtype=np.uint8)
+    if len(rows):
+        keys = groups.astype(np.int64) * n_bytes + (rows >> 3)
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        bits = (np.uint8(1) << (7 - (rows & 7)).astype(np.uint8))
+        bitmaps[keys[starts]] = np.add.reduceat(bits, starts)
+    return bitmaps.reshape(n_groups, n_bytes)
+
+class SalesIndex:
+
+    # secondary indexes of a sales table for filtered analysis
+    # each label of a low-cardinality column has a packed bitmap (1 bit per row, 1/8 of a bool mask),
+    # so filters combine with bitwise OR (values of a column) and AND (between columns);
+    # columns with more than BITMAP_MAX_LABELS labels keep the row numbers sorted by label instead
+    # (row_lists[dim] = (rows, offsets): the rows of label i are rows[offsets[i]:offsets[i + 1]])
+    # and a filter on them packs the bitmap of the selected rows only
+    # the rows with a valid Sell_Date are also kept sorted by date, so a date range is two binary searches
+
+    def __init__(self, rows: int, bitmaps: Dict[str, np.ndarray], labels: Dict[str, pd.Index],
+                 date_order: np.ndarray, sorted_dates: np.ndarray,
+                 row_lists: Optional[Dict[str, Tuple[np.ndarray, np.ndarray]]] = None):
+
+        self.rows = rows
+        self.bitmaps = bitmaps
+        self.row_lists = row_lists or {}
+        self.labels = labels
+        self.date_order = date_order
+        self.sorted_dates = sorted_dates
+
+    # build every index and the date index from the codes of the table
+    # (one counting sort of the codes per column: rows with a null value are in no index)
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame) -> 'SalesIndex':
+
+        try:
+            bitmaps, row_lists, labels = {}, {}, {}
+            row_dtype = np.int32 if len(df) < np.iinfo(np.int32).max else np.int64
+            for dim in INDEXED_DIMENSIONS:
+                codes, labels[dim] = factorize_column(df[dim])
+                n_labels = len(labels[dim])
+                # numpy sorts 8/16-bit integers with a stable radix sort (linear in the rows)
+                key_dtype = np.min_scalar_type(n_labels)
+                order = np.argsort(codes.astype(key_dtype, copy=False) if key_dtype.itemsize <= 2 else codes, kind='stable').astype(row_dtype)
+                offsets = np.zeros(n_labels + 2, dtype=np.int64)
+                np.cumsum(np.bincount(codes, minlength=n_labels + 1), out=offsets[1:])
+                rows = order[:offsets[n_labels]]
+                if n_labels <= BITMAP_MAX_LABELS:
+                    bitmaps[dim] = _pack_rows(codes[rows], rows, n_labels, len(df))
+                else:
+                    row_lists[dim] = (rows, offsets[:n_labels + 1])
+
+            dates = parse_dates(df['Sell_Date']).to_numpy(dtype='datetime64[ns]')
+            valid = np.flatnonzero(~np.isnat(dates))
+            date_order = valid[np.argsort(dates[valid], kind='stable')]
+
+            index = cls(len(df), bitmaps, labels, date_order, dates[date_order], row_lists)
+            logger.info(f"Índices construidos para {len(df)} filas: bitmaps de {list(bitmaps)}, listas de filas de {list(row_lists)}.")
+            return index
+        except Exception as e:
+            logger.error(f"Error construyendo índices bitmap: {str(e)}")
+            raise
+
+    # OR of the bitmaps of some labels of a column (unknown labels match no rows);
+    # columns kept as row lists pack the bitmap of the selected rows
+
+    def bitmap(self, dimension: str, values) -> np.ndarray:
+
+        if dimension not in self.labels:
+            raise KeyError(f"Columna sin índice: {dimension}")
+
+        values = [values] if isinstance(values, str) or not np.iterable(values) else list(values)
+        codes = self.labels[dimension].get_indexer(values)
+        codes = np.unique(codes[codes >= 0])
+        if dimension in self.row_lists:
+            rows, offsets = self.row_lists[dimension]
+            selected = np.sort(np.concatenate([rows[offsets[code]:offsets[code + 1]] for code in codes])) \
+                if len(codes) else rows[:0]
+            return _pack_rows(np.zeros(len(selected), dtype=np.int64), selected, 1, self.rows)[0]
+        if not len(codes):
+            return np.zeros((self.rows + 7) // 8, dtype=np.uint8)
+        return np.bitwise_or.reduce(self.bitmaps[dimension][codes], axis=0)
+
+    # row numbers with start <= Sell_Date <= end (ascending)
+
+    def date_rows(self, start=None, end=None) -> np.ndarray:
+
+        lo = 0 if start is None else np.searchsorted(self.sorted_dates, np.datetime64(pd.Timestamp(start), 'ns'), side='left')
+        hi = len(self.sorted_dates) if end is None else np.searchsorted(self.sorted_dates, np.datetime64(pd.Timestamp(end), 'ns'), side='right')
+        return np.sort(self.date_order[lo:hi])
+
+    # AND of the per-column bitmaps of the filters (None without column filters)
+
+    def mask(self, **values) -> Optional[np.ndarray]:
+
+        mask = None
+        for dimension, selected in values.items():
+            if selected is None:
+                continue
+            bitmap = self.bitmap(dimension, selected)
+            mask = bitmap if mask is None else mask & bitmap
+        return mask
+
+    # row numbers matching every filter: a date range plus, per indexed column, one label or a list of labels
+
+    def select(self, start=None, end=None, **values) -> np.ndarray:
+
+        mask = self.mask(**values)
+        if start is None and end is None:
+            if mask is None:
+                return np.arange(self.rows)
+            return np.flatnonzero(np.unpackbits(mask, count=self.rows).view(bool))
+
+        # probe the bitmap only at the rows of the date range
+        rows = self.date_rows(start, end)
+        if mask is not None:
+            rows = rows[(mask[rows >> 3] >> (7 - (rows & 7)).astype(np.uint8)) & 1 == 1]
+        return rows
+
+    # number of matching rows (column filters alone are counted on the bitmaps)
+
+    def count(self, start=None, end=None, **values) -> int:
+
+        mask = self.mask(**values)
+        if start is None and end is None and mask is not None:
+            return int(_POPCOUNT[mask].sum(dtype=np.int64))
+        return len(self.select(start, end, **values))
@@ -0,0 +1,248 @@
+import pandas as pd
+import numpy as np
+import os
+import json
+import logging
+from typing import Dict, Any, List, Union
+from utils.data_loader import month_key_to_period, day_key_to_date
+from utils.aggregates import FactorizedSales, _group_series, _sort_desc, price_digests, quantile_metrics, daily_sales
+from utils.lazy_results import LazyResults
+from utils.temporal import temporal_table_from_series, period_summary
+from utils.forecast import FORECAST_DIMENSIONS, sales_forecast
+from utils.anomalies import ANOMALY_DIMENSION, DAILY_MEASURES, detect_anomalies, empty_daily
+from utils.sketches import GroupedTDigest, SpaceSaving
+
+logger = logging.getLogger(__name__)
+
+# dimensions of the cube (month grain) and measures stored per cell
+
+CUBE_DIMENSIONS = ['Headquarter', 'Model', 'Channel', 'Segment', 'Month']
+CUBE_MEASURES = ['count', 'price_count', 'Price_Without_IGV', 'IGV', 'Price_With_IGV', 'max_without_igv', 'min_without_igv']
+
+# above this many possible cells the occupied cells are found with np.unique instead of a dense bincount
+
+DENSE_CELL_LIMIT = 1 << 22
+
+class SalesCube:
+
+    # sparse coordinate table of the sales fact table: one row per occupied
+    # (headquarter, model, channel, segment, month) cell with its measures
+    # the last code of each dimension (len(labels)) holds rows with a null value
+    # like distinct clients, price quantiles are not additive over cells: their t-digests are kept aside
+    # the daily (headquarter, day) sums the anomaly detection needs are below the month grain and kept aside too
+
+    def __init__(self, coords: np.ndarray, measures: Dict[str, np.ndarray], labels: Dict[str, pd.Index], unique_clients: int,
+                 price_digests: Dict[str, GroupedTDigest] = None, daily: pd.DataFrame = None, top_clients: SpaceSaving = None):
+
+        self.coords = coords
+        self.measures = measures
+        self.labels = labels
+        self.unique_clients = unique_clients
+        self.price_digests = price_digests or {}
+        self.daily = daily if daily is not None else empty_daily()
+        self.top_clients = top_clients if top_clients is not None else SpaceSaving()
+
+    def __len__(self) -> int:
+
+        return len(self.coords)
+
+    # build the cube from a dataframe with one pass over the rows
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame, month_keys: np.ndarray = None, day_keys: np.ndarray = None) -> 'SalesCube':
+
+        return cls.from_factorized(FactorizedSales(df, month_keys=month_keys, day_keys=day_keys))
+
+    @classmethod
+    def from_factorized(cls, data: FactorizedSales) -> 'SalesCube':
+
+        try:
+            shape = np.array([data.size(dim) + 1 for dim in CUBE_DIMENSIONS], dtype=np.int64)
+            n_cells = int(np.prod(shape))
+
+            # flat cell number of every row
+            flat = np.zeros(data.rows, dtype=np.int64)
+            for dim, size in zip(CUBE_DIMENSIONS, shape):
+                flat *= size
+                flat += data.codes[dim]
+
+            dense = n_cells <= DENSE_CELL_LIMIT
+            if dense:
+                cell_of_row, n_slots = flat, n_cells
+            else:
+                sparse_cells, cell_of_row = np.unique(flat, return_inverse=True)
+                n_slots = len(sparse_cells)
+
+            counts = np.bincount(cell_of_row, minlength=n_slots)
+            occupied = np.flatnonzero(counts)
+
+            valid_price = ~data.price_nulls
+            priced_cells, prices = cell_of_row, data.price
+            if data.price_nulls.any():
+                priced_cells, prices = cell_of_row[valid_price], data.price[valid_price]
+            max_price = np.full(n_slots, -np.inf)
+            min_price = np.full(n_slots, np.inf)
+            np.maximum.at(max_price, priced_cells, prices)
+            np.minimum.at(min_price, priced_cells, prices)
+
+            measures = {
+                'count': counts[occupied],
+                'price_count': np.bincount(cell_of_row, weights=valid_price, minlength=n_slots)[occupied].astype(np.int64),
+                'Price_Without_IGV': np.bincount(cell_of_row, weights=data.price, minlength=n_slots)[occupied],
+                'IGV': np.bincount(cell_of_row, weights=data.igv, minlength=n_slots)[occupied],
+                'Price_With_IGV': np.bincount(cell_of_row, weights=data.price_with_igv, minlength=n_slots)[occupied],
+                'max_without_igv': max_price[occupied],
+                'min_without_igv': min_price[occupied]
+            }
+
+            # coordinates of the occupied cells
+            cells = occupied if dense else sparse_cells[occupied]
+            coords = np.stack(np.unravel_index(cells, tuple(shape)), axis=1).astype(np.int32)
+
+            clients = np.bincount(data.codes['Client_ID'], minlength=data.size('Client_ID') + 1)[:data.size('Client_ID')]
+            labels = {dim: data.labels[dim] for dim in CUBE_DIMENSIONS}
+
+            # clients are not a cube dimension: keep the exact counts of the busiest ones
+            present = clients > 0
+            top_clients = SpaceSaving.from_counts(data.labels['Client_ID'][present], clients[present])
+
+            cube = cls(coords, measures, labels, int(np.count_nonzero(clients)), price_digests(data), daily_sales(data), top_clients)
+            logger.info(f"Cubo de ventas construido: {len(cube)} celdas ocupadas de {n_cells} posibles.")
+            return cube
+        except Exception as e:
+            logger.error(f"Error construyendo el cubo de ventas: {str(e)}")
+            raise
+
+    def size(self, dimension: str) -> int:
+
+        return len(self.labels[dimension])
+
+    # total of a measure over the whole cube
+
+    def total(self, measure: str = 'count') -> Union[int, float]:
+
+        values = self.measures[measure]
+        if measure == 'max_without_igv':
+            return values.max() if len(values) and np.isfinite(values.max()) else np.nan
+        if measure == 'min_without_igv':
+            return values.min() if len(values) and np.isfinite(values.min()) else np.nan
+        return values.sum()
+
+    # roll a measure up to one or more dimensions (null values and empty groups are dropped)
+
+    def rollup(self, dimensions: Union[str, List[str]], measure: str = 'Price_Without_IGV') -> pd.Series:
+
+        dimensions = [dimensions] if isinstance(dimensions, str) else list(dimensions)
+        shape = tuple(self.size(dim) + 1 for dim in dimensions)
+        axes = [CUBE_DIMENSIONS.index(dim) for dim in dimensions]
+
+        flat = np.ravel_multi_index(tuple(self.coords[:, axis] for axis in axes), shape)
+        n_slots = int(np.prod(shape))
+        counts = np.bincount(flat, weights=self.measures['count'], minlength=n_slots).reshape(shape)
+
+        values = self.measures[measure]
+        if measure in ('max_without_igv', 'min_without_igv'):
+            reduce, fill = (np.maximum, -np.inf) if measure == 'max_without_igv' else (np.minimum, np.inf)
+            grouped = np.full(n_slots, fill)
+            reduce.at(grouped, flat, values)
+            grouped = np.where(np.isfinite(grouped), grouped, np.nan).reshape(shape)
+        elif measure in ('count', 'price_count'):
+            grouped = np.bincount(flat, weights=values, minlength=n_slots).astype(np.int64).reshape(shape)
+        else:
+            grouped = np.bincount(flat, weights=values, minlength=n_slots).reshape(shape)
+
+        # drop the null bucket of every dimension
+        inner = tuple(slice(0, size - 1) for size in shape)
+        counts, grouped = counts[inner], grouped[inner]
+
+        if len(dimensions) == 1:
+            return _group_series(grouped, counts, self.labels[dimensions[0]], measure, dimensions[0])
+
+        present = np.nonzero(counts > 0)
+        index = pd.MultiIndex.from_arrays([self.labels[dim][codes] for dim, codes in zip(dimensions, present)], names=dimensions)
+        return pd.Series(grouped[present], index=index, name=measure)
+
+    # lazy results mapping with the keys of DataAnalyzer.full_analysis, each answered from the cells when read
+
+    def results(self, top_n: int = 5) -> LazyResults:
+
+        return LazyResults({
+            'sales_by_headquarter': lambda: self.rollup('Headquarter').sort_values(ascending=False),
+            'top_models': lambda: _sort_desc(self.rollup('Model', 'count').rename('count')).head(top_n),
+            'top_clients': lambda: self.top_clients.top(top_n).rename_axis('Client_ID'),
+            'sales_by_channel': lambda: _sort_desc(self.rollup('Channel', 'count').rename('count')),
+            'sales_by_segment': lambda: self.rollup('Segment'),
+            'summary_metrics': self.summary_metrics,
+            'monthly_sales_trend': lambda: self.rollup('Month'),
+            'price_quantiles_by_headquarter': lambda: self._price_quantiles('Headquarter'),
+            'price_quantiles_by_model': lambda: self._price_quantiles('Model'),
+            'temporal_by_headquarter': lambda: temporal_table_from_series(self.rollup(['Headquarter', 'Month']), 'Headquarter'),
+            'temporal_by_model': lambda: temporal_table_from_series(self.rollup(['Model', 'Month']), 'Model'),
+            'last_12_months': lambda: period_summary(self.rollup('Month')),
+            'sales_forecast': lambda: sales_forecast(self.rollup([*FORECAST_DIMENSIONS, 'Month'])),
+            'anomalies': lambda: detect_anomalies(self.daily)
+        })
+
+    def summary_metrics(self) -> Dict[str, Any]:
+
+        price_count = int(self.total('price_count'))
+        sum_without_igv = float(self.total('Price_Without_IGV'))
+
+        return {
+            'unique_clients': self.unique_clients,
+            'total_sales': int(self.total('count')),
+            'total_sales_without_igv': sum_without_igv,
+            'total_sales_with_igv': float(self.total('Price_With_IGV')),
+            'total_igv_collected': float(self.total('IGV')),
+            'average_sales_without_igv': sum_without_igv / price_count if price_count else np.nan,
+            'max_sale_without_igv': self.total('max_without_igv'),
+            'min_sale_without_igv': self.total('min_without_igv'),
+            **(quantile_metrics(self.price_digests['Total']) if 'Total' in self.price_digests else {})
+        }
+
+    def _price_quantiles(self, dimension: str) -> pd.DataFrame:
+
+        digest = self.price_digests.get(dimension)
+        return digest.quantiles(name=dimension) if digest is not None else pd.DataFrame()
+
+    # write cube to a compressed npz (labels as strings, months as integer keys)
+
+    def save(self, path: str) -> str:
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        arrays = {'coords': self.coords}
+        for measure in CUBE_MEASURES:
+            arrays[f'measure_{measure}'] = self.measures[measure]
+        for dim in CUBE_DIMENSIONS:
+            labels = self.labels[dim]
+            arrays[f'labels_{dim}'] = labels.asi8 if dim == 'Month' else np.asarray(labels.astype(str), dtype=str)
+        for key, digest in self.price_digests.items():
+            arrays.update(digest.to_arrays(f'digest_{key}'))
+        arrays['daily_labels'] = np.asarray(self.daily.index.get_level_values(0).astype(str), dtype=str)
+        arrays['daily_days'] = self.daily.index.get_level_values(-1).to_numpy(dtype='datetime64[D]').astype(np.int64)
+        for measure in DAILY_MEASURES:
+            arrays[f'daily_{measure}'] = self.daily[measure].to_numpy(dtype=float)
+        arrays.update(self.top_clients.to_arrays('top_clients'))
+        arrays['meta'] = np.asarray(json.dumps({'unique_clients': self.unique_clients, 'digests': list(self.price_digests)}))
+
+        tmp_path = path + '.tmp.npz'
+        np.savez_compressed(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+        logger.info(f"Cubo de ventas guardado en {path}")
+        return path
+
+    @classmethod
+    def load(cls, path: str) -> 'SalesCube':
+
+        with np.load(path, allow_pickle=False) as npz:
+            measures = {measure: npz[f'measure_{measure}'] for measure in CUBE_MEASURES}
+            labels = {dim: pd.Index(npz[f'labels_{dim}'], name=dim) for dim in CUBE_DIMENSIONS if dim != 'Month'}
+            labels['Month'] = month_key_to_period(npz['labels_Month']).rename('Month')
+            meta = json.loads(str(npz['meta']))
+            digests = {key: GroupedTDigest.from_arrays(npz, f'digest_{key}', name=key) for key in meta.get('digests', [])}
+            daily = None
+            if 'daily_days' in npz.files:
+                index = pd.MultiIndex.from_arrays([npz['daily_labels'], day_key_to_date(npz['daily_days'])], names=[ANOMALY_DIMENSION, 'Date'])
+                daily = pd.DataFrame({measure: npz[f'daily_{measure}'] for measure in DAILY_MEASURES}, index=index)
+            top_clients = SpaceSaving.from_arrays(npz, 'top_clients') if 'top_clients_meta' in npz.files else None
+            return cls(npz['coords'], measures, labels, meta['unique_clients'], digests, daily, top_clients)
@@ -1,30 +1,382 @@
 import pandas as pd
+import numpy as np
 import os
+import glob
+import json
+import hashlib
 import logging
+import sqlite3
+from datetime import datetime
+from urllib.parse import urlsplit, parse_qs
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+from typing import Dict, Any, Optional, Tuple, Iterator, List, Callable
+from utils.row_index import RowHashIndex
 
 # config logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def load_excel_data(file_path: str, sheet_name= 0):
+# parquet is used for the sidecar cache when pyarrow is installed, otherwise a compressed npz
 
-    try: 
+try:
+    import pyarrow  # noqa: F401
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
 
-        # verify that file exists
+CACHE_DIR_NAME = '.cache'
+CACHE_VERSION = 3
 
-        if not os.path.exists(file_path):
-            raise FileNotFoundError(f"Archivo no encontrado: {file_path}")
-        
-        # verify that is an excel file
-        if not file_path.endswith(('.xlsx', '.xls')):
-            raise ValueError("El archivo proporcionado no es un archivo de Excel válido.")
+# default number of rows per chunk in streaming mode
+
+DEFAULT_CHUNK_SIZE = 50000
+
+REQUIRED_COLUMNS = ['Sell_Date', 'Headquarter', 'Model', 'Channel',
+                    'Segment', 'Client_ID', 'Price_Without_IGV',
+                    'IGV', 'Price_With_IGV']
+
+# incremental runs keep their watermark (and the analyzer its aggregates) here
+
+STATE_DIR = os.path.join('outputs', 'state')
+WATERMARK_TAIL_ROWS = 100
+
+# default table read from sqlite databases when no table or query is given
+
+SQLITE_DEFAULT_TABLE = 'ventas'
+
+# integer month key (months since 1970-01, -1 for missing dates) derived from Sell_Date
+
+MONTH_COLUMN = 'Sell_Month'
+
+# date formats tried on a sample of text dates (day first before month first)
+
+DATE_FORMATS = ['%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%d/%m/%Y', '%d/%m/%Y %H:%M:%S',
+                '%d-%m-%Y', '%m/%d/%Y', '%Y/%m/%d', '%Y%m%d']
+DATE_SAMPLE_SIZE = 500
+
+# column added when several workbooks are combined
+
+SOURCE_COLUMN = 'Source_File'
+
+# column types applied at load time ('category' for repeated labels, 'datetime' for dates)
+
+SALES_SCHEMA = {
+    'Sell_Date': 'datetime',
+    'Headquarter': 'category',
+    'Model': 'category',
+    'Channel': 'category',
+    'Segment': 'category',
+    'Client_ID': 'category',
+    'Price_Without_IGV': 'float64',
+    'IGV': 'float64',
+    'Price_With_IGV': 'float64'
+}
+
+# get size and modification time of a file
+
+def _file_signature(file_path: str) -> Dict[str, Any]:
+
+    stat = os.stat(file_path)
+    return {
+        'path': os.path.abspath(file_path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns
+    }
+
+# hash file content in blocks to avoid loading it into memory
+
+def _hash_file(file_path: str, block_size: int = 1 << 20) -> str:
+
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+# get cache data and metadata paths for a workbook sheet
+
+def _cache_paths(file_path: str, sheet_name) -> Tuple[str, str]:
+
+    abs_path = os.path.abspath(file_path)
+    cache_dir = os.path.join(os.path.dirname(abs_path), CACHE_DIR_NAME)
+    key = hashlib.sha1(f"{abs_path}|{sheet_name}".encode('utf-8')).hexdigest()[:16]
+    base = os.path.join(cache_dir, f"{os.path.basename(abs_path)}.{key}")
+    return base + ('.parquet' if HAS_PYARROW else '.npz'), base + '.meta.json'
+
+# save dataframe columns to a compressed npz (no pickled objects)
+
+def _save_npz(df: pd.DataFrame, path: str) -> Dict[str, Any]:
+
+    arrays = {}
+    columns = []
+    for i, col in enumerate(df.columns):
+        series = df[col]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            kind = 'category'
+            arrays[f'c{i}_codes'] = series.cat.codes.to_numpy()
+            categories = series.cat.categories
+            if pd.api.types.is_numeric_dtype(categories) or pd.api.types.is_datetime64_any_dtype(categories):
+                arrays[f'c{i}_categories'] = categories.to_numpy()
+            else:
+                arrays[f'c{i}_categories'] = np.asarray(categories.astype(str), dtype=str)
+        elif pd.api.types.is_datetime64_any_dtype(series):
+            kind = 'datetime'
+            arrays[f'c{i}_values'] = series.to_numpy()
+        elif pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+            kind = 'numeric'
+            arrays[f'c{i}_values'] = series.to_numpy()
+        else:
+            kind = 'string'
+            nulls = series.isna().to_numpy()
+            arrays[f'c{i}_values'] = np.asarray(series.astype(str).to_numpy(), dtype=str)
+            arrays[f'c{i}_nulls'] = nulls
+        columns.append({'name': str(col), 'kind': kind})
+
+    np.savez_compressed(path, **arrays)
+    return {'columns': columns}
+
+# load dataframe saved with _save_npz
+
+def _load_npz(path: str, columns) -> pd.DataFrame:
+
+    data = {}
+    with np.load(path, allow_pickle=False) as npz:
+        for i, col in enumerate(columns):
+            kind = col['kind']
+            if kind == 'category':
+                data[col['name']] = pd.Categorical.from_codes(npz[f'c{i}_codes'], npz[f'c{i}_categories'])
+            elif kind == 'string':
+                values = npz[f'c{i}_values'].astype(object)
+                values[npz[f'c{i}_nulls']] = None
+                data[col['name']] = values
+            else:
+                data[col['name']] = npz[f'c{i}_values']
+    return pd.DataFrame(data)
+
+# read cached sheet if the workbook did not change since it was cached
+
+def _read_cache(file_path: str, sheet_name) -> Optional[pd.DataFrame]:
+
+    data_path, meta_path = _cache_paths(file_path, sheet_name)
+    if not (os.path.exists(data_path) and os.path.exists(meta_path)):
+        return None
+
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+
+    signature = _file_signature(file_path)
+    if meta.get('version') != CACHE_VERSION or meta.get('size') != signature['size']:
+        return None
+
+    # same size but different mtime: only trust the cache if content hash matches
+    if meta.get('mtime_ns') != signature['mtime_ns']:
+        if meta.get('sha256') != _hash_file(file_path):
+            return None
+        meta['mtime_ns'] = signature['mtime_ns']
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+
+    if meta.get('format') == 'parquet':
+        df = pd.read_parquet(data_path)
+    else:
+        df = _load_npz(data_path, meta['columns'])
+
+    logger.info(f"Datos cargados desde caché: {data_path}")
+    return df
+
+# write sheet to the columnar sidecar cache
+
+def _write_cache(file_path: str, sheet_name, df: pd.DataFrame):
+
+    data_path, meta_path = _cache_paths(file_path, sheet_name)
+    os.makedirs(os.path.dirname(data_path), exist_ok=True)
+
+    meta = _file_signature(file_path)
+    meta.update({
+        'version': CACHE_VERSION,
+        'sheet_name': sheet_name,
+        'sha256': _hash_file(file_path)
+    })
+
+    if HAS_PYARROW:
+        df.to_parquet(data_path, index=False)
+        meta['format'] = 'parquet'
+    else:
+        meta.update(_save_npz(df, data_path))
+        meta['format'] = 'npz'
+
+    # metadata is written last so a partial write is never taken as valid
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+
+    logger.info(f"Caché columnar actualizada: {data_path}")
+
+# check that every value of a sample parses with a format
+
+def _matches_format(sample: pd.Series, date_format: str) -> bool:
+
+    try:
+        pd.to_datetime(sample, format=date_format)
+        return True
+    except (ValueError, TypeError):
+        return False
+
+# detect date format from a sample of text dates
+
+def detect_date_format(sample: pd.Series) -> Optional[str]:
+
+    for date_format in DATE_FORMATS:
+        if _matches_format(sample, date_format):
+            logger.info(f"Formato de fecha detectado: {date_format}")
+            return date_format
+
+    logger.warning("No se detectó un formato de fecha fijo; se usará el análisis genérico.")
+    return None
+
+# first values of a column of text dates (None when the values are not text)
+
+def _text_date_sample(series: pd.Series) -> Optional[pd.Series]:
+
+    values = series.dropna()
+    if len(values) and (pd.api.types.is_string_dtype(values) or pd.api.types.is_object_dtype(values)) \
+            and isinstance(values.iloc[0], str):
+        return values.iloc[:DATE_SAMPLE_SIZE].astype(str)
+    return None
+
+# date format of a column of text dates (None for datetime columns or without a fixed format)
+# detected once per source and passed to the parsing of its next chunks
+
+def text_date_format(series: pd.Series) -> Optional[str]:
+
+    sample = _text_date_sample(series)
+    return detect_date_format(sample) if sample is not None else None
+
+# parse dates once, with an explicit format when the values are text
+# (date_format, e.g. the format of the previous chunk of the same source, is tried before detecting one)
+
+def parse_dates(series: pd.Series, date_format: Optional[str] = None) -> pd.Series:
+
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+
+    sample = _text_date_sample(series)
+    if sample is not None:
+        if not (date_format and _matches_format(sample, date_format)):
+            date_format = detect_date_format(sample)
+        if date_format:
+            return pd.to_datetime(series, format=date_format, errors='coerce')
+
+    return pd.to_datetime(series, errors='coerce')
+
+# integer month key of a datetime series (-1 for missing dates)
+
+def month_key(dates: pd.Series) -> np.ndarray:
+
+    values = dates.to_numpy(dtype='datetime64[ns]')
+    keys = values.astype('datetime64[M]').astype(np.int64)
+    return np.where(np.isnat(values), -1, keys).astype(np.int32)
+
+# monthly period index from month keys
+
+def month_key_to_period(keys) -> pd.PeriodIndex:
+
+    return pd.PeriodIndex(np.asarray(keys, dtype=np.int64).astype('datetime64[M]'), freq='M')
+
+# integer day key of a datetime series (days since 1970-01-01, -1 for missing dates)
+
+def day_key(dates: pd.Series) -> np.ndarray:
+
+    values = dates.to_numpy(dtype='datetime64[ns]')
+    keys = values.astype('datetime64[D]').astype(np.int64)
+    return np.where(np.isnat(values), -1, keys).astype(np.int32)
+
+# date index from day keys
+
+def day_key_to_date(keys) -> pd.DatetimeIndex:
+
+    return pd.DatetimeIndex(np.asarray(keys, dtype=np.int64).astype('datetime64[D]').astype('datetime64[ns]'))
+
+# cast a single column to a schema type
+
+def _cast_column(series: pd.Series, kind: str, date_format: Optional[str] = None) -> pd.Series:
+
+    if kind == 'datetime':
+        return parse_dates(series, date_format)
+    if kind == 'category':
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            return series
+        return series.astype('category')
+    if series.dtype == kind:
+        return series
+    return pd.to_numeric(series, errors='coerce').astype(kind)
+
+# apply column schema and optionally log memory usage before and after
+# (date_format is the known format of the text date columns of this source, if any)
+
+def apply_schema(df: pd.DataFrame, schema: Optional[Dict[str, str]] = None, report_memory: bool = True,
+                 date_format: Optional[str] = None) -> pd.DataFrame:
+
+    if schema is None:
+        schema = SALES_SCHEMA
+
+    columns = [col for col in schema if col in df.columns]
+    before = df[columns].memory_usage(index=False, deep=True) if report_memory else None
+
+    for col in columns:
+        df[col] = _cast_column(df[col], schema[col], date_format)
+
+    # month key for temporal analysis, computed once at ingest
+    if schema.get('Sell_Date') == 'datetime' and 'Sell_Date' in df.columns and MONTH_COLUMN not in df.columns:
+        df[MONTH_COLUMN] = month_key(df['Sell_Date'])
+
+    if report_memory:
+        after = df[columns].memory_usage(index=False, deep=True)
+        logger.info(f"Memoria de columnas tipadas: {before.sum() / 1024**2:,.2f} MB -> {after.sum() / 1024**2:,.2f} MB")
+        for col in columns:
+            if before[col] != after[col]:
+                logger.info(f"  {col}: {before[col] / 1024**2:,.2f} MB -> {after[col] / 1024**2:,.2f} MB ({df[col].dtype})")
+
+    return df
+
+# verify that file exists and is an excel file
+
+def _check_excel_file(file_path: str):
+
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"Archivo no encontrado: {file_path}")
+
+    if not file_path.endswith(('.xlsx', '.xls')):
+        raise ValueError("El archivo proporcionado no es un archivo de Excel válido.")
+
+def load_excel_data(file_path: str, sheet_name= 0, use_cache: bool = True):
+
+    try: 
+
+        _check_excel_file(file_path)
         
         logger.info(f"Cargando datos desde el archivo: {file_path}, hoja: {sheet_name}")
-        
+
+        # try columnar cache before parsing the workbook
+
+        df = None
+        if use_cache:
+            try:
+                df = _read_cache(file_path, sheet_name)
+            except Exception as e:
+                logger.warning(f"No se pudo leer la caché, se leerá el Excel: {e}")
+                df = None
+
         # load excel file
 
-        df = pd.read_excel(file_path, sheet_name=sheet_name)
+        if df is None:
+            df = apply_schema(pd.read_excel(file_path, sheet_name=sheet_name))
+            if use_cache:
+                try:
+                    _write_cache(file_path, sheet_name, df)
+                except Exception as e:
+                    logger.warning(f"No se pudo escribir la caché: {e}")
 
         # basic validation
 
@@ -36,14 +388,7 @@ def load_excel_data(file_path: str, sheet_name= 0):
         logger.info(f"Dimensiones: {df.shape[0]} filas y {df.shape[1]} columnas")
         logger.info(f"Columnas: {list(df.columns)}")
 
-        # show basic info
-
-        logger.info("\n" + "="*50)
-        logger.info("Información del DataFrame:")
-        logger.info("" + "="*50)
-        logger.info(f"\n{df.info()}")
-        logger.info(f"\nPrimeras 5 filas:\n{df.head()}")
-        logger.info(f"\nEstadísticas descriptivas:\n{df.describe()}")
+        # detailed statistics live in utils/profiler.py (main.py --profile-data)
 
         return df
     
@@ -51,23 +396,536 @@ def load_excel_data(file_path: str, sheet_name= 0):
         logger.error(f"Error al cargar el archivo de Excel: {e}")
         raise
 
-# validate data structure
+# build a dataframe from raw worksheet rows
+
+def _rows_to_frame(rows: List[tuple], columns: List[str], start: int) -> pd.DataFrame:
+
+    width = len(columns)
+    rows = [tuple(row[:width]) + (None,) * (width - len(row)) for row in rows]
+    df = pd.DataFrame.from_records(rows, columns=columns)
+    df.index = pd.RangeIndex(start, start + len(df))
+    return df
+
+# apply the schema to the raw chunks of one source: the date format is detected on the
+# first chunk with text dates and passed to the following chunks of the same source
+
+def _typed_chunks(chunks: Iterator[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+
+    date_format = None
+    for chunk in chunks:
+        if date_format is None and 'Sell_Date' in chunk.columns:
+            date_format = text_date_format(chunk['Sell_Date'])
+        yield apply_schema(chunk, report_memory=False, date_format=date_format)
+
+# stream an excel sheet as typed dataframe chunks (openpyxl read-only mode)
+
+def iter_excel_chunks(file_path: str, sheet_name= 0, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+
+    return _typed_chunks(_iter_excel_rows(file_path, sheet_name, chunk_size))
+
+# raw (untyped) chunks of an excel sheet
+
+def _iter_excel_rows(file_path: str, sheet_name, chunk_size: int) -> Iterator[pd.DataFrame]:
+
+    from openpyxl import load_workbook
+
+    _check_excel_file(file_path)
+    if chunk_size <= 0:
+        raise ValueError("chunk_size debe ser mayor que cero.")
+
+    logger.info(f"Leyendo {file_path} por bloques de {chunk_size} filas, hoja: {sheet_name}")
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[sheet_name] if isinstance(sheet_name, int) else workbook[sheet_name]
+        rows = sheet.iter_rows(values_only=True)
+
+        header = next(rows, None)
+        if header is None:
+            logger.warning("El archivo de Excel está vacío.")
+            return
+        columns = [str(col) if col is not None else f"Unnamed: {i}" for i, col in enumerate(header)]
+
+        buffer = []
+        start = 0
+        for row in rows:
+            # read-only sheets may report trailing blank rows
+            if all(value is None for value in row):
+                continue
+            buffer.append(row)
+            if len(buffer) >= chunk_size:
+                yield _rows_to_frame(buffer, columns, start)
+                start += len(buffer)
+                buffer = []
+
+        if buffer:
+            yield _rows_to_frame(buffer, columns, start)
+    finally:
+        workbook.close()
+
+# input backends: readers selected by file extension or URI scheme
+
+_BACKENDS: Dict[str, Dict[str, Any]] = {}
+
+# register a reader function as a backend
+
+def register_backend(name: str, extensions: Tuple[str, ...] = (), schemes: Tuple[str, ...] = ()) -> Callable:
+
+    def decorator(reader: Callable) -> Callable:
+        _BACKENDS[name] = {
+            'reader': reader,
+            'extensions': tuple(ext.lower() for ext in extensions),
+            'schemes': tuple(scheme.lower() for scheme in schemes)
+        }
+        return reader
+
+    return decorator
+
+def _is_uri(source: str) -> bool:
+
+    return '://' in source
+
+# find the backend name for a source
+
+def get_backend(source: str) -> str:
+
+    if _is_uri(source):
+        scheme = source.split('://', 1)[0].lower()
+        for name, backend in _BACKENDS.items():
+            if scheme in backend['schemes']:
+                return name
+    else:
+        lower = source.lower()
+        for name, backend in _BACKENDS.items():
+            if lower.endswith(backend['extensions']):
+                return name
+
+    raise ValueError(f"Formato de datos no soportado: {source}")
+
+def _check_file(file_path: str):
+
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"Archivo no encontrado: {file_path}")
+
+@register_backend('excel', extensions=('.xlsx', '.xls'))
+def _read_excel_backend(source: str, columns: Optional[List[str]] = None, sheet_name= 0) -> pd.DataFrame:
+
+    df = load_excel_data(source, sheet_name=sheet_name)
+    return df[columns] if columns else df
+
+@register_backend('csv', extensions=('.csv', '.csv.gz'))
+def _read_csv_backend(source: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+
+    _check_file(source)
+    engine = 'pyarrow' if HAS_PYARROW else 'c'
+    return pd.read_csv(source, usecols=columns, engine=engine)
+
+@register_backend('parquet', extensions=('.parquet', '.pq'))
+def _read_parquet_backend(source: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+
+    _check_file(source)
+    return pd.read_parquet(source, columns=columns)
+
+# split sqlite:///relative.db?table=... (or ?query=...) into path and query parameters
+
+def _parse_sqlite_source(source: str) -> Tuple[str, Dict[str, str]]:
 
-def validate_data_structure(df, required_columns= None):
+    if not _is_uri(source):
+        return source, {}
+
+    parts = urlsplit(source)
+    path = parts.path[1:] if parts.path.startswith('/') else parts.path
+    params = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+    return path, params
+
+def _quote_identifier(name: str) -> str:
+
+    return '"' + name.replace('"', '""') + '"'
+
+@register_backend('sqlite', extensions=('.db', '.sqlite', '.sqlite3'), schemes=('sqlite',))
+def _read_sqlite_backend(source: str, columns: Optional[List[str]] = None, table: Optional[str] = None, query: Optional[str] = None) -> pd.DataFrame:
+
+    path, params = _parse_sqlite_source(source)
+    _check_file(path)
+    custom_query = query or params.get('query')
+    table = table or params.get('table') or SQLITE_DEFAULT_TABLE
+
+    # table reads project columns in SQL, custom queries are projected afterwards
+    if custom_query:
+        query = custom_query
+    else:
+        selected = ', '.join(_quote_identifier(col) for col in columns) if columns else '*'
+        query = f"SELECT {selected} FROM {_quote_identifier(table)}"
+
+    # open read-only so a typo never creates an empty database
+    with closing(sqlite3.connect(f"file:{path}?mode=ro", uri=True)) as conn:
+        df = pd.read_sql_query(query, conn)
+    return df[columns] if columns and custom_query else df
+
+# load data from any registered backend and apply the sales schema
+
+def load_data(source: str, columns: Optional[List[str]] = None, **kwargs) -> pd.DataFrame:
+
+    try:
+        backend = get_backend(source)
+        logger.info(f"Cargando datos con el backend '{backend}': {source}")
+        df = _BACKENDS[backend]['reader'](source, columns=columns, **kwargs)
+        df = apply_schema(df, report_memory=backend != 'excel')
+        logger.info(f"Dimensiones: {df.shape[0]} filas y {df.shape[1]} columnas")
+        return df
+
+    except Exception as e:
+        logger.error(f"Error al cargar los datos: {e}")
+        raise
+
+# resolve a file, directory or glob pattern to a sorted list of data files
+
+def resolve_data_files(source: str) -> List[str]:
+
+    if _is_uri(source):
+        return [source]
+
+    if os.path.isdir(source):
+        extensions = [ext for backend in _BACKENDS.values() for ext in backend['extensions']]
+        files = [f for ext in extensions for f in glob.glob(os.path.join(source, '*' + ext))]
+    else:
+        files = glob.glob(source)
+
+    # skip lock files left open by Excel
+    files = [f for f in files if os.path.isfile(f) and not os.path.basename(f).startswith('~$')]
+    return sorted(files)
+
+# list sheet names of a workbook (other formats have a single table)
+
+def _list_sheets(file_path: str) -> List:
+
+    if get_backend(file_path) != 'excel':
+        return [0]
+    with pd.ExcelFile(file_path) as workbook:
+        return list(workbook.sheet_names)
+
+# source file column of `rows` rows: one category per file, as in every loading path
+
+def _source_labels(file_path: str, rows: int) -> pd.Categorical:
+
+    return pd.Categorical.from_codes(np.zeros(rows, dtype=np.int8), categories=[os.path.basename(file_path)])
+
+# load one sheet and tag rows with their source file (runs in worker processes)
+
+def _load_sheet_task(file_path: str, sheet_name) -> pd.DataFrame:
+
+    if get_backend(file_path) == 'excel':
+        df = load_data(file_path, sheet_name=sheet_name)
+    else:
+        df = load_data(file_path)
+    df[SOURCE_COLUMN] = _source_labels(file_path, len(df))
+    return df
+
+# concatenate frames keeping categorical columns categorical
+
+def _concat_frames(frames: List[pd.DataFrame]) -> pd.DataFrame:
+
+    frames = [df for df in frames if not df.empty]
+    if not frames:
+        return pd.DataFrame()
+
+    # unify categories first, otherwise concat falls back to object columns
+    for col in frames[0].columns:
+        if all(col in df.columns and isinstance(df[col].dtype, pd.CategoricalDtype) for df in frames):
+            categories = pd.api.types.union_categoricals([df[col].array for df in frames]).categories
+            for df in frames:
+                df[col] = df[col].cat.set_categories(categories)
+
+    return pd.concat(frames, ignore_index=True)
+
+# load several workbooks (and optionally all their sheets) in parallel processes
+
+def load_multiple_workbooks(source: str, sheet_name= 0, max_workers: Optional[int] = None) -> pd.DataFrame:
+
+    try:
+        files = resolve_data_files(source)
+        if not files:
+            raise FileNotFoundError(f"No se encontraron archivos de datos en: {source}")
+
+        # sheet_name=None loads every sheet of every workbook
+        tasks = []
+        for file_path in files:
+            sheets = _list_sheets(file_path) if sheet_name is None else [sheet_name]
+            tasks.extend((file_path, sheet) for sheet in sheets)
+
+        logger.info(f"Cargando {len(tasks)} hojas de {len(files)} archivos.")
+
+        if len(tasks) == 1 or max_workers == 1:
+            frames = [_load_sheet_task(file_path, sheet) for file_path, sheet in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                frames = list(pool.map(_load_sheet_task, [t[0] for t in tasks], [t[1] for t in tasks]))
+
+        df = _concat_frames(frames)
+        logger.info(f"Datos combinados: {df.shape[0]} filas de {len(files)} archivos.")
+        return df
+
+    except Exception as e:
+        logger.error(f"Error al cargar varios archivos de Excel: {e}")
+        raise
+
+# stream chunks from several workbooks one after another
+
+def _iter_source_chunks(files: List[str], chunk_size: int) -> Iterator[pd.DataFrame]:
+
+    for file_path in files:
+        backend = get_backend(file_path)
+        if backend == 'excel':
+            chunks = iter_excel_chunks(file_path, chunk_size=chunk_size)
+        elif backend == 'csv':
+            _check_file(file_path)
+            chunks = _typed_chunks(pd.read_csv(file_path, chunksize=chunk_size))
+        else:
+            raise ValueError(f"La lectura por bloques no está disponible para el backend '{backend}'.")
+
+        for chunk in chunks:
+            if len(files) > 1:
+                chunk[SOURCE_COLUMN] = _source_labels(file_path, len(chunk))
+            yield chunk
+
+# hash each row of the sale columns (stable across runs and dtypes)
+
+def hash_rows(df: pd.DataFrame, columns: Optional[List[str]] = None) -> np.ndarray:
+
+    if columns is None:
+        columns = [col for col in REQUIRED_COLUMNS if col in df.columns]
+
+    data = df[columns]
+    # datetime unit depends on the reader, normalize it so hashes match between runs
+    datetime_cols = [col for col in columns if pd.api.types.is_datetime64_any_dtype(data[col])]
+    if datetime_cols:
+        data = data.astype({col: 'datetime64[ns]' for col in datetime_cols})
+
+    return pd.util.hash_pandas_object(data, index=False).to_numpy()
+
+# persisted row hash index of a data source, stored next to the data
+
+def history_index_path(source: str) -> str:
+
+    if _is_uri(source):
+        base_dir = STATE_DIR
+    elif os.path.isdir(source):
+        base_dir = os.path.join(source, CACHE_DIR_NAME)
+    else:
+        base_dir = os.path.join(os.path.dirname(source) or '.', CACHE_DIR_NAME)
+    return os.path.join(base_dir, f"row_index_{state_key(source)}.npy")
+
+# fingerprint of the data behind a source: path, size and mtime of every file plus the
+# validation settings, so results computed from it can be reused while nothing changes
+
+def dataset_fingerprint(source: str) -> str:
+
+    files = []
+    for item in resolve_data_files(source):
+        path = _parse_sqlite_source(item)[0] if _is_uri(item) else item
+        signature = _file_signature(path) if os.path.exists(path) else {'path': path}
+        files.append({'source': item, **signature})
+
+    payload = {
+        'files': files,
+        'cache_version': CACHE_VERSION,
+        'igv_tolerance': IGV_TOLERANCE,
+        'required_columns': REQUIRED_COLUMNS
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+# key used to name state files of a data source
+
+def state_key(source: str) -> str:
+
+    return hashlib.sha1(os.path.abspath(source).encode('utf-8')).hexdigest()[:16]
+
+def _watermark_path(source: str) -> str:
+
+    return os.path.join(STATE_DIR, f"watermark_{state_key(source)}.json")
+
+# load persisted watermark of a data source
+
+def load_watermark(source: str) -> Optional[Dict[str, Any]]:
+
+    path = _watermark_path(source)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+# persist watermark (call it once the new rows were processed)
+
+def save_watermark(source: str, watermark: Dict[str, Any]):
+
+    path = _watermark_path(source)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(watermark, f)
+    os.replace(tmp_path, path)
+    logger.info(f"Marca de agua actualizada: {watermark['row_count']} filas, última venta {watermark['last_sell_date']}")
+
+# build the watermark describing the current state of the data
+
+def _build_watermark(df: pd.DataFrame, processed_rows: int) -> Dict[str, Any]:
+
+    dates = pd.to_datetime(df['Sell_Date'])
+    last_date = dates.max() if not df.empty else pd.NaT
+    tail = df.iloc[-WATERMARK_TAIL_ROWS:]
+    last_day_rows = df[(dates == last_date).to_numpy()] if not pd.isna(last_date) else df.iloc[:0]
+    return {
+        'row_count': len(df),
+        'processed_rows': processed_rows,
+        'last_sell_date': None if pd.isna(last_date) else last_date.isoformat(),
+        'tail_hashes': [f"{h:016x}" for h in hash_rows(tail)],
+        'last_date_hashes': [f"{h:016x}" for h in hash_rows(last_day_rows)]
+    }
+
+# select rows appended after the watermark
+# returns the new rows and the mode used: 'full', 'append' or 'date'
+
+def select_new_rows(df: pd.DataFrame, watermark: Optional[Dict[str, Any]]) -> Tuple[pd.DataFrame, str]:
+
+    if watermark is None:
+        return df, 'full'
+
+    # appended rows: the previous tail is still in place, everything after it is new
+    row_count = watermark['row_count']
+    tail_hashes = np.array([int(h, 16) for h in watermark['tail_hashes']], dtype=np.uint64)
+    if len(df) >= row_count:
+        tail = df.iloc[row_count - len(tail_hashes):row_count]
+        if np.array_equal(hash_rows(tail), tail_hashes):
+            return df.iloc[row_count:], 'append'
+
+    # rows were reordered or rewritten: rely on the last sell date instead
+    if watermark['last_sell_date'] is None:
+        return df, 'full'
+    logger.warning("Las filas anteriores cambiaron; se detectan filas nuevas por fecha de venta.")
+    last_date = pd.Timestamp(watermark['last_sell_date'])
+    dates = pd.to_datetime(df['Sell_Date'])
+    is_new = (dates > last_date).to_numpy()
+    on_last_date = (dates == last_date).to_numpy().copy()
+    if on_last_date.any():
+        seen = np.array([int(h, 16) for h in watermark.get('last_date_hashes', [])], dtype=np.uint64)
+        on_last_date[on_last_date] = ~np.isin(hash_rows(df[on_last_date]), seen)
+    return df[is_new | on_last_date], 'date'
+
+# row level checks, stored as bit flags so one row can fail several of them
+
+ROW_NULL = 1
+ROW_DUPLICATE = 2
+ROW_IGV_MISMATCH = 4
+ROW_OUT_OF_RANGE = 8
+ROW_SEEN_BEFORE = 16
+
+ROW_ISSUE_LABELS = {
+    ROW_NULL: 'valores nulos',
+    ROW_DUPLICATE: 'fila duplicada',
+    ROW_IGV_MISMATCH: 'IGV inconsistente',
+    ROW_OUT_OF_RANGE: 'valor fuera de rango',
+    ROW_SEEN_BEFORE: 'procesada en una ejecución anterior'
+}
+
+# allowed difference between Price_With_IGV and Price_Without_IGV + IGV (rounding)
+
+IGV_TOLERANCE = 0.02
+
+QUARANTINE_DIR = os.path.join('outputs', 'quarantine')
+
+# compute the issue flags of every row with vectorized checks
+
+# (history is an optional RowHashIndex of rows processed in previous runs)
+
+def check_rows(df: pd.DataFrame, required_columns: Optional[List[str]] = None,
+               history: Optional[RowHashIndex] = None) -> Tuple[np.ndarray, Dict[str, int], np.ndarray]:
 
     if required_columns is None:
-        required_columns = ['Sell_Date', 'Headquarter', 'Model', 'Channel', 
-                            'Segment', 'Client_ID', 'Price_Without_IGV', 
-                            'IGV', 'Price_With_IGV']
-       
-    validation_result = {
+        required_columns = REQUIRED_COLUMNS
+    columns = [col for col in required_columns if col in df.columns]
+
+    flags = np.zeros(len(df), dtype=np.uint8)
+    if df.empty or not columns:
+        return flags, {}, np.empty(0, dtype=np.uint64)
+
+    # nulls: one boolean matrix gives both row flags and per column counts
+    nulls = df[columns].isna().to_numpy()
+    flags |= np.where(nulls.any(axis=1), ROW_NULL, 0).astype(np.uint8)
+    null_counts = {col: int(count) for col, count in zip(columns, nulls.sum(axis=0)) if count > 0}
+
+    # duplicates: compare 64-bit row hashes instead of whole rows (first occurrence is kept)
+    hashes = hash_rows(df, columns)
+    duplicated = pd.Series(hashes).duplicated().to_numpy()
+    flags |= np.where(duplicated, ROW_DUPLICATE, 0).astype(np.uint8)
+
+    # rows already processed in earlier runs (re-exported or overlapping files)
+    if history is not None:
+        flags |= np.where(history.contains(hashes), ROW_SEEN_BEFORE, 0).astype(np.uint8)
+
+    price_columns = ['Price_Without_IGV', 'IGV', 'Price_With_IGV']
+    if all(col in df.columns for col in price_columns):
+        without_igv, igv, with_igv = (df[col].to_numpy(dtype=float, na_value=np.nan) for col in price_columns)
+        with np.errstate(invalid='ignore'):
+            mismatch = np.abs(with_igv - (without_igv + igv)) > IGV_TOLERANCE
+            out_of_range = (without_igv <= 0) | (igv < 0) | (with_igv <= 0)
+        flags |= np.where(mismatch, ROW_IGV_MISMATCH, 0).astype(np.uint8)
+        flags |= np.where(out_of_range, ROW_OUT_OF_RANGE, 0).astype(np.uint8)
+
+    return flags, null_counts, hashes
+
+# describe the flags of each row as text
+
+def _describe_flags(flags: np.ndarray) -> np.ndarray:
+
+    codes, inverse = np.unique(flags, return_inverse=True)
+    labels = ['; '.join(label for flag, label in ROW_ISSUE_LABELS.items() if code & flag) for code in codes]
+    return np.array(labels, dtype=object)[inverse]
+
+# path of a new quarantine file
+
+def new_quarantine_path() -> str:
+
+    return os.path.join(QUARANTINE_DIR, f"quarantine_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.csv")
+
+# append rejected rows to a quarantine csv with the reason of each row
+
+def _write_quarantine(rows: pd.DataFrame, flags: np.ndarray, path: str):
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    rows = rows.copy()
+    rows.insert(0, 'Source_Row', rows.index)
+    rows['Quarantine_Reason'] = _describe_flags(flags)
+    rows.to_csv(path, mode='a', header=not os.path.exists(path), index=False, encoding='utf-8')
+
+# base validation report
+
+def _empty_report() -> Dict[str, Any]:
+
+    return {
         'is_valid': True,
         'missing_columns': [],
         'empty_data': False,
         'duplicate_rows': 0,
-        'null_values': {}
+        'null_values': {},
+        'igv_mismatch_rows': 0,
+        'out_of_range_rows': 0,
+        'seen_before_rows': 0,
+        'quarantined_rows': 0,
+        'quarantine_file': None
     }
 
+# validate data, move bad rows to quarantine and return the clean rows
+
+# clean rows are added to history (in memory; call history.save() once they were processed)
+
+def validate_and_quarantine(df: pd.DataFrame, required_columns= None, quarantine_path: Optional[str] = None,
+                            log_results: bool = True, history: Optional[RowHashIndex] = None) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+
+    if required_columns is None:
+        required_columns = REQUIRED_COLUMNS
+
+    validation_result = _empty_report()
+
     #verify required columns
 
     missing_cols = [col for col in required_columns if col not in df.columns]
@@ -75,6 +933,7 @@ def validate_data_structure(df, required_columns= None):
         validation_result['is_valid'] = False
         validation_result['missing_columns'] = missing_cols
         logger.error(f"Columnas faltantes: {missing_cols}")
+        return df, validation_result
 
     # verify if dataframe is empty
 
@@ -82,42 +941,177 @@ def validate_data_structure(df, required_columns= None):
         validation_result['is_valid'] = False
         validation_result['empty_data'] = True
         logger.error("El DataFrame está vacío.")
+        return df, validation_result
 
-    # count duplicate rows
+    # row level checks
 
-    duplicates = df.duplicated().sum()
-    validation_result['duplicate_rows'] = duplicates
-    if duplicates > 0:
-        validation_result['is_valid'] = False
-        logger.warning(f"Número de filas duplicadas: {duplicates}")
+    flags, null_counts, hashes = check_rows(df, required_columns, history)
+    validation_result['null_values'] = null_counts
+    validation_result['duplicate_rows'] = int(np.count_nonzero(flags & ROW_DUPLICATE))
+    validation_result['igv_mismatch_rows'] = int(np.count_nonzero(flags & ROW_IGV_MISMATCH))
+    validation_result['out_of_range_rows'] = int(np.count_nonzero(flags & ROW_OUT_OF_RANGE))
+    validation_result['seen_before_rows'] = int(np.count_nonzero(flags & ROW_SEEN_BEFORE))
 
-    # verify null values in each column
-    null_counts = df.isnull().sum()
     for col, null_count in null_counts.items():
-        if null_count > 0:
-            validation_result['is_valid'] = False
-            validation_result['null_values'][col] = null_count
-            logger.warning(f"Columna '{col}' tiene {null_count} valores nulos.")
+        logger.warning(f"Columna '{col}' tiene {null_count} valores nulos.")
+    if validation_result['duplicate_rows']:
+        logger.warning(f"Número de filas duplicadas: {validation_result['duplicate_rows']}")
+    if validation_result['igv_mismatch_rows']:
+        logger.warning(f"Filas con IGV inconsistente: {validation_result['igv_mismatch_rows']}")
+    if validation_result['out_of_range_rows']:
+        logger.warning(f"Filas con valores fuera de rango: {validation_result['out_of_range_rows']}")
+    if validation_result['seen_before_rows']:
+        logger.warning(f"Filas ya procesadas en ejecuciones anteriores: {validation_result['seen_before_rows']}")
 
-    if validation_result['is_valid']:
-        logger.info("El DataFrame ha pasado todas las validaciones.")
-    else:
-        logger.info("El DataFrame no ha pasado las validaciones.")
+    # quarantine bad rows, the rest keeps going
+
+    bad = flags != 0
+    bad_count = int(np.count_nonzero(bad))
+    if bad_count:
+        validation_result['quarantined_rows'] = bad_count
+        if quarantine_path:
+            try:
+                _write_quarantine(df[bad], flags[bad], quarantine_path)
+                validation_result['quarantine_file'] = quarantine_path
+                logger.warning(f"{bad_count} filas enviadas a cuarentena: {quarantine_path}")
+            except Exception as e:
+                logger.error(f"No se pudo escribir el archivo de cuarentena: {e}")
+        df = df[~bad]
+
+    if history is not None:
+        history.add(hashes[~bad])
+
+    if df.empty:
+        validation_result['is_valid'] = False
+        logger.error("Ninguna fila pasó las validaciones.")
 
-    return validation_result
+    if log_results:
+        if validation_result['is_valid']:
+            logger.info(f"Validación completada: {len(df)} filas válidas, {bad_count} en cuarentena.")
+        else:
+            logger.info("El DataFrame no ha pasado las validaciones.")
+
+    return df, validation_result
+
+# validate data structure (report only, bad rows do not invalidate the data)
+
+def validate_data_structure(df, required_columns= None, log_results: bool = True):
+
+    return validate_and_quarantine(df, required_columns, log_results=log_results)[1]
+
+# validate chunks while they are consumed, accumulating a single report
+# (duplicates are only detected inside each chunk)
+
+def _validate_chunks(chunks: Iterator[pd.DataFrame], report: Dict[str, Any], quarantine_path: str) -> Iterator[pd.DataFrame]:
+
+    total_rows = 0
+    for chunk in chunks:
+        total_rows += len(chunk)
+        chunk, chunk_report = validate_and_quarantine(chunk, quarantine_path=quarantine_path, log_results=False)
+
+        if chunk_report['missing_columns']:
+            report['is_valid'] = False
+            report['missing_columns'] = chunk_report['missing_columns']
+            continue
+        for key in ['duplicate_rows', 'igv_mismatch_rows', 'out_of_range_rows', 'seen_before_rows', 'quarantined_rows']:
+            report[key] += chunk_report[key]
+        for col, null_count in chunk_report['null_values'].items():
+            report['null_values'][col] = report['null_values'].get(col, 0) + null_count
+        if chunk_report['quarantine_file']:
+            report['quarantine_file'] = chunk_report['quarantine_file']
+
+        if not chunk.empty:
+            yield chunk
+
+    report['total_rows'] = total_rows
+    if total_rows == 0:
+        report['is_valid'] = False
+        report['empty_data'] = True
+        logger.error("El DataFrame está vacío.")
+    elif report['quarantined_rows'] == total_rows:
+        report['is_valid'] = False
+        logger.error("Ninguna fila pasó las validaciones.")
+
+    logger.info(f"Validación por bloques finalizada: {total_rows} filas, {report['quarantined_rows']} en cuarentena, válido: {report['is_valid']}")
 
 # main load function
 
-def load_and_validate_data(file_path):
+def load_and_validate_data(file_path, chunk_size: Optional[int] = None, max_workers: Optional[int] = None,
+                           incremental: bool = False, reset_watermark: bool = False, dedupe_history: bool = False):
     
     try:
-        # 1. load excel data
-        df = load_excel_data(file_path)
-        # 2. validate data structure
-        validation_report = validate_data_structure(df)
+        if chunk_size and incremental:
+            raise ValueError("El modo incremental no está disponible en lectura por bloques.")
+        if dedupe_history and not incremental:
+            raise ValueError("La deduplicación contra el historial requiere el modo incremental.")
+
+        # a directory or glob pattern combines several workbooks
+        files = resolve_data_files(file_path)
+        multiple = not _is_uri(file_path) and (os.path.isdir(file_path) or glob.has_magic(file_path))
+        if multiple and not files:
+            raise FileNotFoundError(f"No se encontraron archivos de datos en: {file_path}")
+
+        # streaming mode: return a lazy chunk iterator; the report is filled while it is consumed
+        if chunk_size:
+            if not multiple:
+                files = [file_path]
+            for source in files:
+                if get_backend(source) not in ('excel', 'csv'):
+                    raise ValueError(f"La lectura por bloques no está disponible para: {source}")
+                _check_file(source)
+            validation_report = _empty_report()
+            validation_report['total_rows'] = 0
+            chunks = _validate_chunks(_iter_source_chunks(files, chunk_size), validation_report, new_quarantine_path())
+            return chunks, validation_report
+
+        # 1. load data (excel, csv, parquet or sqlite)
+        if multiple:
+            df = load_multiple_workbooks(file_path, max_workers=max_workers)
+        else:
+            df = load_data(file_path)
+
+        # incremental mode: only rows appended since the last watermark go forward
+        incremental_info = None
+        if incremental:
+            watermark = None if reset_watermark else load_watermark(file_path)
+            full_df = df
+            df, mode = select_new_rows(full_df, watermark)
+            incremental_info = {
+                'mode': mode,
+                'state_key': state_key(file_path),
+                'total_rows': len(full_df),
+                'new_rows': len(df),
+                'previous_rows': watermark['processed_rows'] if mode != 'full' else 0
+            }
+            logger.info(f"Modo incremental ({mode}): {len(df)} filas nuevas de {len(full_df)}.")
+
+        # 2. validate data and quarantine bad rows
+        if incremental_info and df.empty and incremental_info['mode'] != 'full':
+            # nothing new since the last run is not an error
+            logger.info("No hay filas nuevas desde la última ejecución.")
+            validation_report = _empty_report()
+            validation_report['empty_data'] = True
+        else:
+            # a full reprocess starts a new history, otherwise every row would be a repeat
+            history = None
+            if dedupe_history:
+                history = RowHashIndex(history_index_path(file_path))
+                if incremental_info['mode'] == 'full':
+                    history.clear()
+            df, validation_report = validate_and_quarantine(df, quarantine_path=new_quarantine_path(), history=history)
+            if history is not None:
+                validation_report['history_index'] = history
+            # every new row being a repeat is not an error either
+            if incremental_info and df.empty and incremental_info['mode'] != 'full' and not validation_report['missing_columns']:
+                validation_report['is_valid'] = True
+
+        # the watermark counts the rows handed to the analysis (quarantined rows excluded)
+        if incremental_info:
+            incremental_info['watermark'] = _build_watermark(full_df, incremental_info['previous_rows'] + len(df))
+            validation_report['incremental'] = incremental_info
         # 3. return results
         return df, validation_report
     
     except Exception as e:
         logger.error(f"Error en la carga y validación de datos: {e}")
-        return None, {'is_valid': False, 'error': str(e)}
\ No newline at end of file
+        return None, {'is_valid': False, 'error': str(e)}
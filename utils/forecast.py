@@ -0,0 +1,179 @@
+import pandas as pd
+import numpy as np
+import logging
+from itertools import product
+from typing import Dict, Any
+from utils.temporal import matrix_from_series
+
+logger = logging.getLogger(__name__)
+
+# forecast series: monthly sales of every headquarter x model combination
+
+FORECAST_DIMENSIONS = ('Headquarter', 'Model')
+
+# months ahead (next quarter), season length and z of the two-sided 95% prediction interval
+
+FORECAST_HORIZON = 3
+SEASON_LENGTH = 12
+INTERVAL_Z = 1.96
+
+# series with fewer months since their first sale are not forecast;
+# two full seasons are needed to fit the seasonal component (shorter series use Holt's linear trend)
+
+MIN_HISTORY = 3
+
+# smoothing parameters (level, trend, season) tried for every series at once; each series keeps
+# the combination with the lowest one-step-ahead squared error
+
+ALPHAS = (0.1, 0.3, 0.5, 0.8)
+BETAS = (0.01, 0.1, 0.3)
+GAMMAS = (0.05, 0.2, 0.5)
+
+# series fitted together (bounds the (parameters, series, season) state arrays)
+
+FORECAST_BLOCK = 4096
+
+def _parameter_grid():
+
+    seasonal = [(a, b, g, True) for a, b, g in product(ALPHAS, BETAS, GAMMAS)]
+    trend_only = [(a, b, 0.0, False) for a, b in product(ALPHAS, BETAS)]
+    alpha, beta, gamma, is_seasonal = (np.array(values) for values in zip(*(seasonal + trend_only)))
+    return alpha[:, None], beta[:, None], gamma[:, None], is_seasonal
+
+# values of every row at column starts + offset (clipped to the last column)
+
+def _take(matrix: np.ndarray, starts: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+
+    columns = np.minimum(starts[:, None] + offsets[None, :], matrix.shape[1] - 1)
+    return np.take_along_axis(matrix, columns, axis=1)
+
+# additive Holt-Winters for a block of series (rows of the matrix, each starting at its first non-zero month)
+# the recursions run over the months with every series and parameter combination as one array
+
+def _fit_block(matrix: np.ndarray, horizon: int) -> Dict[str, np.ndarray]:
+
+    n, months = matrix.shape
+    m = SEASON_LENGTH
+    rows = np.arange(n)
+    alpha, beta, gamma, is_seasonal = _parameter_grid()
+
+    active = matrix != 0
+    starts = np.where(active.any(axis=1), active.argmax(axis=1), months)
+    seasonal_ok = months - starts >= 2 * m
+
+    # initial state: season means and deviations of the first two seasons, or the first two months
+    first_season = _take(matrix, starts, np.arange(m))
+    first_mean = first_season.mean(axis=1)
+    second_mean = _take(matrix, starts, np.arange(m, 2 * m)).mean(axis=1)
+    first_two = _take(matrix, starts, np.arange(2))
+    level0 = np.where(seasonal_ok, first_mean, first_two[:, 0])
+    trend0 = np.where(seasonal_ok, (second_mean - first_mean) / m, first_two[:, 1] - first_two[:, 0])
+    season0 = np.where(seasonal_ok[:, None], first_season - first_mean[:, None], 0.0)
+
+    level = np.broadcast_to(level0, (len(is_seasonal), n)).copy()
+    trend = np.broadcast_to(trend0, (len(is_seasonal), n)).copy()
+    season = np.where(is_seasonal[:, None, None], season0[None, :, :], 0.0)
+    sse = np.zeros((len(is_seasonal), n))
+    errors = np.zeros(n)
+
+    for t in range(months):
+        on = t >= starts
+        if not on.any():
+            continue
+        position = (t - starts) % m
+        y = matrix[:, t]
+        current = season[:, rows, position]
+
+        error = y - (level + trend + current)
+        scored = on & (t > starts)
+        sse += np.where(scored, error ** 2, 0.0)
+        errors += scored
+
+        new_level = alpha * (y - current) + (1 - alpha) * (level + trend)
+        new_trend = beta * (new_level - level) + (1 - beta) * trend
+        season[:, rows, position] = np.where(on, gamma * (y - new_level) + (1 - gamma) * current, current)
+        level = np.where(on, new_level, level)
+        trend = np.where(on, new_trend, trend)
+
+    # seasonal combinations only count for series with two full seasons
+    sse = np.where(is_seasonal[:, None] & ~seasonal_ok[None, :], np.inf, sse)
+    best = np.argmin(sse, axis=0)
+    sigma = np.sqrt(sse[best, rows] / np.maximum(errors, 1))
+
+    steps = np.arange(1, horizon + 1)
+    positions = (months - starts[:, None] + steps[None, :] - 1) % m
+    forecast = level[best, rows][:, None] + steps[None, :] * trend[best, rows][:, None] + season[best[:, None], rows[:, None], positions]
+
+    # h-step variance of the additive model: sigma^2 * (1 + sum_{j<h} (alpha (1 + j beta) + gamma [j % m == 0])^2)
+    a, b, g = alpha[best, 0][:, None], beta[best, 0][:, None], gamma[best, 0][:, None]
+    lags = np.arange(1, horizon)[None, :]
+    terms = (a * (1 + lags * b) + g * (lags % m == 0)) ** 2
+    variance = 1 + np.concatenate([np.zeros((n, 1)), np.cumsum(terms, axis=1)], axis=1)[:, :horizon]
+    std = sigma[:, None] * np.sqrt(variance)
+
+    return {'forecast': forecast, 'std': std, 'seasonal': is_seasonal[best]}
+
+# forecasts and prediction intervals for every row of a label x month sales matrix
+
+def holt_winters(matrix: np.ndarray, horizon: int = FORECAST_HORIZON) -> Dict[str, np.ndarray]:
+
+    blocks = [_fit_block(matrix[start:start + FORECAST_BLOCK], horizon) for start in range(0, len(matrix), FORECAST_BLOCK)]
+    if not blocks:
+        return {'forecast': np.zeros((0, horizon)), 'std': np.zeros((0, horizon)), 'seasonal': np.zeros(0, dtype=bool)}
+    return {key: np.concatenate([block[key] for block in blocks]) for key in blocks[0]}
+
+# forecast table of the next `horizon` months from a (Headquarter, Model, Month) series of sales:
+# forecast, standard error and 95% interval per series and month (sales cannot be negative)
+
+def sales_forecast(series: pd.Series, horizon: int = FORECAST_HORIZON) -> pd.DataFrame:
+
+    columns = ['forecast', 'lower', 'upper', 'std', 'seasonal']
+    matrix, labels, months = matrix_from_series(series)
+    if matrix.size:
+        active = matrix != 0
+        history = np.where(active.any(axis=1), matrix.shape[1] - active.argmax(axis=1), 0)
+        keep = history >= MIN_HISTORY
+        matrix, labels = matrix[keep], labels[keep]
+
+    names = list(FORECAST_DIMENSIONS) + ['Month']
+    if not matrix.size:
+        return pd.DataFrame(columns=columns, index=pd.MultiIndex.from_arrays([[]] * len(names), names=names))
+
+    fit = holt_winters(matrix, horizon)
+    future = pd.period_range(months[-1] + 1, periods=horizon, freq='M', name='Month')
+    series_index = np.repeat(np.arange(len(labels)), horizon)
+    index = pd.MultiIndex.from_arrays([labels.get_level_values(level)[series_index] for level in range(labels.nlevels)]
+                                      + [future[np.tile(np.arange(horizon), len(labels))]], names=names)
+
+    forecast, spread = fit['forecast'].ravel(), INTERVAL_Z * fit['std'].ravel()
+    table = pd.DataFrame({
+        'forecast': np.maximum(forecast, 0.0),
+        'lower': np.maximum(forecast - spread, 0.0),
+        'upper': np.maximum(forecast + spread, 0.0),
+        'std': fit['std'].ravel(),
+        'seasonal': np.repeat(fit['seasonal'], horizon)
+    }, index=index)
+
+    logger.info(f"Pronóstico de {horizon} meses para {len(labels)} series sede × modelo.")
+    return table
+
+# next-quarter totals of a forecast table: forecast and 95% interval of the sum over all series
+# (errors of different series taken as independent) and the forecast per headquarter
+
+def forecast_summary(table: pd.DataFrame) -> Dict[str, Any]:
+
+    if table is None or table.empty:
+        return {}
+
+    months = table.index.get_level_values('Month')
+    total = float(table['forecast'].sum())
+    spread = INTERVAL_Z * float(np.sqrt((table['std'] ** 2).sum()))
+    return {
+        'first_month': months.min(),
+        'last_month': months.max(),
+        'series': len(table) // months.nunique(),
+        'total': total,
+        'lower': max(total - spread, 0.0),
+        'upper': total + spread,
+        'by_headquarter': table['forecast'].groupby(level='Headquarter').sum().sort_values(ascending=False)
+    }
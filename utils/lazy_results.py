@@ -0,0 +1,81 @@
+import logging
+from collections.abc import Mapping
+from typing import Dict, Any, Callable, Iterator, List
+
+logger = logging.getLogger(__name__)
+
+class LazyResults(Mapping):
+
+    # read-only results mapping whose entries are computed on first access and memoized
+    # keys are fixed up front, so iterating, len() and `in` never compute anything;
+    # materialize() computes every missing entry and returns a plain dict (for caching or pickling)
+
+    def __init__(self, factories: Dict[str, Callable[[], Any]]):
+
+        self._factories = dict(factories)
+        self._values: Dict[str, Any] = {}
+
+    # wrap results that are already computed
+
+    @classmethod
+    def from_values(cls, values: Dict[str, Any]) -> 'LazyResults':
+
+        return cls({key: None for key in values}).seed(values)
+
+    # take entries already known (e.g. read from a cache) as computed; keys without a factory are ignored
+
+    def seed(self, values: Dict[str, Any]) -> 'LazyResults':
+
+        self._values.update({key: value for key, value in values.items() if key in self._factories})
+        return self
+
+    def __getitem__(self, key: str) -> Any:
+
+        if key not in self._values:
+            factory = self._factories[key]
+            try:
+                self._values[key] = factory()
+            except Exception as e:
+                logger.error(f"Error calculando '{key}': {str(e)}")
+                raise
+        return self._values[key]
+
+    # Mapping.__contains__ would read (and compute) the entry
+
+    def __contains__(self, key) -> bool:
+
+        return key in self._factories
+
+    def __iter__(self) -> Iterator[str]:
+
+        return iter(self._factories)
+
+    def __len__(self) -> int:
+
+        return len(self._factories)
+
+    # keys computed so far
+
+    def computed(self) -> List[str]:
+
+        return [key for key in self._factories if key in self._values]
+
+    def materialize(self) -> Dict[str, Any]:
+
+        return {key: self[key] for key in self._factories}
+
+    # plain dict of the entries computed so far (nothing new is computed)
+
+    def computed_values(self) -> Dict[str, Any]:
+
+        return {key: self._values[key] for key in self.computed()}
+
+    # pickles as the plain dict of its values (factories are closures over the data)
+
+    def __reduce__(self):
+
+        return (dict, (self.materialize(),))
+
+    def __repr__(self) -> str:
+
+        return f"LazyResults({len(self.computed())}/{len(self)} calculados: {list(self._factories)})"
@@ -0,0 +1,132 @@
+import pandas as pd
+import numpy as np
+import os
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, Any, List, Tuple, Optional
+from utils.aggregates import FactorizedSales, AggregateState, merge_states
+
+logger = logging.getLogger(__name__)
+
+# 'rows' splits the table in equal row ranges, 'headquarter' gives every headquarter its own partition
+
+PARTITION_MODES = ('rows', 'headquarter')
+
+# row-range partitions per worker (smaller pieces balance uneven workers)
+
+PARTITIONS_PER_WORKER = 2
+
+# arrays attached by each worker process (name -> array over the shared block)
+
+_WORKER: Dict[str, Any] = {}
+
+# copy arrays into shared memory blocks: returns the blocks (kept open by the parent)
+# and the (block name, shape, dtype) of each array the workers attach to
+
+def _share_arrays(arrays: Dict[str, np.ndarray]) -> Tuple[List[shared_memory.SharedMemory], Dict[str, Tuple[str, tuple, str]]]:
+
+    blocks, specs = [], {}
+    try:
+        for key, values in arrays.items():
+            values = np.ascontiguousarray(values)
+            block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+            blocks.append(block)
+            np.ndarray(values.shape, dtype=values.dtype, buffer=block.buf)[...] = values
+            specs[key] = (block.name, values.shape, values.dtype.str)
+        return blocks, specs
+    except Exception:
+        _release(blocks)
+        raise
+
+def _release(blocks: List[shared_memory.SharedMemory]):
+
+    for block in blocks:
+        block.close()
+        block.unlink()
+
+# pool initializer: attach the shared columns once per worker (labels and options are pickled once per worker)
+
+def _attach_worker(specs: Dict[str, Tuple[str, tuple, str]], labels: Dict[str, pd.Index], options: Dict[str, Any]):
+
+    blocks, arrays = [], {}
+    for key, (name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=name)
+        blocks.append(block)
+        arrays[key] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+
+    _WORKER.update(blocks=blocks, arrays=arrays, labels=labels, options=options)
+
+# aggregate state of positions lo:hi of the partition order (plain row ranges without an order)
+
+def _partition_state(lo: int, hi: int) -> AggregateState:
+
+    arrays = _WORKER['arrays']
+    rows = arrays['order'][lo:hi] if 'order' in arrays else slice(lo, hi)
+    data = FactorizedSales.from_arrays(arrays, _WORKER['labels'], rows)
+    return AggregateState.from_factorized(data, **_WORKER['options'])
+
+# start/end positions of every non-empty partition and the row order they index (None for plain row ranges)
+
+def _partitions(data: FactorizedSales, partition: str, workers: int) -> Tuple[List[Tuple[int, int]], Optional[np.ndarray]]:
+
+    if partition == 'headquarter':
+        codes = data.codes['Headquarter']
+        # rows grouped by headquarter code, ascending within each group (the null bucket is one more partition)
+        counts = np.bincount(codes, minlength=data.size('Headquarter') + 1)
+        order = np.argsort(codes, kind='stable')
+        bounds = np.concatenate([[0], np.cumsum(counts)])
+    else:
+        order = None
+        bounds = np.linspace(0, data.rows, min(workers * PARTITIONS_PER_WORKER, data.rows) + 1).astype(np.int64)
+
+    return [(int(lo), int(hi)) for lo, hi in zip(bounds[:-1], bounds[1:]) if hi > lo], order
+
+# aggregate state of the table computed by partitions in a process pool
+# the code and measure columns are handed over through shared memory (workers only receive
+# block names and partition bounds); the partial states are merged in the parent
+
+def parallel_state(df: pd.DataFrame, month_keys: np.ndarray = None, day_keys: np.ndarray = None, workers: Optional[int] = None,
+                   partition: str = 'rows', **options) -> AggregateState:
+
+    if partition not in PARTITION_MODES:
+        raise ValueError(f"Modo de partición desconocido: {partition}")
+
+    data = FactorizedSales(df, month_keys=month_keys, day_keys=day_keys)
+    workers = workers or os.cpu_count() or 1
+    bounds, order = _partitions(data, partition, workers)
+
+    # client labels are not hashed here: each worker hashes the clients present in its partition
+
+    arrays = data.arrays()
+    if order is not None:
+        arrays['order'] = order
+
+    if workers == 1 or len(bounds) <= 1:
+        _WORKER.update(arrays=arrays, labels=data.labels, options=options)
+        try:
+            states = [_partition_state(lo, hi) for lo, hi in bounds]
+        finally:
+            _WORKER.clear()
+    else:
+        blocks, specs = _share_arrays(arrays)
+        try:
+            with ProcessPoolExecutor(max_workers=min(workers, len(bounds)), initializer=_attach_worker,
+                                     initargs=(specs, data.labels, options)) as pool:
+                states = list(pool.map(_partition_state, *zip(*bounds)))
+        finally:
+            _release(blocks)
+
+    logger.info(f"Análisis paralelo: {len(bounds)} particiones por '{partition}' con {min(workers, len(bounds))} procesos.")
+    return merge_states(states)
+
+# results dict of full_analysis computed by partitions in parallel
+
+def parallel_analysis(df: pd.DataFrame, month_keys: np.ndarray = None, day_keys: np.ndarray = None, workers: Optional[int] = None,
+                      partition: str = 'rows', top_n: int = 5) -> Dict[str, Any]:
+
+    try:
+        return parallel_state(df, month_keys=month_keys, day_keys=day_keys, workers=workers, partition=partition).results(top_n)
+    except Exception as e:
+        logger.error(f"Error en el análisis paralelo: {str(e)}")
+        raise
@@ -0,0 +1,125 @@
+import pandas as pd
+import numpy as np
+import os
+import json
+import logging
+from datetime import datetime
+from typing import Dict, Any
+
+logger = logging.getLogger(__name__)
+
+PROFILE_QUANTILES = [0.01, 0.25, 0.5, 0.75, 0.99]
+
+# stats of a numeric (or datetime as int64) array computed from a single sort
+
+def _numeric_stats(values: np.ndarray, nulls: np.ndarray) -> Dict[str, Any]:
+
+    valid = np.sort(values[~nulls])
+    if len(valid) == 0:
+        return {'cardinality': 0}
+
+    # quantile positions with linear interpolation over the sorted values
+    positions = np.asarray(PROFILE_QUANTILES) * (len(valid) - 1)
+    lower = np.floor(positions).astype(np.int64)
+    upper = np.ceil(positions).astype(np.int64)
+    weights = positions - lower
+    quantiles = valid[lower] + (valid[upper] - valid[lower]) * weights
+
+    return {
+        'cardinality': int(np.count_nonzero(np.diff(valid)) + 1),
+        'min': valid[0],
+        'max': valid[-1],
+        'mean': float(valid.mean()),
+        'std': float(valid.std(ddof=1)) if len(valid) > 1 else 0.0,
+        'quantiles': dict(zip([f"p{int(q * 100)}" for q in PROFILE_QUANTILES], quantiles))
+    }
+
+# stats of a label column from its integer codes (-1 means null)
+
+def _label_stats(codes: np.ndarray, labels) -> Dict[str, Any]:
+
+    counts = np.bincount(codes[codes >= 0], minlength=len(labels))
+    present = np.flatnonzero(counts)
+    if len(present) == 0:
+        return {'cardinality': 0}
+
+    top = int(np.argmax(counts))
+    return {
+        'cardinality': int(len(present)),
+        'min': str(labels[present].min()),
+        'max': str(labels[present].max()),
+        'top': str(labels[top]),
+        'top_count': int(counts[top])
+    }
+
+# profile one column
+
+def profile_column(series: pd.Series) -> Dict[str, Any]:
+
+    nulls = series.isna().to_numpy()
+    profile = {
+        'dtype': str(series.dtype),
+        'count': int(len(series) - nulls.sum()),
+        'nulls': int(nulls.sum())
+    }
+
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        profile.update(_label_stats(series.cat.codes.to_numpy(), series.cat.categories))
+    elif pd.api.types.is_datetime64_any_dtype(series):
+        stats = _numeric_stats(series.to_numpy().view(np.int64), nulls)
+        unit = np.datetime_data(series.dtype)[0]
+        for key in ['min', 'max']:
+            if key in stats:
+                stats[key] = pd.Timestamp(np.datetime64(int(stats[key]), unit)).isoformat()
+        if 'quantiles' in stats:
+            stats['quantiles'] = {k: pd.Timestamp(np.datetime64(int(v), unit)).isoformat() for k, v in stats['quantiles'].items()}
+        stats.pop('mean', None)
+        stats.pop('std', None)
+        profile.update(stats)
+    elif pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        profile.update(_numeric_stats(series.to_numpy(dtype=float, na_value=np.nan), nulls))
+    else:
+        codes, labels = pd.factorize(series)
+        profile.update(_label_stats(codes, labels))
+
+    return profile
+
+# profile every column of a dataframe
+
+def profile_dataframe(df: pd.DataFrame) -> Dict[str, Any]:
+
+    try:
+        profile = {
+            'generated_at': datetime.now().isoformat(timespec='seconds'),
+            'rows': len(df),
+            'columns': {str(col): profile_column(df[col]) for col in df.columns},
+            'memory_mb': float(df.memory_usage(index=False, deep=True).sum() / 1024**2)
+        }
+        return profile
+    except Exception as e:
+        logger.error(f"Error generando perfil de datos: {str(e)}")
+        raise
+
+# convert numpy values so they can be written as json
+
+def _to_json(value):
+
+    if isinstance(value, dict):
+        return {k: _to_json(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_json(v) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+# write profile of a dataframe to a json file
+
+def write_data_profile(df: pd.DataFrame, path: str = os.path.join('outputs', 'data_profile.json')) -> str:
+
+    profile = profile_dataframe(df)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(_to_json(profile), f, ensure_ascii=False, indent=2)
+
+    logger.info(f"Perfil de datos guardado en {path}")
+    return path
@@ -0,0 +1,100 @@
+import os
+import json
+import time
+import zlib
+import pickle
+import hashlib
+import logging
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# analysis results keyed by dataset fingerprint and analyzer configuration
+
+RESULT_CACHE_DIR = os.path.join('outputs', 'cache', 'results')
+RESULT_CACHE_MAX_ENTRIES = 20
+RESULT_CACHE_MAX_AGE_DAYS = 30
+
+# key of a cache entry: the data fingerprint plus every setting that changes the results
+
+def results_cache_key(fingerprint: str, config: Dict[str, Any]) -> str:
+
+    payload = json.dumps({'fingerprint': fingerprint, 'config': config}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+class ResultCache:
+
+    # on-disk cache of results dicts (pickled and zlib compressed, one file per key)
+    # entries older than max_age_days are dropped and only the max_entries most
+    # recently used are kept (a hit refreshes the entry mtime)
+
+    def __init__(self, directory: str = RESULT_CACHE_DIR, max_entries: int = RESULT_CACHE_MAX_ENTRIES,
+                 max_age_days: float = RESULT_CACHE_MAX_AGE_DAYS):
+
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+
+    def _path(self, key: str) -> str:
+
+        return os.path.join(self.directory, f"{key}.pkl.z")
+
+    # cached results or None (a corrupt entry counts as a miss and is removed)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+
+        if time.time() - os.path.getmtime(path) > self.max_age_days * 86400:
+            os.remove(path)
+            return None
+
+        try:
+            with open(path, 'rb') as f:
+                results = pickle.loads(zlib.decompress(f.read()))
+        except Exception as e:
+            logger.warning(f"Entrada de caché de resultados inválida ({path}): {str(e)}")
+            os.remove(path)
+            return None
+
+        os.utime(path)
+        logger.info(f"Resultados recuperados de la caché ({key}).")
+        return results
+
+    def put(self, key: str, results: Dict[str, Any]) -> str:
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(zlib.compress(pickle.dumps(results, protocol=pickle.HIGHEST_PROTOCOL), 6))
+        os.replace(tmp_path, path)
+
+        self.evict()
+        logger.info(f"Resultados guardados en caché ({key}).")
+        return path
+
+    # drop expired entries, then the least recently used beyond max_entries
+
+    def evict(self):
+
+        if not os.path.isdir(self.directory):
+            return
+
+        entries = []
+        now = time.time()
+        for name in os.listdir(self.directory):
+            if not name.endswith('.pkl.z'):
+                continue
+            path = os.path.join(self.directory, name)
+            mtime = os.path.getmtime(path)
+            if now - mtime > self.max_age_days * 86400:
+                os.remove(path)
+            else:
+                entries.append((mtime, path))
+
+        entries.sort(reverse=True)
+        for _, path in entries[self.max_entries:]:
+            os.remove(path)
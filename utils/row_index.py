@@ -0,0 +1,105 @@
+import numpy as np
+import os
+import logging
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+# sorted segments of added hashes kept apart before they are merged together,
+# and share of the main array they may reach before being merged into it
+
+MAX_SEGMENTS = 8
+MERGE_SHARE = 0.25
+
+# membership of hashes in one sorted array (binary search per row)
+
+def _contains_sorted(values: np.ndarray, hashes: np.ndarray) -> np.ndarray:
+
+    if len(values) == 0 or len(hashes) == 0:
+        return np.zeros(len(hashes), dtype=bool)
+
+    positions = np.searchsorted(values, hashes)
+    positions[positions == len(values)] = 0
+    return values[positions] == hashes
+
+# merge disjoint sorted arrays into one (the stable sort merges the sorted runs in linear time)
+
+def _merge_sorted(arrays: List[np.ndarray]) -> np.ndarray:
+
+    values = np.concatenate(arrays)
+    values.sort(kind='stable')
+    return values
+
+class RowHashIndex:
+
+    # persisted set of row hashes stored as a sorted uint64 array (.npy)
+    # added batches are kept as small sorted segments and merged occasionally,
+    # so adding a batch never copies the whole history
+
+    def __init__(self, path: str):
+
+        # load existing index (memory mapped) or start empty
+
+        self.path = path
+        self.segments: List[np.ndarray] = []
+        if os.path.exists(path):
+            self.hashes = np.load(path, mmap_mode='r')
+            logger.info(f"Índice de filas cargado: {len(self.hashes)} hashes ({path})")
+        else:
+            self.hashes = np.empty(0, dtype=np.uint64)
+
+    def __len__(self) -> int:
+
+        return len(self.hashes) + sum(len(segment) for segment in self.segments)
+
+    # check which hashes are already in the index (binary search per row in every segment)
+
+    def contains(self, hashes: np.ndarray) -> np.ndarray:
+
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        found = _contains_sorted(self.hashes, hashes)
+        for segment in self.segments:
+            found |= _contains_sorted(segment, hashes)
+        return found
+
+    # add hashes as a new sorted segment without repeats; segments are merged together once there
+    # are too many, and into the main array once they reach a share of it
+
+    def add(self, hashes: np.ndarray):
+
+        new = np.unique(np.asarray(hashes, dtype=np.uint64))
+        new = new[~self.contains(new)]
+        if not len(new):
+            return
+
+        self.segments.append(new)
+        if len(self.segments) > MAX_SEGMENTS:
+            self.segments = [_merge_sorted(self.segments)]
+        if len(self.segments[0]) > MERGE_SHARE * len(self.hashes):
+            self.compact()
+
+    # merge every segment into the main array
+
+    def compact(self):
+
+        if self.segments:
+            self.hashes = _merge_sorted([np.asarray(self.hashes)] + self.segments)
+            self.segments = []
+
+    # forget every hash (used when the history is reprocessed from scratch)
+
+    def clear(self):
+
+        self.hashes = np.empty(0, dtype=np.uint64)
+        self.segments = []
+
+    # write index to disk
+
+    def save(self):
+
+        self.compact()
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp.npy'
+        np.save(tmp_path, np.asarray(self.hashes, dtype=np.uint64))
+        os.replace(tmp_path, self.path)
+        logger.info(f"Índice de filas guardado: {len(self.hashes)} hashes ({self.path})")
@@ -0,0 +1,434 @@
+import pandas as pd
+import numpy as np
+import logging
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+# 64-bit hash of every label (labels are compared as text, so categorical and object columns agree)
+# labels are unique, so the values are hashed directly instead of factorized first (same hashes, about 4x faster)
+
+def hash_labels(labels) -> np.ndarray:
+
+    values = pd.Index(labels).astype(str).to_numpy(dtype=object)
+    return pd.util.hash_array(values, categorize=False)
+
+# sorted unique values of an array (a sort plus a neighbour comparison, cheaper than np.unique on large hash arrays)
+
+def _sorted_unique(values: np.ndarray) -> np.ndarray:
+
+    values = np.sort(values)
+    if len(values) < 2:
+        return values
+    keep = np.empty(len(values), dtype=bool)
+    keep[0] = True
+    np.not_equal(values[1:], values[:-1], out=keep[1:])
+    return values[keep]
+
+# union of two sorted unique arrays: the values of `right` missing from `left` are inserted at their
+# searchsorted positions, so the accumulated array is copied once per chunk but never sorted again
+
+def _merge_sorted(left: np.ndarray, right: np.ndarray) -> np.ndarray:
+
+    if len(left) < len(right):
+        left, right = right, left
+    if not len(right):
+        return left
+    positions = np.searchsorted(left, right)
+    found = positions < len(left)
+    found[found] = left[positions[found]] == right[found]
+    return np.insert(left, positions[~found], right[~found])
+
+class ExactDistinct:
+
+    # exact distinct counter: sorted array of unique 64-bit label hashes
+    # merging is a set union, so partitions can be combined in any order
+
+    def __init__(self, hashes: np.ndarray = None):
+
+        self.hashes = _sorted_unique(np.asarray(hashes, dtype=np.uint64)) if hashes is not None else np.empty(0, dtype=np.uint64)
+
+    def add(self, hashes: np.ndarray):
+
+        # only the incoming chunk is sorted
+        self.hashes = _merge_sorted(self.hashes, _sorted_unique(np.asarray(hashes, dtype=np.uint64)))
+
+    def merge(self, other: 'ExactDistinct') -> 'ExactDistinct':
+
+        merged = ExactDistinct()
+        merged.hashes = _merge_sorted(self.hashes, other.hashes)
+        return merged
+
+    def count(self) -> int:
+
+        return len(self.hashes)
+
+# default HyperLogLog precision: 2**14 one-byte registers (16 KB), ~0.8% standard error
+
+DEFAULT_HLL_PRECISION = 14
+DISTINCT_MODES = ('exact', 'hll')
+
+# number of leading zero bits of 64-bit integers (64 for zero)
+
+def _leading_zeros64(values: np.ndarray) -> np.ndarray:
+
+    values = np.asarray(values, dtype=np.uint64)
+    high = (values >> np.uint64(32)).astype(np.float64)
+    low = (values & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    # frexp gives the bit length of each 32-bit half exactly
+    high_bits = np.frexp(high)[1]
+    low_bits = np.frexp(low)[1]
+    return np.where(high_bits > 0, 32 - high_bits, 64 - low_bits).astype(np.uint8)
+
+class HyperLogLog:
+
+    # HyperLogLog distinct counter over 64-bit hashes: 2**precision registers
+    # keep the longest run of leading zeros seen; merging takes the register max
+
+    def __init__(self, precision: int = DEFAULT_HLL_PRECISION):
+
+        if not 4 <= precision <= 18:
+            raise ValueError(f"Precisión de HyperLogLog fuera de rango (4-18): {precision}")
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add(self, hashes: np.ndarray):
+
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        if len(hashes) == 0:
+            return
+        p = np.uint64(self.precision)
+        buckets = (hashes >> (np.uint64(64) - p)).astype(np.int64)
+        ranks = np.minimum(_leading_zeros64(hashes << p) + 1, 64 - self.precision + 1).astype(np.uint8)
+        np.maximum.at(self.registers, buckets, ranks)
+
+    def merge(self, other: 'HyperLogLog') -> 'HyperLogLog':
+
+        if self.precision != other.precision:
+            raise ValueError(f"No se pueden combinar HyperLogLog de precisión {self.precision} y {other.precision}.")
+        merged = HyperLogLog(self.precision)
+        merged.registers = np.maximum(self.registers, other.registers)
+        return merged
+
+    def count(self) -> int:
+
+        m = len(self.registers)
+        alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(m, 0.7213 / (1 + 1.079 / m))
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+
+        # linear counting is more accurate while many registers are still empty
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
+
+    # relative standard error of the estimate
+
+    def standard_error(self) -> float:
+
+        return 1.04 / np.sqrt(len(self.registers))
+
+# new empty distinct counter ('exact' keeps every hash, 'hll' uses constant memory)
+
+def new_distinct_sketch(mode: str = 'exact', precision: int = DEFAULT_HLL_PRECISION):
+
+    if mode not in DISTINCT_MODES:
+        raise ValueError(f"Modo de conteo de distintos desconocido: {mode}")
+    return HyperLogLog(precision) if mode == 'hll' else ExactDistinct()
+
+# merge two distinct counters; an exact counter is folded into a HyperLogLog when they differ
+
+def merge_distinct(left, right):
+
+    if isinstance(left, ExactDistinct) and isinstance(right, HyperLogLog):
+        left, right = right, left
+    if isinstance(left, HyperLogLog) and isinstance(right, ExactDistinct):
+        merged = HyperLogLog(left.precision)
+        merged.registers = left.registers.copy()
+        merged.add(right.hashes)
+        return merged
+    return left.merge(right)
+
+# labels monitored by each Space-Saving summary (error of any count is at most rows / capacity)
+
+DEFAULT_TOP_K_CAPACITY = 100
+
+class SpaceSaving:
+
+    # Space-Saving heavy hitters: at most `capacity` labels with an estimated count and
+    # the maximum overestimation of that count (true count is in [count - error, count])
+    # summaries of different partitions merge like the mergeable Misra-Gries summaries
+
+    def __init__(self, capacity: int = DEFAULT_TOP_K_CAPACITY):
+
+        if capacity < 1:
+            raise ValueError(f"Capacidad de top-K inválida: {capacity}")
+        self.capacity = capacity
+        self.total = 0
+        self.counts = pd.Series(dtype=np.int64)
+        self.errors = pd.Series(dtype=np.int64)
+
+    # count each label once and keep the `capacity` largest
+
+    @classmethod
+    def from_counts(cls, labels, counts: np.ndarray, capacity: int = DEFAULT_TOP_K_CAPACITY) -> 'SpaceSaving':
+
+        summary = cls(capacity)
+        counts = np.asarray(counts, dtype=np.int64)
+        summary.total = int(counts.sum())
+        # pick the largest on the raw arrays, only the kept labels become an index
+        keep = np.argsort(-counts, kind='stable')[:capacity]
+        summary.counts = pd.Series(counts[keep], index=pd.Index(labels)[keep])
+        summary.errors = pd.Series(0, index=summary.counts.index, dtype=np.int64)
+        return summary
+
+    # summary of one batch of raw values (nulls are skipped)
+
+    @classmethod
+    def from_values(cls, values, capacity: int = DEFAULT_TOP_K_CAPACITY) -> 'SpaceSaving':
+
+        codes, labels = pd.factorize(pd.Series(values), sort=True)
+        counts = np.bincount(codes[codes >= 0], minlength=len(labels))
+        return cls.from_counts(labels, counts, capacity)
+
+    # smallest monitored count; unmonitored labels can have at most this many rows
+
+    def floor(self) -> int:
+
+        return int(self.counts.min()) if len(self.counts) >= self.capacity else 0
+
+    def merge(self, other: 'SpaceSaving') -> 'SpaceSaving':
+
+        merged = SpaceSaving(max(self.capacity, other.capacity))
+        merged.total = self.total + other.total
+        left_floor, right_floor = self.floor(), other.floor()
+
+        index = self.counts.index.union(other.counts.index, sort=False)
+        counts = self.counts.reindex(index, fill_value=left_floor) + other.counts.reindex(index, fill_value=right_floor)
+        errors = self.errors.reindex(index, fill_value=left_floor) + other.errors.reindex(index, fill_value=right_floor)
+
+        keep = np.argsort(-counts.to_numpy(), kind='stable')[:merged.capacity]
+        merged.counts = counts.iloc[keep].astype(np.int64)
+        merged.errors = errors.iloc[keep].astype(np.int64)
+        return merged
+
+    # worst-case overestimation of any reported count
+
+    def max_error(self) -> int:
+
+        return int(self.total // self.capacity)
+
+    # n labels with the largest estimated counts (label order for ties, like value_counts on sorted labels)
+
+    def top(self, n: int = 5) -> pd.DataFrame:
+
+        counts = self.counts.sort_index()
+        counts = counts.iloc[np.argsort(-counts.to_numpy(), kind='stable')[:n]]
+        errors = self.errors.reindex(counts.index)
+        return pd.DataFrame({'count': counts, 'error': errors, 'guaranteed': counts - errors})
+
+    # flat arrays for npz persistence
+
+    def to_arrays(self, prefix: str) -> Dict[str, np.ndarray]:
+
+        return {
+            f'{prefix}_labels': np.asarray(self.counts.index.astype(str), dtype=str),
+            f'{prefix}_counts': self.counts.to_numpy(dtype=np.int64),
+            f'{prefix}_errors': self.errors.to_numpy(dtype=np.int64),
+            f'{prefix}_meta': np.asarray([self.capacity, self.total], dtype=np.int64)
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix: str) -> 'SpaceSaving':
+
+        capacity, total = (int(value) for value in arrays[f'{prefix}_meta'])
+        summary = cls(capacity)
+        summary.total = total
+        index = pd.Index(arrays[f'{prefix}_labels'])
+        summary.counts = pd.Series(arrays[f'{prefix}_counts'], index=index)
+        summary.errors = pd.Series(arrays[f'{prefix}_errors'], index=index)
+        return summary
+
+# t-digest compression (about `compression` centroids per group) and quantiles reported in results
+
+DEFAULT_TDIGEST_COMPRESSION = 100
+REPORTED_QUANTILES = [0.5, 0.9, 0.99]
+
+# t-digest scale function: the arcsine (k1) term keeps centroids small around the median and
+# the logit term keeps them small in the tails, so p99 stays accurate; about `compression` units over [0, 1]
+
+def _scale(q: np.ndarray, compression: float, total: np.ndarray) -> np.ndarray:
+
+    q = np.clip(q, 1e-15, 1 - 1e-15)
+    return (compression / (2 * np.pi) * np.arcsin(2 * q - 1)
+            + compression / 4 * np.log(q / (1 - q)) / np.log(2 * np.maximum(total, 1)))
+
+# merge weighted points sorted by (group, mean) into centroids, all groups at once
+# points whose mid quantile falls in the same unit of the scale become one centroid
+
+def _compress(groups: np.ndarray, means: np.ndarray, weights: np.ndarray, n_groups: int, compression: float):
+
+    if len(groups) == 0:
+        return groups, means, weights
+
+    totals = np.bincount(groups, weights=weights, minlength=n_groups)
+    cumulative = np.cumsum(weights)
+    group_start = np.concatenate([[0.0], np.cumsum(totals)[:-1]])
+    q_mid = (cumulative - weights / 2 - group_start[groups]) / totals[groups]
+    buckets = np.floor(_scale(q_mid, compression, totals[groups])).astype(np.int64)
+
+    new_centroid = np.empty(len(groups), dtype=bool)
+    new_centroid[0] = True
+    new_centroid[1:] = (groups[1:] != groups[:-1]) | (buckets[1:] != buckets[:-1])
+    ids = np.cumsum(new_centroid) - 1
+
+    merged_weights = np.bincount(ids, weights=weights)
+    merged_means = np.bincount(ids, weights=weights * means) / merged_weights
+    return groups[new_centroid], merged_means, merged_weights
+
+class GroupedTDigest:
+
+    # one merging t-digest per group label, stored as flat centroid arrays
+    # (group code, mean, weight) sorted by group and mean, plus exact min/max per group
+
+    def __init__(self, labels: pd.Index, compression: float = DEFAULT_TDIGEST_COMPRESSION):
+
+        self.labels = pd.Index(labels)
+        self.compression = compression
+        self.groups = np.empty(0, dtype=np.int64)
+        self.means = np.empty(0, dtype=np.float64)
+        self.weights = np.empty(0, dtype=np.float64)
+        self.mins = np.full(len(self.labels), np.nan)
+        self.maxs = np.full(len(self.labels), np.nan)
+
+    # build from raw values; codes >= len(labels) (null group) and NaN values are skipped
+
+    @classmethod
+    def from_values(cls, codes: np.ndarray, labels: pd.Index, values: np.ndarray,
+                    compression: float = DEFAULT_TDIGEST_COMPRESSION) -> 'GroupedTDigest':
+
+        n_groups = len(labels)
+        valid = ~np.isnan(values)
+        if not valid.all():
+            codes, values = codes[valid], values[valid]
+
+        # partition rows by group (stable radix sort of the small codes), then sort each group in place
+        regroup = np.argsort(codes, kind='stable')
+        sorted_codes = codes[regroup]
+        sorted_values = values[regroup]
+        bounds = np.searchsorted(sorted_codes, np.arange(n_groups + 1))
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            sorted_values[start:end].sort()
+
+        return cls.from_sorted(sorted_codes[:bounds[-1]], sorted_values[:bounds[-1]], labels, compression)
+
+    # build from values already sorted by (group code, value)
+    # unit-weight rows only need the rank where each group crosses a new unit of the scale,
+    # so the boundaries are found by bisection and centroids are summed with np.add.reduceat
+
+    @classmethod
+    def from_sorted(cls, groups: np.ndarray, values: np.ndarray, labels: pd.Index,
+                    compression: float = DEFAULT_TDIGEST_COMPRESSION) -> 'GroupedTDigest':
+
+        digest = cls(labels, compression)
+        n_groups = len(digest.labels)
+        if len(values) == 0:
+            return digest
+
+        counts = np.bincount(groups, minlength=n_groups)
+        present = np.flatnonzero(counts)
+        sizes = counts[present].astype(np.float64)
+        group_starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[present]
+
+        # scale units crossed inside each group (q of rank r is (r + 0.5) / size)
+        first_unit = np.floor(_scale(0.5 / sizes, compression, sizes)).astype(np.int64)
+        last_unit = np.floor(_scale((sizes - 0.5) / sizes, compression, sizes)).astype(np.int64)
+        crossings = last_unit - first_unit
+        owner = np.repeat(np.arange(len(present)), crossings)
+        targets = np.repeat(first_unit, crossings) + 1 + (np.arange(crossings.sum()) - np.repeat(np.cumsum(crossings) - crossings, crossings))
+
+        # smallest rank whose scale value reaches each target unit
+        low = np.zeros(len(owner), dtype=np.int64)
+        high = (sizes[owner] - 1).astype(np.int64)
+        while len(low) and (low < high).any():
+            middle = (low + high) // 2
+            reached = _scale((middle + 0.5) / sizes[owner], compression, sizes[owner]) >= targets
+            high = np.where(reached, middle, high)
+            low = np.where(reached, low, middle + 1)
+
+        starts = np.unique(np.concatenate([group_starts, group_starts[owner] + low]))
+        weights = np.diff(np.append(starts, len(values))).astype(np.float64)
+
+        digest.groups = groups[starts].astype(np.int64)
+        digest.means = np.add.reduceat(values, starts) / weights
+        digest.weights = weights
+        digest.mins[present] = values[group_starts]
+        digest.maxs[present] = values[group_starts + counts[present] - 1]
+        return digest
+
+    def merge(self, other: 'GroupedTDigest') -> 'GroupedTDigest':
+
+        labels = self.labels.union(other.labels)
+        merged = GroupedTDigest(labels, max(self.compression, other.compression))
+
+        left_codes = labels.get_indexer(self.labels)
+        right_codes = labels.get_indexer(other.labels)
+        groups = np.concatenate([left_codes[self.groups], right_codes[other.groups]]).astype(np.int64)
+        means = np.concatenate([self.means, other.means])
+        weights = np.concatenate([self.weights, other.weights])
+
+        order = np.lexsort((means, groups))
+        merged.groups, merged.means, merged.weights = _compress(groups[order], means[order], weights[order], len(labels), merged.compression)
+
+        merged.mins[left_codes] = self.mins
+        merged.maxs[left_codes] = self.maxs
+        merged.mins[right_codes] = np.fmin(merged.mins[right_codes], other.mins)
+        merged.maxs[right_codes] = np.fmax(merged.maxs[right_codes], other.maxs)
+        return merged
+
+    # estimated quantiles per group (rows are groups with data, columns p50, p90, ...)
+
+    def quantiles(self, quantiles=REPORTED_QUANTILES, name: str = None) -> pd.DataFrame:
+
+        columns = [f"p{q * 100:g}" for q in quantiles]
+        bounds = np.searchsorted(self.groups, np.arange(len(self.labels) + 1))
+        rows, index = [], []
+        for code, label in enumerate(self.labels):
+            start, end = bounds[code], bounds[code + 1]
+            if start == end:
+                continue
+            means, weights = self.means[start:end], self.weights[start:end]
+            total = weights.sum()
+            # centroid centers on the cumulative weight axis, pinned to the exact min and max
+            centers = np.cumsum(weights) - weights / 2
+            positions = np.concatenate([[0.0], centers, [total]])
+            values = np.concatenate([[self.mins[code]], means, [self.maxs[code]]])
+            rows.append(np.interp(np.asarray(quantiles) * total, positions, values))
+            index.append(label)
+
+        return pd.DataFrame(rows, index=pd.Index(index, name=name or self.labels.name), columns=columns, dtype=float)
+
+    # flat arrays for npz persistence
+
+    def to_arrays(self, prefix: str) -> Dict[str, np.ndarray]:
+
+        return {
+            f'{prefix}_labels': np.asarray(self.labels.astype(str), dtype=str),
+            f'{prefix}_groups': self.groups,
+            f'{prefix}_means': self.means,
+            f'{prefix}_weights': self.weights,
+            f'{prefix}_mins': self.mins,
+            f'{prefix}_maxs': self.maxs,
+            f'{prefix}_compression': np.float64(self.compression)
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix: str, name: str = None) -> 'GroupedTDigest':
+
+        digest = cls(pd.Index(arrays[f'{prefix}_labels'], name=name), float(arrays[f'{prefix}_compression']))
+        digest.groups = arrays[f'{prefix}_groups']
+        digest.means = arrays[f'{prefix}_means']
+        digest.weights = arrays[f'{prefix}_weights']
+        digest.mins = arrays[f'{prefix}_mins']
+        digest.maxs = arrays[f'{prefix}_maxs']
+        return digest
@@ -0,0 +1,118 @@
+import pandas as pd
+import numpy as np
+import logging
+from typing import Dict, Any, Tuple
+from utils.data_loader import month_key_to_period
+
+logger = logging.getLogger(__name__)
+
+# dimensions with monthly rolling/growth tables in the results
+
+TEMPORAL_DIMENSIONS = ['Headquarter', 'Model']
+
+# months in the rolling window (and the lag of year-over-year growth)
+
+ROLLING_WINDOW = 12
+
+TEMPORAL_COLUMNS = ['sales', 'rolling_12m', 'mom_growth', 'yoy_growth', 'rolling_12m_growth']
+
+# label x month matrix of sales from per-row codes with one bincount
+# (codes equal to n_groups / n_months are the null buckets and are dropped)
+
+def matrix_from_codes(group_codes: np.ndarray, n_groups: int, month_codes: np.ndarray, n_months: int,
+                      values: np.ndarray) -> np.ndarray:
+
+    flat = group_codes.astype(np.int64) * (n_months + 1) + month_codes
+    sums = np.bincount(flat, weights=values, minlength=(n_groups + 1) * (n_months + 1))
+    return sums.reshape(n_groups + 1, n_months + 1)[:n_groups, :n_months]
+
+# label x month matrix from a series of sums indexed by one or more label levels plus Month (last level)
+# rows are the label combinations present (sorted), months span the whole range without gaps
+
+def matrix_from_series(series: pd.Series) -> Tuple[np.ndarray, pd.Index, pd.PeriodIndex]:
+
+    series = series.dropna()
+    if series.empty:
+        return np.zeros((0, 0)), pd.Index([]), pd.PeriodIndex([], freq='M', name='Month')
+
+    keys = series.index.droplevel(-1)
+    rows, labels = keys.factorize(sort=True)
+    labels = labels.set_names(keys.names)
+    ordinals = pd.PeriodIndex(series.index.get_level_values(-1), freq='M').asi8
+    first, last = ordinals.min(), ordinals.max()
+    months = month_key_to_period(np.arange(first, last + 1)).rename('Month')
+
+    flat = rows.astype(np.int64) * len(months) + (ordinals - first)
+    matrix = np.bincount(flat, weights=series.to_numpy(dtype=float), minlength=len(labels) * len(months))
+    return matrix.reshape(len(labels), len(months)), labels, months
+
+# moving sums over the last `window` columns of every row (cumulative sum difference)
+
+def rolling_sum(matrix: np.ndarray, window: int = ROLLING_WINDOW) -> np.ndarray:
+
+    cumulative = np.zeros((matrix.shape[0], matrix.shape[1] + 1))
+    np.cumsum(matrix, axis=1, out=cumulative[:, 1:])
+    ends = np.arange(1, matrix.shape[1] + 1)
+    return cumulative[:, ends] - cumulative[:, np.maximum(ends - window, 0)]
+
+# relative change against the value `lag` columns before (NaN without a positive base)
+
+def growth(matrix: np.ndarray, lag: int) -> np.ndarray:
+
+    result = np.full(matrix.shape, np.nan)
+    if matrix.shape[1] > lag:
+        base = matrix[:, :-lag]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            result[:, lag:] = np.where(base > 0, matrix[:, lag:] / base - 1, np.nan)
+    return result
+
+# sales, rolling 12-month total, month-over-month, year-over-year and rolling 12-month growth
+# of every label and month, computed on the whole matrix at once
+# rolling values before the first full window are NaN; months before a label's first sale are dropped
+
+def temporal_table(matrix: np.ndarray, labels: pd.Index, months: pd.PeriodIndex, dimension: str) -> pd.DataFrame:
+
+    if matrix.size == 0:
+        return pd.DataFrame(columns=TEMPORAL_COLUMNS, index=pd.MultiIndex.from_arrays([[], []], names=[dimension, 'Month']), dtype=float)
+
+    rolling = rolling_sum(matrix)
+    rolling[:, :ROLLING_WINDOW - 1] = np.nan
+    values = np.stack([matrix, rolling, growth(matrix, 1), growth(matrix, ROLLING_WINDOW), growth(rolling, ROLLING_WINDOW)], axis=-1)
+
+    started = np.cumsum(matrix != 0, axis=1) > 0
+    rows, columns = np.nonzero(started)
+    index = pd.MultiIndex.from_arrays([pd.Index(labels)[rows], months[columns]], names=[dimension, 'Month'])
+    return pd.DataFrame(values[rows, columns], index=index, columns=TEMPORAL_COLUMNS)
+
+# temporal table from a (label, Month) series of sums
+
+def temporal_table_from_series(series: pd.Series, dimension: str) -> pd.DataFrame:
+
+    matrix, labels, months = matrix_from_series(series)
+    return temporal_table(matrix, labels, months, dimension)
+
+# headline figures of the last 12 months of the overall monthly trend
+
+def period_summary(trend: pd.Series) -> Dict[str, Any]:
+
+    trend = trend.dropna()
+    if trend.empty:
+        return {}
+
+    months = pd.period_range(trend.index.min(), trend.index.max(), freq='M', name='Month')
+    monthly = trend.reindex(months, fill_value=0.0).to_numpy(dtype=float)[np.newaxis, :]
+    rolling = rolling_sum(monthly)[0]
+    full_years = len(months) >= 2 * ROLLING_WINDOW
+    previous = rolling[-1 - ROLLING_WINDOW] if full_years else np.nan
+
+    return {
+        'first_month': months[max(len(months) - ROLLING_WINDOW, 0)],
+        'last_month': months[-1],
+        'months': min(len(months), ROLLING_WINDOW),
+        'sales_last_12m': rolling[-1],
+        'sales_previous_12m': previous,
+        'rolling_12m_growth': rolling[-1] / previous - 1 if full_years and previous > 0 else np.nan,
+        'last_month_sales': monthly[0, -1],
+        'mom_growth': growth(monthly, 1)[0, -1],
+        'yoy_growth': growth(monthly, ROLLING_WINDOW)[0, -1]
+    }
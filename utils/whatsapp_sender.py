@@ -5,6 +5,7 @@ from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime
 from twilio.rest import Client
 from twilio.base.exceptions import TwilioRestException
+from utils.forecast import forecast_summary
 
 logger = logging.getLogger(__name__)
 
@@ -228,6 +229,31 @@ Puede encontrarlos en la carpeta 'outputs/graphs' del proyecto.
                 if i >= 5:
                     break
 
+            # next quarter forecast (total with its 95% interval and the headquarters expected to sell the most)
+            forecast = forecast_summary(results.get('sales_forecast'))
+            if forecast:
+                lines.append("")
+                lines.append(f"🔮 Pronóstico próximo trimestre ({forecast['first_month']} a {forecast['last_month']}):")
+                lines.append(f"• Ventas sin IGV: ${forecast['total']:,.2f} (IC 95%: ${forecast['lower']:,.2f} - ${forecast['upper']:,.2f})")
+                for hq, sales in forecast['by_headquarter'].head(3).items():
+                    lines.append(f"• 🏢 {hq}: ${sales:,.2f}")
+
+            # strongest daily anomalies (sales collapses and spikes, IGV ratios away from 18%); the header only goes
+            # with the days that are listed
+            anomalies = results.get('anomalies')
+            if anomalies is not None and len(anomalies):
+                anomaly_lines = []
+                for (date, hq), row in anomalies[anomalies['metric'] == 'sales_drop'].head(3).iterrows():
+                    anomaly_lines.append(f"• {date:%Y-%m-%d} {hq}: caída de ventas ${row['value']:,.2f} (esperado ${row['expected']:,.2f})")
+                for (date, hq), row in anomalies[anomalies['metric'] == 'sales_spike'].head(3).iterrows():
+                    anomaly_lines.append(f"• {date:%Y-%m-%d} {hq}: pico de ventas ${row['value']:,.2f} (esperado ${row['expected']:,.2f})")
+                for (date, hq), row in anomalies[anomalies['metric'] == 'igv_ratio'].head(3).iterrows():
+                    anomaly_lines.append(f"• {date:%Y-%m-%d} {hq}: IGV {row['value']:.2%} (esperado {row['expected']:.0%})")
+                if anomaly_lines:
+                    lines.append("")
+                    lines.append("⚠️ Días atípicos:")
+                    lines.extend(anomaly_lines)
+
             lines.append("")
             lines.append(f"🗓️ Generado: {self._get_today_date()}")
 